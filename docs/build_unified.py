@@ -5,21 +5,50 @@ Build script for unified HED documentation.
 This script copies documentation from submodules into the source tree
 before building with Sphinx, enabling a unified documentation site with
 integrated search across all HED repositories.
+
+Copying is incremental: a manifest of content hashes kept in each destination
+tree lets repeated runs rewrite only the files that actually changed.
+
+Some copied files are rewritten on the way by text transforms (see
+``TRANSFORMS``), chosen per file by ``transform_steps``. Their output is
+cached in .cache/transforms by the hash of the source file and the names and
+versions of the transforms, so a source is transformed once; the new sources
+of all submodules are transformed together in one process pool, before the
+submodules are synced.
 """
 
+import argparse
+import fnmatch
+import hashlib
+import json
+import os
+import re
 import shutil
 import sys
+import tempfile
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from pathlib import Path
 
+REPO_ROOT = Path(__file__).resolve().parent.parent
+
+# Per-destination record of source hashes used to sync only changed files
+SYNC_MANIFEST = ".sync-manifest.json"
+SYNC_MANIFEST_VERSION = 1
+
+TRANSFORM_CACHE_DIR = REPO_ROOT / ".cache" / "transforms"
 
-def remove_indices_section(index_file):
-    """Remove 'Indices and tables' or 'Index' section from an index.rst file.
+# Badge images of READMEs: CI status, coverage, package versions, DOIs
+BADGE_URL = re.compile(r"shields\.io|badge|codecov\.io|coveralls\.io", re.IGNORECASE)
+MD_IMAGE = re.compile(r"\[!\[[^\]]*\]\((?P<linked>[^)\s]+)[^)]*\)\]\([^)]*\)|!\[[^\]]*\]\((?P<url>[^)\s]+)[^)]*\)")
+RST_IMAGE = re.compile(r"\.\. image::\s*(?P<url>\S+)")
+
+
+def strip_indices_section(content):
+    """Return RST content with its 'Indices and tables' or 'Index' section removed.
 
     This prevents duplicate index entries in the sidebar when integrating
     submodule documentation into the unified docs.
     """
-    content = index_file.read_text(encoding="utf-8")
-
     # Find and remove the "Indices and tables" or "Index" section
     lines = content.split("\n")
     filtered_lines = []
@@ -53,21 +82,60 @@ def remove_indices_section(index_file):
     while filtered_lines and not filtered_lines[-1].strip():
         filtered_lines.pop()
 
-    index_file.write_text("\n".join(filtered_lines) + "\n", encoding="utf-8")
-    print(f"      Removed index section from {index_file.name}")
+    return "\n".join(filtered_lines) + "\n"
 
 
-def copy_submodule_docs():
-    """Copy documentation from submodules into the source tree."""
+def strip_badges(content):
+    """Return Markdown or RST content without its lines of badges.
+
+    A Markdown line is dropped when it holds nothing but badge images, linked
+    or not; an RST ``.. image::`` of a badge is dropped with its options.
+    """
+    lines = content.split("\n")
+    kept = []
+    in_rst_badge = False
+    for line in lines:
+        if in_rst_badge:
+            if line.startswith((" ", "\t")) and line.strip():
+                continue
+            in_rst_badge = False
+        match = RST_IMAGE.match(line)
+        if match and BADGE_URL.search(match["url"]):
+            in_rst_badge = True
+            continue
+        images = list(MD_IMAGE.finditer(line))
+        if (
+            images
+            and all(BADGE_URL.search(image["linked"] or image["url"]) for image in images)
+            and not MD_IMAGE.sub("", line).strip()
+        ):
+            continue
+        kept.append(line)
+    return "\n".join(kept)
 
-    # Define source and destination paths
-    repo_root = Path(__file__).parent.parent
+
+# Text transforms of copied files, by name: (function, version). Bump the version
+# whenever a function's output changes, so its cached results are not reused.
+TRANSFORMS = {
+    "remove_indices_section": (strip_indices_section, 1),
+    "strip_badges": (strip_badges, 1),
+}
+
+
+def get_submodules(repo_root=REPO_ROOT):
+    """Return the manifest of submodule documentation to integrate.
+
+    Each entry maps a submodule name to its documentation ``source`` directory,
+    its ``dest`` directory under ``docs/source``, the ``files`` (and directories,
+    with a trailing slash) to integrate, an optional ``index_template`` and
+    optional ``transforms`` mapping destination path patterns to the names of
+    the ``TRANSFORMS`` applied, in order, to the matching files.
+    """
     source_dir = repo_root / "docs" / "source"
     submodules_dir = repo_root / "submodules"
-    index_templates_dir = repo_root / "docs" / "submodule-indexes"
 
     # Define submodules to include
-    submodules = {
+    return {
         "hed-python": {
             "source": submodules_dir / "hed-python" / "docs",
             "dest": source_dir / "hed-python",
@@ -98,12 +166,14 @@ def copy_submodule_docs():
             "dest": source_dir / "hed-mcp",
             "files": ["README.md", "EXAMPLES.md", "API.md"],
             "index_template": "hed-mcp-index.rst",
+            "transforms": {"README.md": ["strip_badges"]},
         },
         "hed-javascript": {
             "source": submodules_dir / "hed-javascript",
             "dest": source_dir / "hed-javascript",
             "files": ["README.md"],
             "index_template": "hed-javascript-index.rst",
+            "transforms": {"README.md": ["strip_badges"]},
         },
         "hed-matlab": {
             "source": submodules_dir / "hed-matlab" / "docs",
@@ -184,76 +254,391 @@ def copy_submodule_docs():
         },
     }
 
-    print("Copying submodule documentation into source tree...")
 
-    for name, config in submodules.items():
-        source_path = config["source"]
-        dest_path = config["dest"]
+def parse_only(value):
+    """Parse a comma-separated list of submodule names.
 
-        if not source_path.exists():
-            print(f"Warning: Submodule {name} not found at {source_path}")
-            print("Run: git submodule update --init --recursive")
+    None selects every submodule and an empty string selects none (core documentation only).
+    """
+    if value is None:
+        return None
+    return [name.strip() for name in value.split(",") if name.strip()]
+
+
+def select_submodules(submodules, only=None):
+    """Return the manifest entries named in ``only``, or the whole manifest if ``only`` is None.
+
+    Raises:
+        ValueError: If ``only`` names a submodule that is not in the manifest.
+    """
+    if only is None:
+        return submodules
+    unknown = sorted(set(only) - set(submodules))
+    if unknown:
+        raise ValueError(f"Unknown submodules: {', '.join(unknown)} (available: {', '.join(submodules)})")
+    return {name: config for name, config in submodules.items() if name in only}
+
+
+def hash_file(path):
+    """Return the SHA-256 hex digest of a file's contents."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def load_sync_manifest(dest_path):
+    """Load the sync manifest of a destination tree, or an empty one if absent or unreadable."""
+    manifest_file = dest_path / SYNC_MANIFEST
+    try:
+        manifest = json.loads(manifest_file.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return {}
+    if manifest.get("version") != SYNC_MANIFEST_VERSION:
+        return {}
+    return manifest.get("files", {})
+
+
+def save_sync_manifest(dest_path, entries):
+    """Write the sync manifest of a destination tree."""
+    manifest = {"version": SYNC_MANIFEST_VERSION, "files": entries}
+    (dest_path / SYNC_MANIFEST).write_text(json.dumps(manifest, indent=1, sort_keys=True), encoding="utf-8")
+
+
+def collect_submodule_files(name, config, index_templates_dir, log=print):
+    """Map each destination-relative path of a submodule to its source file.
+
+    Directories listed in ``files`` are expanded recursively, the ``_static``
+    directory is included if present and an ``index_template`` replaces the
+    submodule's own ``index.rst``. Missing files are reported through ``log``.
+
+    Returns:
+        dict: POSIX relative destination path -> source ``Path``.
+    """
+    source_path = config["source"]
+    wanted = {}
+
+    def add_tree(src_dir, rel_dir):
+        for src_file in sorted(src_dir.rglob("*")):
+            if src_file.is_file():
+                wanted[(rel_dir / src_file.relative_to(src_dir)).as_posix()] = src_file
+
+    for file_or_dir in config["files"]:
+        src_item = source_path / file_or_dir
+        if not src_item.exists():
+            log(f"    Warning: {file_or_dir} not found in {name}")
+        elif src_item.is_dir():
+            add_tree(src_item, Path(file_or_dir))
+        else:
+            wanted[Path(file_or_dir).as_posix()] = src_item
+
+    # Include the _static directory if it exists
+    static_src = source_path / "_static"
+    if static_src.exists():
+        add_tree(static_src, Path("_static"))
+
+    # Use the index template if specified (for submodules without traditional docs/)
+    if "index_template" in config:
+        template_file = index_templates_dir / config["index_template"]
+        if template_file.exists():
+            wanted["index.rst"] = template_file
+        else:
+            log(f"    Warning: Index template not found: {template_file}")
+
+    return wanted
+
+
+def transform_steps(rel_path, config):
+    """Return the names of the transforms applied to a destination file, in order.
+
+    Raises:
+        ValueError: If the manifest entry names a transform that does not exist.
+    """
+    steps = []
+    if rel_path == "index.rst" and "index_template" not in config:
+        steps.append("remove_indices_section")
+    for pattern, names in config.get("transforms", {}).items():
+        if fnmatch.fnmatchcase(rel_path, pattern):
+            steps += names
+    unknown = [name for name in steps if name not in TRANSFORMS]
+    if unknown:
+        raise ValueError(
+            f"Unknown transforms for {rel_path}: {', '.join(unknown)} (available: {', '.join(TRANSFORMS)})"
+        )
+    return tuple(steps)
+
+
+def transform_signature(steps):
+    """Return what the output of a list of transforms depends on besides their input, e.g. ``strip_badges@1``."""
+    return ",".join(f"{name}@{TRANSFORMS[name][1]}" for name in steps)
+
+
+def apply_transforms(content, steps):
+    """Return text passed through the named transforms in order."""
+    for name in steps:
+        content = TRANSFORMS[name][0](content)
+    return content
+
+
+def transform_data(data, steps):
+    """Return the UTF-8 bytes of a file passed through the named transforms (run in worker processes)."""
+    return apply_transforms(data.decode("utf-8"), steps).encode("utf-8")
+
+
+def source_digest(src_file, entry):
+    """Return the SHA-256 of a source file, reusing the sync manifest entry when the file has not been touched."""
+    src_stat = src_file.stat()
+    if (
+        entry.get("source") == str(src_file)
+        and entry.get("size") == src_stat.st_size
+        and entry.get("mtime_ns") == src_stat.st_mtime_ns
+    ):
+        return entry["sha256"]
+    return hash_file(src_file)
+
+
+def transform_cache_file(sha256, steps, cache_dir=TRANSFORM_CACHE_DIR):
+    """Return the cache file of the output of transforms for a source with the given hash."""
+    key = f"{sha256}:{transform_signature(steps)}"
+    return cache_dir / hashlib.sha256(key.encode()).hexdigest()
+
+
+def run_transforms(pending, entries, cache_dir=TRANSFORM_CACHE_DIR, executor=None):
+    """Return the transformed contents of source files, from the cache or computed anew.
+
+    Args:
+        pending (dict): Key (e.g. destination-relative path) -> (source ``Path``, transform names).
+        entries (dict): Key -> sync manifest entry recorded for the file, to reuse recorded hashes.
+        cache_dir (Path): Directory of the cached outputs, keyed by source hash and transform signature.
+        executor (Executor): Process pool computing the outputs missing from the cache when there
+            are several; without one they are computed in this process.
+
+    Returns:
+        dict: Key -> transformed bytes.
+    """
+    outputs, misses = {}, {}
+    for key, (src_file, steps) in pending.items():
+        cache_file = transform_cache_file(source_digest(src_file, entries.get(key, {})), steps, cache_dir)
+        try:
+            outputs[key] = cache_file.read_bytes()
+        except OSError:
+            misses[key] = (src_file.read_bytes(), steps, cache_file)
+    if not misses:
+        return outputs
+
+    args = [(data, steps) for data, steps, _ in misses.values()]
+    if executor is None or len(misses) == 1:
+        results = [transform_data(*arg) for arg in args]
+    else:
+        results = list(executor.map(transform_data, *zip(*args, strict=True)))
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    for (key, (_, _, cache_file)), result in zip(misses.items(), results, strict=True):
+        # Written under a unique name and renamed, as concurrent syncs may share the cache
+        fd, partial = tempfile.mkstemp(dir=cache_dir, suffix=".partial")
+        with os.fdopen(fd, "wb") as f:
+            f.write(result)
+        os.replace(partial, cache_file)
+        outputs[key] = result
+    return outputs
+
+
+def sync_file(rel_path, src_file, config, entry, transformed=None):
+    """Bring one destination file up to date with its source.
+
+    Args:
+        rel_path (str): POSIX path of the file relative to the destination tree.
+        src_file (Path): Source file in the submodule (or index template).
+        config (dict): Manifest entry of the submodule.
+        entry (dict): Sync manifest entry recorded for the file by the previous run, if any.
+        transformed (bytes): Output of the file's transforms (see ``run_transforms``), if it has any.
+
+    Returns:
+        tuple: (new sync manifest entry, True if the destination file was written).
+    """
+    src_stat = src_file.stat()
+    dest_file = config["dest"] / rel_path
+    steps = transform_steps(rel_path, config)
+    signature = transform_signature(steps) or None
+    sha256 = source_digest(src_file, entry)
+
+    try:
+        dest_stat = dest_file.stat()
+    except FileNotFoundError:
+        dest_stat = None
+
+    written = not (
+        dest_stat is not None
+        and entry.get("sha256") == sha256
+        and entry.get("transforms") == signature
+        and entry.get("dest_size") == dest_stat.st_size
+        and entry.get("dest_mtime_ns") == dest_stat.st_mtime_ns
+    )
+    if written:
+        dest_file.parent.mkdir(parents=True, exist_ok=True)
+        # Writing gives the destination a fresh mtime so Sphinx sees the change
+        if steps:
+            if transformed is None:
+                transformed = run_transforms({rel_path: (src_file, steps)}, {rel_path: entry})[rel_path]
+            dest_file.write_bytes(transformed)
+        else:
+            shutil.copyfile(src_file, dest_file)
+        dest_stat = dest_file.stat()
+
+    new_entry = {
+        "source": str(src_file),
+        "size": src_stat.st_size,
+        "mtime_ns": src_stat.st_mtime_ns,
+        "sha256": sha256,
+        "transforms": signature,
+        "dest_size": dest_stat.st_size,
+        "dest_mtime_ns": dest_stat.st_mtime_ns,
+    }
+    return new_entry, written
+
+
+def sync_submodule(config, previous, wanted, transformed):
+    """Incrementally synchronize one submodule's documentation into its destination tree.
+
+    Source files are compared with the content hashes recorded in the
+    destination's sync manifest. Only new or changed files are written, so
+    untouched files keep their modification times and Sphinx does not re-read
+    them. Only files recorded by the previous sync that the submodule no longer
+    provides are deleted; files generated in the tree during the build (the
+    autosummary stubs) are kept.
+
+    Args:
+        config (dict): Manifest entry of the submodule.
+        previous (dict): Sync manifest entries of the destination tree (see ``load_sync_manifest``).
+        wanted (dict): Destination-relative path -> source file (see ``collect_submodule_files``).
+        transformed (dict): Destination-relative path -> output of the file's transforms (see ``run_transforms``).
+
+    Returns:
+        tuple: Numbers of (copied, unchanged, removed) files.
+    """
+    dest_path = config["dest"]
+    dest_path.mkdir(parents=True, exist_ok=True)
+
+    entries = {}
+    copied = unchanged = removed = 0
+    for rel_path, src_file in wanted.items():
+        entries[rel_path], written = sync_file(
+            rel_path, src_file, config, previous.get(rel_path, {}), transformed.get(rel_path)
+        )
+        if written:
+            copied += 1
+        else:
+            unchanged += 1
+
+    # Delete the files of the previous sync that the submodule no longer provides, then any emptied
+    # directories. Files the sync did not write, such as autosummary stubs, are left alone.
+    for rel_path in sorted(set(previous) - set(wanted)):
+        dest_file = dest_path / rel_path
+        if not dest_file.is_file():
             continue
+        dest_file.unlink()
+        removed += 1
+        for parent in dest_file.parents:
+            if parent == dest_path or any(parent.iterdir()):
+                break
+            parent.rmdir()
 
-        # Remove existing destination if it exists
-        if dest_path.exists():
-            print(f"  Removing existing: {dest_path.relative_to(repo_root)}")
-            shutil.rmtree(dest_path)
+    save_sync_manifest(dest_path, entries)
+    return copied, unchanged, removed
 
-        # Create destination directory
-        dest_path.mkdir(parents=True, exist_ok=True)
-        src_rel = source_path.relative_to(repo_root)
-        dest_rel = dest_path.relative_to(repo_root)
-        print(f"  Copying {name}: {src_rel} -> {dest_rel}")
 
-        # Copy specified files/directories
-        for file_or_dir in config["files"]:
-            src_item = source_path / file_or_dir
+def sync_submodule_files(config, sources):
+    """Synchronize only the given files of one submodule, e.g. after an edit.
 
-            if not src_item.exists():
-                print(f"    Warning: {file_or_dir} not found in {name}")
-                continue
+    Args:
+        config (dict): Manifest entry of the submodule.
+        sources (dict): Destination-relative POSIX path -> source ``Path`` for
+            each file to resync; a missing source deletes the destination file.
 
-            if src_item.is_dir():
-                # Copy entire directory
-                dest_item = dest_path / file_or_dir
-                shutil.copytree(src_item, dest_item, dirs_exist_ok=True)
-                print(f"    Copied directory: {file_or_dir}")
-            else:
-                # Copy single file
-                dest_item = dest_path / file_or_dir
-                dest_item.parent.mkdir(parents=True, exist_ok=True)
-                shutil.copy2(src_item, dest_item)
-                print(f"    Copied file: {file_or_dir}")
-
-                # Post-process index.rst to remove "Indices and tables"
-                if file_or_dir == "index.rst":
-                    remove_indices_section(dest_item)
-
-        # Copy _static directory if it exists
-        static_src = source_path / "_static"
-        if static_src.exists():
-            static_dest = dest_path / "_static"
-            shutil.copytree(static_src, static_dest, dirs_exist_ok=True)
-            print("    Copied _static directory")
-
-        # Copy index template if specified (for submodules without traditional docs/)
-        if "index_template" in config:
-            template_file = index_templates_dir / config["index_template"]
-            if template_file.exists():
-                index_dest = dest_path / "index.rst"
-                shutil.copy2(template_file, index_dest)
-                print(f"    Copied index from template: {config['index_template']}")
-            else:
-                print(f"    Warning: Index template not found: {template_file}")
+    Returns:
+        list: Destination files that were written or deleted.
+    """
+    dest_path = config["dest"]
+    dest_path.mkdir(parents=True, exist_ok=True)
+    entries = load_sync_manifest(dest_path)
+    touched = []
+    for rel_path, src_file in sources.items():
+        dest_file = dest_path / rel_path
+        if src_file.exists():
+            entries[rel_path], written = sync_file(rel_path, src_file, config, entries.get(rel_path, {}))
+            if written:
+                touched.append(dest_file)
+        else:
+            entries.pop(rel_path, None)
+            if dest_file.exists():
+                dest_file.unlink()
+                touched.append(dest_file)
+    save_sync_manifest(dest_path, entries)
+    return touched
+
+
+def copy_submodule_docs(repo_root=REPO_ROOT, jobs=1, only=None):
+    """Synchronize documentation from submodules into the source tree.
+
+    With ``jobs`` greater than 1, submodules are synchronized concurrently in threads.
+    ``only`` restricts the sync to the named submodules (see ``select_submodules``);
+    copies of the other submodules are left as they are.
+    """
+    index_templates_dir = repo_root / "docs" / "submodule-indexes"
+    submodules = select_submodules(get_submodules(repo_root), only)
+
+    if not submodules:
+        print("Skipped syncing submodule documentation (core documentation only)\n")
+        return
+    print("Syncing submodule documentation into source tree...")
+
+    available = []
+    for name, config in submodules.items():
+        if not config["source"].exists():
+            print(f"Warning: Submodule {name} not found at {config['source']}")
+            print("Run: git submodule update --init --recursive")
+            continue
+        available.append(name)
+
+    previous = {name: load_sync_manifest(submodules[name]["dest"]) for name in available}
+    wanted = {name: collect_submodule_files(name, submodules[name], index_templates_dir) for name in available}
+    pending = {
+        (name, rel_path): (src_file, steps)
+        for name in available
+        for rel_path, src_file in wanted[name].items()
+        if (steps := transform_steps(rel_path, submodules[name]))
+    }
+    entries = {key: previous[key[0]].get(key[1], {}) for key in pending}
+    # The transforms of all submodules share one process pool, started before the sync threads
+    with ProcessPoolExecutor(max_workers=os.cpu_count() or 1) as executor:
+        transformed = run_transforms(pending, entries, executor=executor)
+
+    def sync(name):
+        outputs = {rel_path: data for (owner, rel_path), data in transformed.items() if owner == name}
+        return sync_submodule(submodules[name], previous[name], wanted[name], outputs)
+
+    with ThreadPoolExecutor(max_workers=max(1, jobs)) as executor:
+        results = list(executor.map(sync, available))
+        for name, (copied, unchanged, removed) in zip(available, results, strict=True):
+            src_rel = submodules[name]["source"].relative_to(repo_root)
+            dest_rel = submodules[name]["dest"].relative_to(repo_root)
+            print(f"  Synced {name}: {src_rel} -> {dest_rel}")
+            print(f"    {copied} copied, {unchanged} unchanged, {removed} removed")
 
-    print("[OK] Submodule documentation copied successfully\n")
+    print("[OK] Submodule documentation synced successfully\n")
 
 
-def main():
+def main(argv=None):
     """Main entry point."""
+    parser = argparse.ArgumentParser(description="Sync submodule documentation into docs/source.")
+    selection = parser.add_mutually_exclusive_group()
+    selection.add_argument(
+        "--only", type=parse_only, metavar="NAMES", help="sync only these comma-separated submodules"
+    )
+    selection.add_argument("--core-only", dest="only", action="store_const", const=[], help="sync no submodules")
+    args = parser.parse_args(argv)
     try:
-        copy_submodule_docs()
+        copy_submodule_docs(only=args.only)
         return 0
     except Exception as e:
         print(f"Error: {e}", file=sys.stderr)
@@ -0,0 +1,204 @@
+"""Local cache of the intersphinx inventories used by the unified documentation.
+
+Inventories listed in ``intersphinx_mapping`` are stored under
+``.cache/intersphinx`` together with the time they were fetched. Builds read
+them from the cache while they are younger than the TTL, so fresh and
+air-gapped builds do not depend on the network. Inventories of repositories
+that are checked out as submodules (hed-python) are built locally from the
+submodule instead of being downloaded, and are refreshed when its commit
+changes.
+
+Fill or refresh the cache with ``hed-build-docs --prefetch-inventories``.
+"""
+
+import json
+import subprocess
+import sys
+import time
+import urllib.request
+from pathlib import Path
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+
+CACHE_DIR = REPO_ROOT / ".cache" / "intersphinx"
+CACHE_METADATA = "inventories.json"
+DEFAULT_TTL_DAYS = 7
+DOWNLOAD_TIMEOUT = 10
+INVENTORY_HEADER = b"# Sphinx inventory version"
+
+# Inventories that can be built from a checked-out submodule: name -> docs directory
+LOCAL_INVENTORIES = {"hed-python": Path("submodules") / "hed-python" / "docs"}
+
+
+def load_metadata(cache_dir=CACHE_DIR):
+    """Return {name: {"source": ..., "fetched": ..., "commit": ...}} for the cached inventories."""
+    try:
+        return json.loads((cache_dir / CACHE_METADATA).read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return {}
+
+
+def save_metadata(metadata, cache_dir=CACHE_DIR):
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    (cache_dir / CACHE_METADATA).write_text(json.dumps(metadata, indent=2, sort_keys=True), encoding="utf-8")
+
+
+def inventory_path(name, cache_dir=CACHE_DIR):
+    return cache_dir / f"{name}.inv"
+
+
+def inventory_url(target, inventory):
+    """Return the URL an intersphinx entry downloads its objects.inv from."""
+    for location in inventory if isinstance(inventory, (tuple, list)) else [inventory]:
+        if isinstance(location, str) and "://" in location:
+            return location
+    return target.rstrip("/") + "/objects.inv"
+
+
+def submodule_commit(docs_dir):
+    """Return the checked-out commit of the repository containing docs_dir, or None."""
+    try:
+        result = subprocess.run(["git", "rev-parse", "HEAD"], cwd=docs_dir, capture_output=True, text=True, check=True)
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return result.stdout.strip()
+
+
+def write_inventory(name, data, cache_dir):
+    """Validate and atomically store inventory bytes in the cache."""
+    if not data.startswith(INVENTORY_HEADER):
+        raise ValueError("not a Sphinx inventory")
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    path = inventory_path(name, cache_dir)
+    tmp_path = path.with_suffix(".tmp")
+    tmp_path.write_bytes(data)
+    tmp_path.replace(path)
+    return path
+
+
+def download_inventory(name, url, cache_dir=CACHE_DIR, timeout=DOWNLOAD_TIMEOUT):
+    """Download an inventory into the cache and return its metadata entry."""
+    with urllib.request.urlopen(url, timeout=timeout) as response:
+        write_inventory(name, response.read(), cache_dir)
+    return {"source": url, "fetched": time.time()}
+
+
+def build_local_inventory(name, docs_dir, cache_dir=CACHE_DIR):
+    """Build a submodule's documentation with Sphinx and cache the objects.inv it produces.
+
+    The build directory is kept in the cache, so later builds are incremental.
+    """
+    commit = submodule_commit(docs_dir)
+    out_dir = cache_dir / "build" / name
+    subprocess.run(
+        [sys.executable, "-m", "sphinx", "-q", "-b", "html", str(docs_dir), str(out_dir)],
+        cwd=docs_dir,
+        check=True,
+    )
+    write_inventory(name, (out_dir / "objects.inv").read_bytes(), cache_dir)
+    return {"source": f"local:{docs_dir}", "fetched": time.time(), "commit": commit}
+
+
+def local_docs_dir(name, repo_root=REPO_ROOT):
+    """Return the checked-out documentation directory an inventory can be built from, or None."""
+    docs_dir = LOCAL_INVENTORIES.get(name)
+    if docs_dir is None or not (repo_root / docs_dir / "conf.py").is_file():
+        return None
+    return repo_root / docs_dir
+
+
+def is_fresh(name, entry, ttl_days, cache_dir=CACHE_DIR, repo_root=REPO_ROOT):
+    """Return True if the cached inventory can be used without refreshing it."""
+    if not entry or not inventory_path(name, cache_dir).is_file():
+        return False
+    docs_dir = local_docs_dir(name, repo_root)
+    commit = submodule_commit(docs_dir) if docs_dir is not None else None
+    if commit is not None:
+        # Inventories of checked-out submodules follow the submodule, not the clock
+        return entry.get("commit") == commit
+    if entry.get("commit"):
+        # Built from a submodule that is no longer checked out
+        return False
+    return time.time() - entry.get("fetched", 0) < ttl_days * 86400
+
+
+def refresh_inventory(name, target, inventory, cache_dir=CACHE_DIR, repo_root=REPO_ROOT, log=print):
+    """Cache an inventory, built from its checked-out submodule if there is one, else downloaded.
+
+    Returns:
+        dict: The metadata entry of the cached inventory.
+
+    Raises:
+        OSError, ValueError: If the inventory could be neither built nor downloaded.
+    """
+    docs_dir = local_docs_dir(name, repo_root)
+    if docs_dir is not None:
+        try:
+            entry = build_local_inventory(name, docs_dir, cache_dir)
+            log(f"{name}: built from {docs_dir.relative_to(repo_root)} ({entry['commit'] or 'no commit'})")
+            return entry
+        except (OSError, ValueError, subprocess.CalledProcessError) as e:
+            log(f"{name}: local build failed ({e}); downloading instead")
+    url = inventory_url(target, inventory)
+    entry = download_inventory(name, url, cache_dir)
+    log(f"{name}: downloaded {url}")
+    return entry
+
+
+def prefetch_inventories(mapping, cache_dir=CACHE_DIR, repo_root=REPO_ROOT, log=print):
+    """Fill the cache for every entry of an intersphinx mapping, building local inventories where possible.
+
+    Returns:
+        list: Names of the inventories that could not be cached.
+    """
+    metadata = load_metadata(cache_dir)
+    failed = []
+    for name, (target, inventory) in mapping.items():
+        try:
+            metadata[name] = refresh_inventory(
+                name, target, inventory, cache_dir, repo_root, log=lambda message: log(f"  {message}")
+            )
+        except (OSError, ValueError) as e:
+            log(f"  {name}: could not download {inventory_url(target, inventory)}: {e}")
+            failed.append(name)
+    save_metadata(metadata, cache_dir)
+    return failed
+
+
+def cached_mapping(mapping, ttl_days=DEFAULT_TTL_DAYS, cache_dir=CACHE_DIR, repo_root=REPO_ROOT, log=print):
+    """Return an intersphinx mapping that reads inventories from the cache first.
+
+    Missing or expired inventories are rebuilt from their checked-out submodule
+    (when its commit changed) or downloaded with a short timeout. If that
+    fails, an expired copy is still used, so offline builds keep working.
+    Entries that are neither cached nor obtainable are left to intersphinx.
+    """
+    metadata = load_metadata(cache_dir)
+    updated = False
+    resolved = {}
+    for name, value in mapping.items():
+        if not isinstance(value, (tuple, list)) or len(value) != 2:
+            resolved[name] = value
+            continue
+        target, inventory = value
+        path = inventory_path(name, cache_dir)
+        if not is_fresh(name, metadata.get(name), ttl_days, cache_dir, repo_root):
+            try:
+                metadata[name] = refresh_inventory(
+                    name,
+                    target,
+                    inventory,
+                    cache_dir,
+                    repo_root,
+                    log=lambda message: log(f"[inventory_cache] {message}"),
+                )
+                updated = True
+            except (OSError, ValueError) as e:
+                if not path.is_file():
+                    resolved[name] = value
+                    continue
+                log(f"[inventory_cache] could not refresh {name} ({e}); using the expired copy")
+        resolved[name] = (target, str(path))
+    if updated:
+        save_metadata(metadata, cache_dir)
+    return resolved
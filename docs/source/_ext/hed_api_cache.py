@@ -0,0 +1,373 @@
+"""Sphinx extension caching the API documentation generated from the submodules.
+
+Documenting the APIs of hed-python, table-remodeler, hed-vis and hed-server
+imports every module and introspects every documented object: once when
+autosummary writes its stub pages at start-up, and again when the autosummary
+and autodoc directives are read. That output only depends on the submodule's
+code, so with ``hed_api_cache`` enabled it is stored in ``.cache/api`` under a
+key made of the submodule's commit, the Python, Sphinx and extension
+versions, the versions of the installed packages (documented classes inherit
+members from their dependencies) and the autodoc/autosummary/napoleon
+settings, and reused while the key matches:
+
+- the stub pages autosummary generates for a submodule are restored from the
+  cache instead of being generated;
+- the reStructuredText produced by each autodoc directive and the rows of each
+  autosummary table in a submodule's documents are replayed without importing
+  the documented objects.
+
+Submodules with uncommitted changes to tracked files are not cached. Their
+commit and state are checked again before each build reads its documents, so
+an application that builds repeatedly stops replaying entries once a
+submodule changes. The cache lives outside ``docs/_build``, so CI can keep it
+between runs.
+"""
+
+import contextvars
+import functools
+import hashlib
+import importlib.metadata
+import inspect
+import json
+import os
+import shutil
+import subprocess
+import sys
+from pathlib import Path
+from types import SimpleNamespace
+
+from build_unified import get_submodules, parse_only, select_submodules
+from docutils.parsers.rst import directives
+from docutils.statemachine import StringList
+from hed_sources import stub_root
+from sphinx.ext.autodoc.mock import mock
+from sphinx.ext.autosummary import Autosummary, get_rst_suffix
+from sphinx.ext.autosummary.generate import generate_autosummary_docs
+from sphinx.util import logging
+
+try:
+    from sphinx.ext.autodoc._directive import AutodocDirective
+except ImportError:  # Sphinx < 9
+    from sphinx.ext.autodoc.directive import AutodocDirective
+
+logger = logging.getLogger(__name__)
+
+CACHE_VERSION = 1
+CONFIG_PREFIXES = ("autodoc_", "autoclass_", "autosummary_", "napoleon_", "add_module_names", "python_")
+# Settings that choose which documents are processed rather than what is generated for them
+CONFIG_IGNORED = ("autosummary_generate",)
+
+# Set while an autodoc directive runs, to capture the content it generates
+_capture = contextvars.ContextVar("hed_api_cache_capture", default=None)
+
+
+def repo_root_of(app):
+    return Path(app.confdir).resolve().parent.parent
+
+
+def submodule_commit(root):
+    """Return the commit checked out in a submodule, or None if it is not a clean checkout of its own."""
+    try:
+        toplevel, commit = subprocess.run(
+            ["git", "-C", str(root), "rev-parse", "--show-toplevel", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.split()
+        changes = subprocess.run(
+            ["git", "-C", str(root), "status", "--porcelain", "--untracked-files=no"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout
+    except (OSError, ValueError, subprocess.CalledProcessError):
+        return None
+    if Path(toplevel).resolve() != root.resolve() or changes.strip():
+        return None
+    return commit
+
+
+@functools.cache
+def installed_packages():
+    """Return the names and versions of the installed distributions."""
+    packages = {}
+    for dist in importlib.metadata.distributions():
+        name = dist.metadata["Name"]
+        if name:
+            packages[name.lower()] = dist.version
+    return dict(sorted(packages.items()))
+
+
+def cache_key(app, commit):
+    """Return the cache key of a submodule commit under the current toolchain and configuration."""
+    material = {
+        "version": CACHE_VERSION,
+        "commit": commit,
+        "python": list(sys.version_info[:2]),
+        "packages": installed_packages(),
+        "extensions": {name: str(extension.version) for name, extension in sorted(app.extensions.items())},
+        "config": {
+            name: repr(getattr(app.config, name))
+            for name in sorted(app.config.values)
+            if name.startswith(CONFIG_PREFIXES) and name not in CONFIG_IGNORED
+        },
+    }
+    return hashlib.sha256(json.dumps(material, sort_keys=True).encode("utf-8")).hexdigest()[:16]
+
+
+def cacheable_submodules(app):
+    """Return {name: (commit, cache key directory)} of the selected submodules that are clean checkouts."""
+    repo_root = repo_root_of(app)
+    cache_dir = repo_root / app.config.hed_api_cache_dir
+    # Submodules left out of a partial build only have a stub, which must not be cached as their API
+    selected = select_submodules(get_submodules(repo_root), parse_only(app.config.hed_only))
+    keys = {}
+    for name in selected:
+        commit = submodule_commit(repo_root / "submodules" / name)
+        if commit is not None:
+            keys[name] = (commit, cache_dir / name / cache_key(app, commit))
+    return keys
+
+
+def entry_path(entries_dir, *parts):
+    digest = hashlib.sha256(json.dumps(parts, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+    return entries_dir / digest[:2] / f"{digest}.json"
+
+
+def load_entry(path):
+    try:
+        return json.loads(path.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return None
+
+
+def save_entry(path, entry):
+    """Write a cache entry atomically; parallel readers in other processes may write entries too."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    tmp_path.write_text(json.dumps(entry), encoding="utf-8")
+    tmp_path.replace(path)
+
+
+def entries_dir_of(env):
+    """Return the entry cache of the submodule the current document belongs to, or None."""
+    prefix, sep, _ = env.docname.partition("/")
+    return getattr(env, "hed_api_cache_dirs", {}).get(prefix) if sep else None
+
+
+def select_entries(app, env, docnames):
+    """Choose the entry caches for the documents about to be read, from the submodules' current state."""
+    if not app.config.hed_api_cache:
+        env.hed_api_cache_dirs = {}
+        return
+    env.hed_api_cache_dirs = {name: key_dir / "entries" for name, (_, key_dir) in cacheable_submodules(app).items()}
+
+
+def forget_entries(app, env):
+    """Drop the entry caches so the pickled environment does not carry them into later builds."""
+    env.hed_api_cache_dirs = {}
+
+
+def context_of(env):
+    return env.docname, env.ref_context.get("py:module"), env.ref_context.get("py:class")
+
+
+class CachedAutodocDirective:
+    """Mixin for the autodoc directives replaying the content generated for the same object from the cache."""
+
+    def run(self):
+        entries_dir = entries_dir_of(self.env)
+        if entries_dir is None:
+            return super().run()
+        path = entry_path(
+            entries_dir,
+            self.name,
+            self.arguments,
+            sorted(self.options.items()),
+            list(self.content),
+            context_of(self.env),
+        )
+        record_dependencies = self.state.document.settings.record_dependencies
+        entry = load_entry(path)
+        if entry is not None:
+            record_dependencies.add(*entry["dependencies"])
+            content = StringList(entry["lines"], items=[tuple(item) for item in entry["items"]])
+            return cached_parse(self.original_parse, self.state, content, entry["titles_allowed"])
+
+        before = set(record_dependencies.list)
+        capture = {}
+        token = _capture.set(capture)
+        try:
+            result = super().run()
+        finally:
+            _capture.reset(token)
+        if capture:
+            capture["dependencies"] = [name for name in record_dependencies.list if name not in before]
+            save_entry(path, capture)
+        return result
+
+
+class CachedAutosummary(Autosummary):
+    """Autosummary directive reading the rows of its table from the cache."""
+
+    def get_items(self, names):
+        entries_dir = entries_dir_of(self.env)
+        if entries_dir is None:
+            return super().get_items(names)
+        options = sorted((name, self.options.get(name)) for name in ("nosignatures", "signatures"))
+        path = entry_path(entries_dir, "autosummary", names, options, context_of(self.env))
+        entry = load_entry(path)
+        if entry is not None:
+            return [tuple(item) for item in entry["items"]]
+        items = super().get_items(names)
+        save_entry(path, {"items": items})
+        return items
+
+
+def record_content(parse):
+    """Wrap an autodoc ``parse_generated_content`` function so it captures the content it parses."""
+
+    def parse_generated_content(state, content, titles_allowed):
+        capture = _capture.get()
+        if capture is not None:
+            capture.update(
+                lines=list(content),
+                items=list(content.items),
+                titles_allowed=titles_allowed if isinstance(titles_allowed, bool) else titles_allowed.titles_allowed,
+            )
+        return parse(state, content, titles_allowed)
+
+    parse_generated_content.hed_original = parse
+    return parse_generated_content
+
+
+def cached_parse(parse, state, content, titles_allowed):
+    """Parse cached content the way the autodoc directive would have parsed it."""
+    if "titles_allowed" in inspect.signature(parse).parameters:
+        return parse(state, content, titles_allowed)
+    # Before Sphinx 9 the parser takes the documenter, of which only titles_allowed is used
+    return parse(state, content, SimpleNamespace(titles_allowed=titles_allowed))
+
+
+def install_directives(app, config):
+    """Replace the autodoc and autosummary directives by their caching versions."""
+    if not config.hed_api_cache:
+        return
+    for name, directive in list(directives._directives.items()):
+        if not name.startswith("auto") or not isinstance(directive, type):
+            continue
+        if issubclass(directive, AutodocDirective) and not issubclass(directive, CachedAutodocDirective):
+            module = sys.modules[directive.__module__]
+            if not hasattr(module.parse_generated_content, "hed_original"):
+                module.parse_generated_content = record_content(module.parse_generated_content)
+            namespace = {"original_parse": staticmethod(module.parse_generated_content.hed_original)}
+            cached = type(f"Cached{directive.__name__}", (CachedAutodocDirective, directive), namespace)
+            app.add_directive(name, cached, override=True)
+    app.add_directive("autosummary", CachedAutosummary, override=True)
+
+
+def store_stubs(key_dir, root, files):
+    """Copy the generated stub files below root into the cache."""
+    stubs = []
+    for path in files:
+        path = Path(path)
+        if path.is_file() and path.is_relative_to(root):
+            rel_path = path.relative_to(root).as_posix()
+            target = key_dir / "stubs" / rel_path
+            target.parent.mkdir(parents=True, exist_ok=True)
+            shutil.copyfile(path, target)
+            stubs.append(rel_path)
+    save_entry(key_dir / "stubs.json", stubs)
+
+
+def restore_stubs(key_dir, root, stubs):
+    """Copy cached stub files back, leaving files that are already up to date untouched."""
+    for rel_path in stubs:
+        source, target = key_dir / "stubs" / rel_path, root / rel_path
+        data = source.read_bytes()
+        if not target.is_file() or target.read_bytes() != data:
+            target.parent.mkdir(parents=True, exist_ok=True)
+            target.write_bytes(data)
+
+
+def generate_stubs(app):
+    """Restore or generate the autosummary stubs of cacheable submodules before autosummary runs.
+
+    The submodules handled here are removed from ``autosummary_generate`` for
+    this run, so autosummary only processes the remaining documents.
+    """
+    env = app.env
+    genfiles = app.config.autosummary_generate
+    if not app.config.hed_api_cache or genfiles is False:
+        return
+
+    suffixes = tuple(app.config.source_suffix)
+    if genfiles is True:
+        # A pickled environment still lists the documents of the previous build
+        env.find_files(app.config, app.builder)
+        genfiles = [str(env.doc2path(docname)) for docname in sorted(env.found_docs)]
+        genfiles = [name for name in genfiles if Path(name).is_file()]
+    else:
+        genfiles = [name if name.endswith(suffixes) else name + suffixes[0] for name in genfiles]
+
+    keys = cacheable_submodules(app)
+    # Stubs are written below the directory autosummary reads a submodule's documents from
+    roots = {name: stub_root(app, name) for name in keys}
+    per_submodule, remaining = {}, []
+    for name in genfiles:
+        path = Path(app.srcdir, name)
+        prefix = next((prefix for prefix, root in roots.items() if path.is_relative_to(root)), None)
+        if prefix is not None:
+            per_submodule.setdefault(prefix, []).append(name)
+        else:
+            remaining.append(name)
+
+    suffix = get_rst_suffix(app)
+    for name, files in sorted(per_submodule.items()):
+        if suffix is None:
+            remaining.extend(files)
+            continue
+        commit, key_dir = keys[name]
+        root = roots[name]
+        stubs = load_entry(key_dir / "stubs.json")
+        if stubs is not None:
+            restore_stubs(key_dir, root, stubs)
+            logger.info(f"[hed_api_cache] restored {len(stubs)} autosummary stubs of {name} ({commit[:10]})")
+            continue
+
+        # A new key replaces the entries cached for earlier commits
+        for old_dir in key_dir.parent.glob("*"):
+            if old_dir != key_dir:
+                shutil.rmtree(old_dir, ignore_errors=True)
+        with mock(app.config.autosummary_mock_imports):
+            generated = generate_autosummary_docs(
+                [str(Path(app.srcdir, file)) for file in files],
+                suffix=suffix,
+                app=app,
+                imported_members=app.config.autosummary_imported_members,
+                overwrite=app.config.autosummary_generate_overwrite,
+                encoding=app.config.source_encoding,
+            )
+        store_stubs(key_dir, root, generated)
+
+    app._hed_api_cache_generate = app.config.autosummary_generate
+    app.config.autosummary_generate = remaining
+
+
+def restore_autosummary_option(app):
+    """Restore autosummary_generate so the pickled configuration does not change."""
+    if getattr(app, "_hed_api_cache_generate", None) is not None:
+        app.config.autosummary_generate = app._hed_api_cache_generate
+        app._hed_api_cache_generate = None
+
+
+def setup(app):
+    app.add_config_value("hed_api_cache", False, "", bool)
+    app.add_config_value("hed_api_cache_dir", ".cache/api", "", str)
+    app.connect("config-inited", install_directives, priority=800)
+    # After hed_sources maps the documents (100), before autosummary generates stubs (500)
+    app.connect("builder-inited", generate_stubs, priority=400)
+    app.connect("builder-inited", restore_autosummary_option, priority=850)
+    app.connect("env-before-read-docs", select_entries)
+    app.connect("env-updated", forget_entries)
+    return {"version": "1.0", "parallel_read_safe": True, "parallel_write_safe": True}
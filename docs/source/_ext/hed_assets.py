@@ -0,0 +1,370 @@
+"""Sphinx extension optimizing the static assets of the built HTML.
+
+With ``hed_optimize_assets`` enabled, after each HTML build:
+
+- the CSS and JavaScript of ``docs/source/_static`` are minified in the output;
+- every file in ``_static`` (including furo's assets and the submodules' static
+  files) gets a content-hashed copy next to it, ``name.<hash>.ext``, whose
+  ``url()`` references are rewritten for stylesheets;
+- ``href`` and ``src`` references to ``_static`` in the generated HTML are
+  rewritten to the hashed copies, so browsers and CDNs can cache them for good
+  (hed-serve-docs marks hashed names as immutable);
+- with ``hed_precompress`` enabled, ``.gz`` siblings, and ``.br`` siblings
+  when the ``brotli`` package is installed, are written for the HTML,
+  JavaScript, CSS, JSON and SVG files that changed. They only help servers
+  that send them (hed-serve-docs); hosts that cannot, such as GitHub Pages,
+  are built without them.
+
+The unhashed files stay in place for references made from scripts. All pages
+are re-checked on every build, since Sphinx does not rewrite unchanged pages
+when an asset changes; the mapping of the previous build is kept in
+``.asset-manifest.json`` to recognize the hashed names it wrote, and hashed
+copies no longer in use are removed.
+"""
+
+import gzip
+import hashlib
+import json
+import os
+import posixpath
+import re
+import time
+import urllib.parse
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from sphinx.util import logging
+
+try:
+    import brotli
+except ImportError:  # Optional; only .gz siblings are written without it
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+MANIFEST = ".asset-manifest.json"
+MANIFEST_VERSION = 1
+HASH_LENGTH = 10
+# Names that already carry a content hash (ours or a theme's)
+HASHED_NAME = re.compile(r"\.[0-9a-f]{8,}\.\w+$")
+COMPRESSIBLE = {".html", ".js", ".css", ".json", ".svg"}
+MIN_COMPRESS_SIZE = 1024
+MINIFIABLE = {".css", ".js"}
+
+REFERENCE = re.compile(r"""(?P<prefix>\b(?:href|src)=)(?P<quote>["'])(?P<url>[^"'<>]*)(?P=quote)""")
+CSS_URL = re.compile(r"""url\(\s*(?P<quote>["']?)(?P<url>[^"')]+)(?P=quote)\s*\)""")
+# Strings and /*! ... */ license comments are kept as they are; other comments are dropped
+CSS_TOKEN = re.compile(r"""("(?:\\.|[^"\\])*"|'(?:\\.|[^'\\])*'|/\*!.*?\*/)|/\*.*?\*/""", re.DOTALL)
+CSS_PRESERVED = re.compile(r"""("(?:\\.|[^"\\])*"|'(?:\\.|[^'\\])*'|/\*!.*?\*/)""", re.DOTALL)
+CSS_SPACE = re.compile(r"\s*([{};,>])\s*|:\s+")
+# Characters after which a slash starts a regular expression literal rather than a division
+REGEX_PRECEDING = set("(,=:[!&|?{};+-*%<>~^") | {""}
+
+
+def minify_css(text):
+    """Remove comments and redundant whitespace from a stylesheet, leaving strings and license comments untouched."""
+    text = CSS_TOKEN.sub(lambda match: match.group(1) or " ", text)
+    # Strings and license comments are at the odd positions
+    parts = CSS_PRESERVED.split(text)
+    for index in range(0, len(parts), 2):
+        part = re.sub(r"\s+", " ", parts[index])
+        parts[index] = CSS_SPACE.sub(lambda match: match.group(1) or ":", part).replace(";}", "}")
+    return "".join(parts).strip() + "\n"
+
+
+def literal_end(text, start):
+    """Return the index just past the string or template literal starting at ``start``.
+
+    Expressions in template literals may contain strings, braces and nested templates.
+    """
+    quote, i, n = text[start], start + 1, len(text)
+    while i < n:
+        char = text[i]
+        if char == "\\":
+            i += 2
+        elif char == quote:
+            return i + 1
+        elif quote == "`" and text.startswith("${", i):
+            i, depth = i + 2, 1
+            while i < n and depth:
+                if text[i] in "'\"`":
+                    i = literal_end(text, i)
+                    continue
+                depth += {"{": 1, "}": -1}.get(text[i], 0)
+                i += 1
+        else:
+            i += 1
+    return n
+
+
+def minify_js(text):
+    """Remove comments, indentation, blank lines and repeated spaces from a script.
+
+    Line breaks are kept, so automatic semicolon insertion is unaffected.
+    Strings, template literals, regular expression literals and ``/*! ... */``
+    license comments are copied unchanged.
+    """
+    output = []
+    i, n = 0, len(text)
+    previous = ""  # Last significant character written
+    while i < n:
+        char = text[i]
+        if char in "'\"`":
+            end = literal_end(text, i)
+            output.append(text[i:end])
+            i, previous = end, char
+        elif text.startswith("//", i):
+            end = text.find("\n", i)
+            i = n if end == -1 else end
+        elif text.startswith("/*", i):
+            end = text.find("*/", i + 2)
+            end = n if end == -1 else end + 2
+            if text.startswith("/*!", i):
+                output.append(text[i:end])
+            elif output and output[-1] not in " \n":
+                output.append(" ")
+            i = end
+        elif char == "/" and previous in REGEX_PRECEDING:
+            end, in_class = i + 1, False
+            while end < n and (text[end] != "/" or in_class) and text[end] != "\n":
+                if text[end] == "\\":
+                    end += 1
+                elif text[end] in "[]":
+                    in_class = text[end] == "["
+                end += 1
+            output.append(text[i : end + 1])
+            i, previous = end + 1, "/"
+        elif char.isspace():
+            end = i
+            while end < n and text[end].isspace():
+                end += 1
+            if "\n" in text[i:end]:
+                # Drops the indentation of the next line and any blank lines
+                if output and output[-1] == " ":
+                    output.pop()
+                if output and output[-1] != "\n":
+                    output.append("\n")
+            elif output and output[-1] not in " \n":
+                output.append(" ")
+            i = end
+        else:
+            output.append(char)
+            i, previous = i + 1, char
+    return "".join(output).strip() + "\n"
+
+
+MINIFIERS = {".css": minify_css, ".js": minify_js}
+
+
+def content_hash(data):
+    return hashlib.sha256(data).hexdigest()[:HASH_LENGTH]
+
+
+def hashed_name(path, digest):
+    return f"{path.stem}.{digest}{path.suffix}"
+
+
+def load_manifest(outdir):
+    try:
+        manifest = json.loads((outdir / MANIFEST).read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return {}
+    return manifest["assets"] if manifest.get("version") == MANIFEST_VERSION else {}
+
+
+def save_manifest(outdir, assets):
+    manifest = {"version": MANIFEST_VERSION, "assets": assets}
+    (outdir / MANIFEST).write_text(json.dumps(manifest, indent=1, sort_keys=True), encoding="utf-8")
+
+
+def minify_own_assets(srcdir, static_dir):
+    """Minify the output copies of the stylesheets and scripts in the source _static directory."""
+    minified = 0
+    source_static = srcdir / "_static"
+    for source in source_static.iterdir() if source_static.is_dir() else []:
+        target = static_dir / source.name
+        if source.suffix not in MINIFIABLE or not target.is_file():
+            continue
+        text = target.read_text(encoding="utf-8")
+        result = MINIFIERS[source.suffix](text)
+        if result != text:
+            target.write_text(result, encoding="utf-8")
+            minified += 1
+    return minified
+
+
+def rewrite_css_urls(text, css_rel, assets):
+    """Point the url() references of a stylesheet at the hashed copies of their targets."""
+
+    def replace(match):
+        url = match.group("url")
+        parts = urllib.parse.urlsplit(url)
+        if parts.scheme or parts.netloc or url.startswith(("/", "#")):
+            return match.group()
+        target = posixpath.normpath(posixpath.join(posixpath.dirname(css_rel), urllib.parse.unquote(parts.path)))
+        hashed = assets.get(target)
+        if hashed is None:
+            return match.group()
+        new_path = parts.path[: len(parts.path) - len(posixpath.basename(parts.path))] + posixpath.basename(hashed)
+        fragment = f"#{parts.fragment}" if parts.fragment else ""
+        return f'url("{new_path}{fragment}")'
+
+    return CSS_URL.sub(replace, text)
+
+
+def fingerprint_assets(outdir, static_dir):
+    """Write content-hashed copies of the files in _static.
+
+    Returns:
+        dict: Site-relative path of each asset -> site-relative path of its hashed copy.
+    """
+    files = [
+        path
+        for path in sorted(static_dir.rglob("*"))
+        if path.is_file() and not HASHED_NAME.search(path.name) and path.suffix not in (".gz", ".br")
+    ]
+    assets = {}
+    # Stylesheets last, so their url() references can point at the hashed copies
+    for path in sorted(files, key=lambda path: path.suffix == ".css"):
+        rel_path = path.relative_to(outdir).as_posix()
+        data = path.read_bytes()
+        if path.suffix == ".css":
+            data = rewrite_css_urls(data.decode("utf-8"), rel_path, assets).encode("utf-8")
+        target = path.with_name(hashed_name(path, content_hash(data)))
+        # The name determines the content, so an existing copy is kept with its compressed siblings
+        if not target.is_file():
+            target.write_bytes(data)
+        assets[rel_path] = target.relative_to(outdir).as_posix()
+    return assets
+
+
+def rewrite_page(page, text, assets, originals):
+    """Point the href and src references of a page at the hashed copies of their targets."""
+    page_dir = posixpath.dirname(page)
+
+    def replace(match):
+        url = match.group("url")
+        parts = urllib.parse.urlsplit(url)
+        if parts.scheme or parts.netloc or not parts.path or url.startswith("/"):
+            return match.group()
+        target = posixpath.normpath(posixpath.join(page_dir, urllib.parse.unquote(parts.path)))
+        hashed = assets.get(originals.get(target, target))
+        if hashed is None:
+            return match.group()
+        # The hashed copy sits next to the original, so only the file name changes; cache-busting queries go
+        new_path = parts.path[: len(parts.path) - len(posixpath.basename(parts.path))] + posixpath.basename(hashed)
+        fragment = f"#{parts.fragment}" if parts.fragment else ""
+        return f"{match.group('prefix')}{match.group('quote')}{new_path}{fragment}{match.group('quote')}"
+
+    return REFERENCE.sub(replace, text)
+
+
+def rewrite_pages(outdir, assets, previous):
+    """Rewrite the asset references of every page; returns the number of pages changed."""
+    # Hashed names written by this or the previous build -> the asset they are a copy of
+    originals = {hashed: original for mapping in (previous, assets) for original, hashed in mapping.items()}
+    changed = 0
+    for path in outdir.rglob("*.html"):
+        text = path.read_text(encoding="utf-8")
+        result = rewrite_page(path.relative_to(outdir).as_posix(), text, assets, originals)
+        if result != text:
+            path.write_text(result, encoding="utf-8")
+            changed += 1
+    return changed
+
+
+def remove_stale_copies(outdir, assets, previous):
+    """Delete hashed copies of the previous build that are no longer current, with their compressed siblings."""
+    current = set(assets.values())
+    for hashed in set(previous.values()) - current:
+        for suffix in ("", ".gz", ".br"):
+            (outdir / (hashed + suffix)).unlink(missing_ok=True)
+
+
+def encoders():
+    """Return (suffix, compress function) for each precompressed variant to write."""
+    variants = [(".gz", lambda data: gzip.compress(data, compresslevel=9, mtime=0))]
+    if brotli is not None:
+        variants.append((".br", lambda data: brotli.compress(data, quality=11)))
+    return variants
+
+
+def compress_file(path, variants):
+    """Write the compressed siblings of a file that are missing or older than it; returns how many were written."""
+    mtime_ns = path.stat().st_mtime_ns
+    data = None
+    written = 0
+    for suffix, compress in variants:
+        sibling = path.with_name(path.name + suffix)
+        if sibling.is_file() and sibling.stat().st_mtime_ns >= mtime_ns:
+            continue
+        if data is None:
+            data = path.read_bytes()
+        sibling.write_bytes(compress(data))
+        written += 1
+    return written
+
+
+def compress_site(outdir, jobs, precompress=True):
+    """Precompress the text files of the site and delete compressed siblings whose file is gone.
+
+    Without ``precompress``, every compressed sibling left by earlier builds is deleted.
+    """
+    variants = encoders()
+    candidates = []
+    for path in outdir.rglob("*"):
+        if path.suffix in (".gz", ".br"):
+            if not precompress or not path.with_suffix("").is_file():
+                path.unlink()
+        elif path.suffix in COMPRESSIBLE and path.is_file() and path.stat().st_size >= MIN_COMPRESS_SIZE:
+            candidates.append(path)
+    if not precompress:
+        return 0
+    # zlib and brotli release the GIL while compressing
+    with ThreadPoolExecutor(max_workers=jobs) as executor:
+        return sum(executor.map(lambda path: compress_file(path, variants), candidates))
+
+
+def optimize_assets(app, exception):
+    """Minify, fingerprint and precompress the assets of a finished HTML build."""
+    # json and pickle builders have the html format too, but write no .html pages
+    if (
+        exception is not None
+        or not app.config.hed_optimize_assets
+        or app.builder.format != "html"
+        or app.builder.out_suffix != ".html"
+    ):
+        return
+    start = time.perf_counter()
+    outdir = Path(app.outdir)
+    static_dir = outdir / "_static"
+    if not static_dir.is_dir():
+        return
+
+    minified = minify_own_assets(Path(app.srcdir), static_dir)
+    previous = load_manifest(outdir)
+    assets = fingerprint_assets(outdir, static_dir)
+    pages = rewrite_pages(outdir, assets, previous)
+    remove_stale_copies(outdir, assets, previous)
+    save_manifest(outdir, assets)
+    precompress = app.config.hed_precompress
+    compressed = compress_site(outdir, os.cpu_count() or 1, precompress)
+
+    if not precompress:
+        compression = "no precompressed files"
+    elif brotli is not None:
+        compression = f"{compressed} gzip and brotli files"
+    else:
+        compression = f"{compressed} gzip (install brotli for .br files) files"
+    logger.info(
+        f"[hed_assets] minified {minified} files, fingerprinted {len(assets)} assets, rewrote {pages} pages, "
+        f"wrote {compression} in {time.perf_counter() - start:.1f}s"
+    )
+
+
+def setup(app):
+    app.add_config_value("hed_optimize_assets", False, "", bool)
+    app.add_config_value("hed_precompress", True, "", bool)
+    # After hed_search_shards has written the final search index (500)
+    app.connect("build-finished", optimize_assets, priority=900)
+    return {"version": "1.0", "parallel_read_safe": True, "parallel_write_safe": True}
@@ -0,0 +1,302 @@
+"""Sphinx extension optimizing the images of the built HTML.
+
+With ``hed_optimize_images`` enabled, after each HTML build:
+
+- the PNG files in ``_images`` (the images of the pages, including those of
+  the submodules) and ``_static`` are recompressed losslessly, and kept only
+  when that makes them smaller;
+- WebP versions of the page images are written next to them, at full size and
+  at each width of ``hed_image_widths`` below the original width
+  (``name-640w.<hash>.webp``);
+- the ``<img>`` tags of the page images are wrapped in a ``<picture>`` offering
+  the WebP versions through ``srcset``, and get ``width``/``height`` (so the
+  layout does not shift while they load), ``loading="lazy"`` and
+  ``decoding="async"``.
+
+Recompression and WebP conversion need Pillow; without it only the attributes
+are added. Results are cached in ``.cache/images`` by the hash of each source
+image, so unchanged images are not processed again, and WebP files no longer
+referenced by any page are removed from the output.
+"""
+
+import hashlib
+import html
+import json
+import posixpath
+import re
+import shutil
+import struct
+import time
+import urllib.parse
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from pathlib import Path
+
+from sphinx.util import logging
+
+try:
+    from PIL import Image, features
+except ImportError:  # Optional; only width/height and lazy loading are added without it
+    Image = None
+
+logger = logging.getLogger(__name__)
+
+CACHE_VERSION = 1
+RASTER_SUFFIXES = {".png", ".jpg", ".jpeg"}
+WEBP_QUALITY = 85
+# Furo's content column; wider images are scaled down to it
+CONTENT_WIDTH = "46em"
+
+IMG_TAG = re.compile(r"<img\b(?P<attrs>[^>]*?)\s*/?>", re.IGNORECASE)
+ATTRIBUTE = re.compile(r"""([\w:-]+)\s*=\s*(?:"([^"]*)"|'([^']*)')""")
+WEBP_NAME = re.compile(r"[^\s\"',/]+-\d+w\.[0-9a-f]{10}\.webp|[^\s\"',/]+\.[0-9a-f]{10}\.webp")
+# The content-hashed copies written by hed_assets in earlier builds
+HASHED_COPY = re.compile(r"\.[0-9a-f]{10}\.\w+$")
+JPEG_SOF = set(range(0xC0, 0xD0)) - {0xC4, 0xC8, 0xCC}
+
+
+def image_size(data):
+    """Return the (width, height) of PNG or JPEG data from its header, or None."""
+    if data.startswith(b"\x89PNG\r\n\x1a\n") and data[12:16] == b"IHDR":
+        return struct.unpack(">II", data[16:24])
+    if data.startswith(b"\xff\xd8"):
+        i = 2
+        while i + 9 < len(data):
+            if data[i] != 0xFF:
+                return None
+            marker, length = data[i + 1], struct.unpack(">H", data[i + 2 : i + 4])[0]
+            if marker in JPEG_SOF:
+                height, width = struct.unpack(">HH", data[i + 5 : i + 9])
+                return width, height
+            i += 2 + length
+    return None
+
+
+def settings_of(config):
+    """Return what, besides the source image, the cached results depend on."""
+    return {
+        "version": CACHE_VERSION,
+        "widths": sorted(config.hed_image_widths),
+        "quality": WEBP_QUALITY,
+        "pillow": Image.__version__ if Image is not None else None,
+    }
+
+
+def recompress_png(data):
+    """Return losslessly recompressed PNG data, or None if that is not smaller."""
+    with Image.open(BytesIO(data)) as image:
+        output = BytesIO()
+        # Keep the ancillary data a browser uses
+        params = {key: image.info[key] for key in ("icc_profile", "gamma", "dpi", "transparency") if key in image.info}
+        image.save(output, "PNG", optimize=True, **params)
+    result = output.getvalue()
+    return result if len(result) < len(data) else None
+
+
+def webp_versions(data, widths, lossless):
+    """Return {width: WebP data} for the full size and each smaller width."""
+    versions = {}
+    with Image.open(BytesIO(data)) as image:
+        image.load()
+        if image.mode not in ("RGB", "RGBA"):
+            image = image.convert("RGBA" if "transparency" in image.info or "A" in image.mode else "RGB")
+        for width in [w for w in sorted(widths) if w < image.width] + [image.width]:
+            resized = (
+                image
+                if width == image.width
+                else image.resize((width, round(image.height * width / image.width)), Image.LANCZOS)
+            )
+            output = BytesIO()
+            if lossless:
+                resized.save(output, "WEBP", lossless=True, method=4)
+            else:
+                resized.save(output, "WEBP", quality=WEBP_QUALITY, method=4)
+            versions[width] = output.getvalue()
+    return versions
+
+
+def webp_name(path, width, full_width, digest):
+    return f"{path.stem}.{digest}.webp" if width == full_width else f"{path.stem}-{width}w.{digest}.webp"
+
+
+def cache_entry(cache_dir, digest):
+    return cache_dir / digest[:2] / digest
+
+
+def save_entry(entry_dir, meta, files):
+    """Write a cache entry: its meta.json and {file name: data}."""
+    shutil.rmtree(entry_dir, ignore_errors=True)
+    entry_dir.mkdir(parents=True)
+    for name, data in files.items():
+        (entry_dir / name).write_bytes(data)
+    (entry_dir / "meta.json").write_text(json.dumps(meta), encoding="utf-8")
+
+
+def process_image(path, cache_dir, settings, with_webp):
+    """Optimize one output image, using and filling the cache.
+
+    Returns:
+        dict: {"width", "height", "webp": [[width, file name], ...]} (sizes may be None).
+    """
+    data = path.read_bytes()
+    digest = hashlib.sha256(data).hexdigest()
+    entry_dir = cache_entry(cache_dir, digest)
+    try:
+        meta = json.loads((entry_dir / "meta.json").read_text(encoding="utf-8"))
+        if meta["settings"] != settings or (with_webp and meta["webp"] is None):
+            meta = None
+    except (OSError, ValueError, KeyError):
+        meta = None
+
+    if meta is None:
+        files = {}
+        size = image_size(data)
+        meta = {"settings": settings, "width": None, "height": None, "optimized": False, "webp": None}
+        if size is not None:
+            meta["width"], meta["height"] = size
+        if Image is not None:
+            optimized = recompress_png(data) if path.suffix == ".png" else None
+            if optimized is not None:
+                files["optimized"] = optimized
+                meta["optimized"] = True
+            if with_webp and meta["width"] and features.check("webp"):
+                versions = webp_versions(optimized or data, settings["widths"], lossless=path.suffix == ".png")
+                smallest_original = len(optimized or data)
+                # Not worth offering when even the full-size WebP is not smaller than the original
+                if versions[meta["width"]] and len(versions[meta["width"]]) < smallest_original:
+                    meta["webp"] = []
+                    for width, webp in versions.items():
+                        name = webp_name(path, width, meta["width"], digest[:10])
+                        files[name] = webp
+                        meta["webp"].append([width, name])
+                else:
+                    meta["webp"] = []
+        save_entry(entry_dir, meta, files)
+        if meta["optimized"]:
+            # An output image left optimized by an earlier build then finds the same WebP versions
+            files.pop("optimized")
+            save_entry(
+                cache_entry(cache_dir, hashlib.sha256(optimized).hexdigest()), {**meta, "optimized": False}, files
+            )
+
+    if meta["optimized"]:
+        shutil.copyfile(entry_dir / "optimized", path)
+    # A cached entry of the same image used as a page image elsewhere may have WebP versions
+    for _, name in meta["webp"] if with_webp and meta["webp"] else []:
+        target = path.with_name(name)
+        if not target.is_file():
+            shutil.copyfile(entry_dir / name, target)
+    return meta
+
+
+def picture_tag(attrs_text, attrs, page_dir, src_path, info):
+    """Return the replacement markup of an <img> tag for an optimized image."""
+    extra = []
+    if (
+        info["width"]
+        and not any(name in attrs for name in ("width", "height"))
+        and "width" not in attrs.get("style", "")
+    ):
+        extra.append(f'width="{info["width"]}" height="{info["height"]}"')
+    extra.append('loading="lazy" decoding="async"')
+    img = f"<img{attrs_text} {' '.join(extra)} />"
+    if not info["webp"]:
+        return img
+
+    base = posixpath.relpath(posixpath.dirname(src_path), page_dir or ".")
+    srcset = ", ".join(f"{urllib.parse.quote(posixpath.join(base, name))} {width}w" for width, name in info["webp"])
+    sizes = f"(max-width: {CONTENT_WIDTH}) 100vw, min({info['width']}px, {CONTENT_WIDTH})"
+    source = f'<source type="image/webp" srcset="{html.escape(srcset)}" sizes="{sizes}" />'
+    return f"<picture>{source}{img}</picture>"
+
+
+def page_images(page, text):
+    """Yield (match, attributes, site path of the image) for the unprocessed <img> tags of a page in _images."""
+    page_dir = posixpath.dirname(page)
+    for match in IMG_TAG.finditer(text):
+        attrs = {
+            name.lower(): html.unescape(a if a is not None else b) for name, a, b in ATTRIBUTE.findall(match["attrs"])
+        }
+        src = attrs.get("src", "")
+        parts = urllib.parse.urlsplit(src)
+        if "loading" in attrs or parts.scheme or parts.netloc or not parts.path or src.startswith("/"):
+            continue
+        target = posixpath.normpath(posixpath.join(page_dir, urllib.parse.unquote(parts.path)))
+        if target.startswith("_images/") and posixpath.splitext(target)[1].lower() in RASTER_SUFFIXES:
+            yield match, attrs, target
+
+
+def optimize_images(app, exception):
+    """Recompress the images of a finished HTML build, add WebP versions and update the <img> tags."""
+    if (
+        exception is not None
+        or not app.config.hed_optimize_images
+        or app.builder.format != "html"
+        or app.builder.out_suffix != ".html"
+    ):
+        return
+    start = time.perf_counter()
+    outdir = Path(app.outdir)
+    cache_dir = Path(app.confdir).resolve().parent.parent / app.config.hed_image_cache_dir
+    settings = settings_of(app.config)
+
+    pages = {}
+    content_images = set()
+    for path in outdir.rglob("*.html"):
+        text = path.read_text(encoding="utf-8")
+        if "<img" in text:
+            page = path.relative_to(outdir).as_posix()
+            pages[page] = text
+            content_images.update(target for _, _, target in page_images(page, text) if (outdir / target).is_file())
+    png_files = {
+        path.relative_to(outdir).as_posix()
+        for folder in ("_images", "_static")
+        for path in (outdir / folder).rglob("*.png")
+        if not HASHED_COPY.search(path.name)
+    }
+
+    def process(target):
+        return target, process_image(outdir / target, cache_dir, settings, target in content_images)
+
+    with ThreadPoolExecutor() as executor:
+        infos = dict(executor.map(process, sorted(content_images | png_files)))
+
+    referenced = set()
+    rewritten = 0
+    for page, text in pages.items():
+        page_dir = posixpath.dirname(page)
+        parts, last = [], 0
+        for match, attrs, target in page_images(page, text):
+            info = infos.get(target)
+            if info is None:
+                continue
+            parts += [text[last : match.start()], picture_tag(match["attrs"], attrs, page_dir, target, info)]
+            last = match.end()
+        result = "".join(parts) + text[last:]
+        referenced.update(WEBP_NAME.findall(result))
+        if result != text:
+            (outdir / page).write_text(result, encoding="utf-8")
+            rewritten += 1
+
+    removed = 0
+    images_dir = outdir / "_images"
+    for path in images_dir.glob("*.webp") if images_dir.is_dir() else []:
+        if WEBP_NAME.fullmatch(path.name) and path.name not in referenced:
+            path.unlink()
+            removed += 1
+
+    webp = sum(len(infos[target]["webp"] or []) for target in content_images)
+    note = "" if Image is not None else " (install Pillow to recompress and convert images)"
+    logger.info(
+        f"[hed_images] processed {len(infos)} images ({webp} WebP versions) and updated {rewritten} pages, "
+        f"removed {removed} unused WebP files in {time.perf_counter() - start:.1f}s{note}"
+    )
+
+
+def setup(app):
+    app.add_config_value("hed_optimize_images", False, "", bool)
+    app.add_config_value("hed_image_widths", [480, 960, 1440], "", list)
+    app.add_config_value("hed_image_cache_dir", ".cache/images", "", str)
+    # Before hed_assets fingerprints and precompresses the output (900)
+    app.connect("build-finished", optimize_images, priority=800)
+    return {"version": "1.0", "parallel_read_safe": True, "parallel_write_safe": True}
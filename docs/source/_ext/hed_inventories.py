@@ -0,0 +1,28 @@
+"""Sphinx extension resolving intersphinx inventories from the local cache.
+
+Rewrites ``intersphinx_mapping`` before intersphinx validates it, so every
+inventory is read from ``.cache/intersphinx`` (see ``inventory_cache.py``)
+while it is younger than ``hed_inventory_ttl`` days. Missing or expired
+inventories are rebuilt from their checked-out submodule (hed-python, when
+its commit changed) or downloaded into the cache first, and an expired copy
+is still used when neither works.
+"""
+
+from inventory_cache import cached_mapping
+from sphinx.util import logging
+
+logger = logging.getLogger(__name__)
+
+
+def use_cached_inventories(app, config):
+    if not config.hed_inventory_cache:
+        return
+    config.intersphinx_mapping = cached_mapping(config.intersphinx_mapping, config.hed_inventory_ttl, log=logger.info)
+
+
+def setup(app):
+    app.add_config_value("hed_inventory_cache", True, "", bool)
+    app.add_config_value("hed_inventory_ttl", 7, "", (int, float))
+    # intersphinx normalizes the mapping at priority 800
+    app.connect("config-inited", use_cached_inventories, priority=400)
+    return {"version": "1.0", "parallel_read_safe": True, "parallel_write_safe": True}
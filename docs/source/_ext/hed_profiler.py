@@ -0,0 +1,207 @@
+"""Sphinx extension profiling the unified documentation build.
+
+With ``hed_profile`` enabled (``hed-build-docs --profile``), the wall time and
+peak traced memory (``tracemalloc``) are recorded for each build phase
+(autosummary generation, read, resolve, write, search index and the
+build-finished handlers, which split the search index) and for every
+docname. Results are aggregated per integrated submodule and written as a JSON
+report, and the slowest documents are printed as a sorted table.
+
+Per-document figures are only collected for serial builds: with ``-j`` the
+reading and writing happen in worker processes.
+"""
+
+import json
+import time
+import tracemalloc
+from pathlib import Path
+
+import sphinx
+from build_unified import get_submodules
+from sphinx.util import logging
+
+logger = logging.getLogger(__name__)
+
+CORE_REPO = "hed-resources"
+DOC_PHASES = ("read", "resolve", "write")
+
+
+class BuildProfile:
+    """Collects nested wall-time and peak-memory measurements for a build."""
+
+    def __init__(self, submodule_names):
+        self.submodule_names = set(submodule_names)
+        self.phases = {}
+        self.docs = {}
+        self._stack = []
+        self._started = time.perf_counter()
+
+    def start(self):
+        """Begin a measurement nested in the current one."""
+        tracemalloc.reset_peak()
+        self._stack.append({"start": time.perf_counter(), "peak": 0})
+
+    def stop(self):
+        """End the innermost measurement and return its (seconds, peak_bytes)."""
+        frame = self._stack.pop()
+        seconds = time.perf_counter() - frame["start"]
+        peak = max(frame["peak"], tracemalloc.get_traced_memory()[1])
+        # A nested reset_peak() hides earlier peaks from the enclosing measurement
+        if self._stack:
+            self._stack[-1]["peak"] = max(self._stack[-1]["peak"], peak)
+        return seconds, peak
+
+    def add_phase(self, phase, seconds, peak):
+        entry = self.phases.setdefault(phase, {"seconds": 0.0, "peak_bytes": 0})
+        entry["seconds"] += seconds
+        entry["peak_bytes"] = max(entry["peak_bytes"], peak)
+
+    def add_doc(self, docname, phase, seconds, peak):
+        entry = self.docs.setdefault(docname, {"submodule": self.submodule_of(docname)})
+        entry[phase] = entry.get(phase, 0.0) + seconds
+        entry[f"{phase}_peak_bytes"] = max(entry.get(f"{phase}_peak_bytes", 0), peak)
+        entry["total"] = sum(entry.get(name, 0.0) for name in DOC_PHASES)
+
+    def submodule_of(self, docname):
+        """Return the integrated repository a docname belongs to."""
+        prefix = docname.split("/", 1)[0]
+        return prefix if prefix in self.submodule_names else CORE_REPO
+
+    def submodule_totals(self):
+        totals = {}
+        for entry in self.docs.values():
+            total = totals.setdefault(entry["submodule"], {"docs": 0, "total": 0.0, "peak_bytes": 0})
+            total["docs"] += 1
+            for phase in DOC_PHASES:
+                total[phase] = total.get(phase, 0.0) + entry.get(phase, 0.0)
+                total["peak_bytes"] = max(total["peak_bytes"], entry.get(f"{phase}_peak_bytes", 0))
+            total["total"] += entry["total"]
+        return dict(sorted(totals.items(), key=lambda item: item[1]["total"], reverse=True))
+
+    def report(self, builder_name):
+        return {
+            "sphinx": sphinx.__version__,
+            "builder": builder_name,
+            "total_seconds": time.perf_counter() - self._started,
+            "phases": self.phases,
+            "submodules": self.submodule_totals(),
+            "docs": dict(sorted(self.docs.items(), key=lambda item: item[1]["total"], reverse=True)),
+        }
+
+
+def _measured(profile, method, phase, doc_phase=None):
+    """Wrap a builder or environment method so each call is recorded under a phase.
+
+    With ``doc_phase``, the first positional argument is the docname and the call
+    is also recorded for that document.
+    """
+
+    def wrapper(*args, **kwargs):
+        profile.start()
+        try:
+            return method(*args, **kwargs)
+        finally:
+            seconds, peak = profile.stop()
+            if phase:
+                profile.add_phase(phase, seconds, peak)
+            if doc_phase:
+                profile.add_doc(args[0], doc_phase, seconds, peak)
+
+    return wrapper
+
+
+def start_profile(app):
+    """Start tracing and instrument the builder before any other builder-inited handler runs."""
+    if not app.config.hed_profile:
+        return
+    if app.parallel > 1:
+        logger.warning("[hed_profiler] per-document timings are incomplete in parallel builds")
+
+    tracemalloc.start()
+    repo_root = Path(app.confdir).resolve().parent.parent
+    profile = app._hed_profile = BuildProfile(get_submodules(repo_root))
+    builder, env = app.builder, app.env
+
+    builder.read = _measured(profile, builder.read, "read")
+    builder.read_doc = _measured(profile, builder.read_doc, None, doc_phase="read")
+    builder.write_doc = _measured(profile, builder.write_doc, "write", doc_phase="write")
+    if hasattr(builder, "dump_search_index"):
+        builder.dump_search_index = _measured(profile, builder.dump_search_index, "search_index")
+
+    write = builder.write
+
+    def write_with_resolve(*args, **kwargs):
+        # The environment is pickled during the read phase, so only wrap it while writing
+        env.get_and_resolve_doctree = _measured(profile, env.get_and_resolve_doctree, "resolve", doc_phase="resolve")
+        try:
+            return _measured(profile, write, "resolve_and_write")(*args, **kwargs)
+        finally:
+            del env.get_and_resolve_doctree
+
+    builder.write = write_with_resolve
+    profile.start()
+
+
+def end_autosummary(app):
+    """Record the builder-inited handlers (dominated by autosummary generation) as one phase."""
+    profile = getattr(app, "_hed_profile", None)
+    if profile is not None:
+        profile.add_phase("autosummary", *profile.stop())
+
+
+def start_finish(app, exception):
+    """Start measuring the build-finished handlers (dominated by splitting the search index)."""
+    profile = getattr(app, "_hed_profile", None)
+    if profile is not None and exception is None:
+        profile.start()
+
+
+def format_table(report, top):
+    """Return the phase, submodule and slowest-document tables of a report as text lines."""
+    lines = [f"Build profile ({report['total_seconds']:.1f}s total)", ""]
+    lines.append(f"{'phase':<24}{'seconds':>10}{'peak MB':>10}")
+    for phase, entry in report["phases"].items():
+        lines.append(f"{phase:<24}{entry['seconds']:>10.2f}{entry['peak_bytes'] / 1e6:>10.1f}")
+    lines += ["", f"{'submodule':<24}{'docs':>6}{'read':>8}{'resolve':>9}{'write':>8}{'total':>8}"]
+    for name, entry in report["submodules"].items():
+        lines.append(
+            f"{name:<24}{entry['docs']:>6}{entry['read']:>8.2f}{entry['resolve']:>9.2f}"
+            f"{entry['write']:>8.2f}{entry['total']:>8.2f}"
+        )
+    lines += ["", f"{'document':<56}{'read':>8}{'resolve':>9}{'write':>8}{'total':>8}"]
+    for docname, entry in list(report["docs"].items())[:top]:
+        lines.append(
+            f"{docname[:55]:<56}{entry.get('read', 0.0):>8.2f}{entry.get('resolve', 0.0):>9.2f}"
+            f"{entry.get('write', 0.0):>8.2f}{entry['total']:>8.2f}"
+        )
+    return lines
+
+
+def write_report(app, exception):
+    """Write the JSON report and print the top-N table when the build finishes."""
+    profile = getattr(app, "_hed_profile", None)
+    if profile is None or exception is not None:
+        return
+    profile.add_phase("finish", *profile.stop())
+    report = profile.report(app.builder.name)
+    tracemalloc.stop()
+
+    # Builders run side by side by hed-build-docs --builders each write their own report
+    default_name = "profile.json" if app.builder.name == "html" else f"profile-{app.builder.name}.json"
+    output = Path(app.config.hed_profile_output or Path(app.outdir).parent / default_name)
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(report, indent=2), encoding="utf-8")
+    for line in format_table(report, app.config.hed_profile_top):
+        logger.info(line)
+    logger.info(f"[hed_profiler] report written to {output}")
+
+
+def setup(app):
+    app.add_config_value("hed_profile", False, "", bool)
+    app.add_config_value("hed_profile_output", "", "", str)
+    app.add_config_value("hed_profile_top", 20, "", int)
+    app.connect("builder-inited", start_profile, priority=1)
+    app.connect("builder-inited", end_autosummary, priority=999)
+    app.connect("build-finished", start_finish, priority=1)
+    app.connect("build-finished", write_report, priority=999)
+    return {"version": "1.0", "parallel_read_safe": True, "parallel_write_safe": True}
@@ -0,0 +1,162 @@
+"""Sphinx extension splitting the HTML search index into per-repository shards.
+
+Sphinx writes one ``searchindex.js`` covering the core documentation and every
+integrated repository, and the search page downloads and parses all of it for
+each query. With ``hed_search_shards`` enabled, the finished index is split by
+repository prefix (``hed-python/``, ``hed-schemas/``, ...; pages without a
+prefix belong to the core ``hed-resources`` shard) into ``_searchindex/<repo>.js``.
+``searchindex.js`` is replaced by a small loader holding a key-to-shard map of
+the index terms, titles, index entries and object names. The loader fetches
+only the shards the query can match, merges them and hands the result to
+Sphinx's ``Search.setIndex``. It also records the repository of every loaded
+document for ``search_labels.js``.
+
+The unsplit index is kept as ``_searchindex/full.js``. It is the loader's
+fallback and is restored before the next incremental build, because Sphinx
+updates the previous index instead of rebuilding it.
+"""
+
+import json
+import shutil
+from pathlib import Path
+
+from sphinx.search import js_index
+from sphinx.util import logging
+
+logger = logging.getLogger(__name__)
+
+CORE_REPO = "hed-resources"
+SHARD_DIR = "_searchindex"
+FULL_INDEX = "full.js"
+LOADER = Path(__file__).with_name("search_shards_loader.js")
+LOADER_MARKER = "/* hed_search_shards loader */"
+DOC_LISTS = ("docnames", "filenames", "titles")
+
+
+def repo_of(docname):
+    """Return the repository of a docname: its top-level directory, or the core repository."""
+    prefix, sep, _ = docname.partition("/")
+    return prefix if sep else CORE_REPO
+
+
+def add_key(key_masks, key, mask):
+    key_masks[key] = key_masks.get(key, 0) | mask
+
+
+def group_by_mask(key_masks):
+    """Return {shard mask: sorted keys}, which is much smaller than one mask per key."""
+    groups = {}
+    for key, mask in key_masks.items():
+        groups.setdefault(str(mask), []).append(key)
+    return {mask: sorted(keys) for mask, keys in sorted(groups.items())}
+
+
+def split_index(index):
+    """Split a frozen Sphinx search index into per-repository shards.
+
+    Returns:
+        tuple: ({repo: shard index}, search map for the loader).
+    """
+    doc_repos = [repo_of(docname) for docname in index["docnames"]]
+    names = sorted(set(doc_repos), key=lambda name: (name != CORE_REPO, name))
+    bits = {name: 1 << position for position, name in enumerate(names)}
+    shards = {name: {key: [] for key in DOC_LISTS} for name in names}
+    for shard in shards.values():
+        shard.update(terms={}, titleterms={}, alltitles={}, indexentries={}, objects={})
+
+    # Global document number -> (repository, document number within its shard)
+    local = []
+    for doc, repo in enumerate(doc_repos):
+        local.append((repo, len(shards[repo]["docnames"])))
+        for key in DOC_LISTS:
+            shards[repo][key].append(index[key][doc])
+
+    search_map = {"shards": names}
+    for key in ("terms", "titleterms"):
+        key_masks = {}
+        for term, docs in index[key].items():
+            per_repo = {}
+            for doc in docs if isinstance(docs, list) else [docs]:
+                repo, number = local[doc]
+                per_repo.setdefault(repo, []).append(number)
+            for repo, numbers in per_repo.items():
+                shards[repo][key][term] = numbers[0] if len(numbers) == 1 else numbers
+                add_key(key_masks, term, bits[repo])
+        search_map[key] = group_by_mask(key_masks)
+
+    # Titles are matched case-insensitively, index entries as they are
+    for key, map_key, normalize in (("alltitles", "titles", str.lower), ("indexentries", "entries", str)):
+        key_masks = {}
+        for name, entries in index[key].items():
+            for doc, *rest in entries:
+                repo, number = local[doc]
+                shards[repo][key].setdefault(name, []).append([number, *rest])
+                add_key(key_masks, normalize(name).strip(), bits[repo])
+        search_map[map_key] = group_by_mask(key_masks)
+
+    key_masks = {}
+    for prefix, entries in index["objects"].items():
+        for doc, *rest in entries:
+            repo, number = local[doc]
+            shards[repo]["objects"].setdefault(prefix, []).append([number, *rest])
+            fullname = f"{prefix}.{rest[-1]}" if prefix else rest[-1]
+            add_key(key_masks, fullname.lower(), bits[repo])
+    search_map["objects"] = group_by_mask(key_masks)
+
+    # Object types are numbered globally, so they live in the map rather than in every shard
+    for key in ("objnames", "objtypes", "envversion"):
+        search_map[key] = index[key]
+    return shards, search_map
+
+
+def restore_full_index(app, env):
+    """Put the unsplit index back in place so Sphinx can update it incrementally."""
+    outdir = Path(app.outdir)
+    index_file, full_index = outdir / "searchindex.js", outdir / SHARD_DIR / FULL_INDEX
+    if full_index.is_file() and index_file.is_file():
+        with open(index_file, encoding="utf-8") as f:
+            is_loader = f.read(len(LOADER_MARKER)) == LOADER_MARKER
+        if is_loader:
+            shutil.copyfile(full_index, index_file)
+
+
+def write_shards(app, exception):
+    """Split the search index Sphinx has just written and replace it by the loader."""
+    builder = app.builder
+    if (
+        exception is not None
+        or not app.config.hed_search_shards
+        or getattr(builder, "indexer", None) is None
+        or builder.searchindex_filename != "searchindex.js"
+    ):
+        return
+
+    outdir = Path(app.outdir)
+    index_file, shard_dir = outdir / "searchindex.js", outdir / SHARD_DIR
+    full_text = index_file.read_text(encoding="utf-8")
+    if full_text.startswith(LOADER_MARKER):
+        # Nothing was rebuilt, so the index on disk is still the loader
+        return
+    shards, search_map = split_index(js_index.loads(full_text))
+
+    shutil.rmtree(shard_dir, ignore_errors=True)
+    shard_dir.mkdir()
+    (shard_dir / FULL_INDEX).write_text(full_text, encoding="utf-8")
+    for name, shard in shards.items():
+        data = json.dumps(shard, separators=(",", ":"), sort_keys=True)
+        (shard_dir / f"{name}.js").write_text(f"HedSearchShards.add({json.dumps(name)},{data});", encoding="utf-8")
+
+    data = json.dumps(search_map, separators=(",", ":"), sort_keys=True)
+    loader = f"{LOADER_MARKER}\n{LOADER.read_text(encoding='utf-8')}\nHedSearchShards.init({data});\n"
+    index_file.write_text(loader, encoding="utf-8")
+    logger.info(
+        f"[hed_search_shards] split the search index ({len(full_text) / 1024:.0f} KB) into {len(shards)} shards; "
+        f"loader and map {len(loader) / 1024:.0f} KB"
+    )
+
+
+def setup(app):
+    app.add_config_value("hed_search_shards", False, "html", bool)
+    app.connect("env-updated", restore_full_index)
+    app.connect("build-finished", write_shards)
+    return {"version": "1.0", "parallel_read_safe": True, "parallel_write_safe": True}
@@ -0,0 +1,348 @@
+"""Sphinx extension serving submodule documentation in place.
+
+With ``hed_zero_copy`` enabled, docnames such as ``hed-python/api/index`` are
+mapped directly onto the files under ``submodules/*/docs`` listed in the
+``build_unified.py`` manifest, so the copy step can be skipped entirely.
+The text transforms that the copy step applies on disk (such as removing the
+indices section of each submodule ``index.rst``) are applied in memory on
+``source-read``. Documents included by others (such as the READMEs the index
+templates include) are read from transformed copies under the doctree
+directory instead.
+
+Files referenced relative to a mapped document (images, includes, literal
+includes) resolve against the submodule's documentation directory.
+autosummary writes the stubs of a document next to the file it reads, so it
+is given copies of the mapped documents containing autosummary directives,
+kept under the doctree directory. The stubs are generated there instead of in
+the submodule checkouts and mapped once autosummary has run.
+
+``hed_only`` restricts a build to some of the submodules (a comma-separated
+list of names; an empty string builds the core documentation only). The
+documents of the other submodules are left out, and their ``index`` page is
+replaced by a short stub so the toctree entries of ``index.rst`` still resolve.
+
+The mapping extends ``sphinx.project.Project`` through its private lookup
+tables and swaps the class of the build environment; both are checked before
+use, so a Sphinx release that changes them fails with an error rather than a
+broken build.
+"""
+
+import re
+from pathlib import Path
+
+import sphinx
+from build_unified import (
+    apply_transforms,
+    collect_submodule_files,
+    get_submodules,
+    parse_only,
+    run_transforms,
+    select_submodules,
+    transform_steps,
+)
+from sphinx.environment import BuildEnvironment
+from sphinx.errors import ExtensionError
+from sphinx.project import Project
+from sphinx.util import logging
+from sphinx.util.matching import Matcher
+
+logger = logging.getLogger(__name__)
+
+# Directory under the doctree directory holding the index stubs of excluded submodules
+STUB_DIR = "hed_stubs"
+# Directory under the doctree directory holding the transformed copies of mapped documents
+TRANSFORMED_DIR = "hed_transformed"
+# Directory under the doctree directory holding the autosummary sources and stubs of mapped documents
+GENERATED_DIR = "hed_generated"
+AUTOSUMMARY = re.compile(r"^\s*\.\. autosummary::", re.MULTILINE)
+# Private lookup tables of sphinx.project.Project kept up to date by MappedProject (Sphinx 8.1 to 9.x)
+PROJECT_TABLES = ("_docname_to_path", "_path_to_docname")
+# BuildEnvironment methods overridden by MappedEnvironment
+ENVIRONMENT_METHODS = ("relfn2path", "note_included")
+STUB_TEMPLATE = """{title}
+{underline}
+
+.. note::
+
+   The {name} documentation is not included in this partial build.
+   Build without ``--only`` or ``--core-only`` to include it.
+"""
+
+
+class MappedProject(Project):
+    """Project whose docnames under submodule prefixes map to files outside the source directory."""
+
+    def __init__(self, srcdir, source_suffix, mapped_docs, mapped_dirs, transformed=None):
+        super().__init__(srcdir, source_suffix)
+        #: docname -> absolute source file of each mapped document.
+        self.mapped_docs = mapped_docs
+        #: Virtual directory prefix (e.g. ``hed-python``) -> real documentation directory.
+        self.mapped_dirs = mapped_dirs
+        #: docname -> transformed copy of each mapped document the copy step transforms.
+        self.transformed = transformed or {}
+
+    def discover(self, exclude_paths=(), include_paths=("**",)):
+        """Find the documents in the source directory, then add the mapped submodule documents."""
+        super().discover(exclude_paths, include_paths)
+
+        # Mapped prefixes own their namespace: ignore stale copies left by the copy step
+        for docname in list(self.docnames):
+            if docname.split("/", 1)[0] in self.mapped_dirs:
+                self.docnames.discard(docname)
+                del self._path_to_docname[self._docname_to_path.pop(docname)]
+
+        excluded = Matcher(exclude_paths)
+        for docname, path in self.mapped_docs.items():
+            if excluded(docname + path.suffix) or not path.is_file():
+                continue
+            self.docnames.add(docname)
+            self._docname_to_path[docname] = path
+            self._path_to_docname[path] = docname
+        return self.docnames
+
+    def doc2path(self, docname, absolute):
+        """Return the real file for mapped documents, or their virtual path relative to the source directory."""
+        path = self.mapped_docs.get(docname)
+        if path is None or absolute:
+            return super().doc2path(docname, absolute)
+        virtual = super().doc2path(docname, False)
+        return type(virtual)(docname + path.suffix)
+
+    def real_path(self, rel_path):
+        """Return the real location of a virtual source-relative path, or None if it is not mapped."""
+        prefix, _, rest = Path(rel_path).as_posix().partition("/")
+        if prefix not in self.mapped_dirs or not rest:
+            return None
+        return self.mapped_dirs[prefix] / rest
+
+
+class MappedEnvironment(BuildEnvironment):
+    """Build environment resolving relative file references of mapped documents to their real location."""
+
+    def relfn2path(self, filename, docname=None):
+        rel_fn, abs_fn = super().relfn2path(filename, docname)
+        if not Path(abs_fn).exists() and isinstance(self.project, MappedProject):
+            real = self.project.real_path(rel_fn)
+            if real is not None and real.exists():
+                # A document included by another one (e.g. a README) is read from its transformed copy
+                copy = self.project.transformed.get(Path(rel_fn).with_suffix("").as_posix())
+                return rel_fn, str(copy if copy is not None and copy.name == real.name else real)
+        return rel_fn, abs_fn
+
+    def note_included(self, filename):
+        """Record an included transformed copy as its mapped document, which is then not an orphan."""
+        if isinstance(self.project, MappedProject):
+            for docname, copy in self.project.transformed.items():
+                if str(copy) == str(filename):
+                    self.included.setdefault(self.docname, set()).add(docname)
+                    return
+        super().note_included(filename)
+
+
+def build_mapping(repo_root, submodules):
+    """Return the mapped documents, mapped directories and in-memory post-processors of manifest entries."""
+    index_templates_dir = repo_root / "docs" / "submodule-indexes"
+    mapped_docs, mapped_dirs, post_processors = {}, {}, {}
+    for name, config in submodules.items():
+        if not config["source"].exists():
+            logger.warning(f"Submodule {name} not found at {config['source']}")
+            continue
+        mapped_dirs[name] = config["source"]
+        for rel_path, src_file in collect_submodule_files(name, config, index_templates_dir).items():
+            if rel_path.startswith("_static/"):
+                continue
+            docname = f"{name}/{Path(rel_path).with_suffix('').as_posix()}"
+            mapped_docs[docname] = src_file
+            steps = transform_steps(rel_path, config)
+            if steps:
+                post_processors[docname] = steps
+    return mapped_docs, mapped_dirs, post_processors
+
+
+def write_stubs(stub_dir, names):
+    """Write the index stubs of excluded submodules, leaving unchanged stubs untouched.
+
+    Returns:
+        tuple: ({docname: stub file}, {submodule name: stub directory}).
+    """
+    stub_docs, stub_dirs = {}, {}
+    for name in names:
+        path = stub_dir / name / "index.rst"
+        content = STUB_TEMPLATE.format(title=name, underline="=" * len(name), name=name)
+        if not path.is_file() or path.read_text(encoding="utf-8") != content:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            path.write_text(content, encoding="utf-8")
+        stub_docs[f"{name}/index"] = path
+        stub_dirs[name] = path.parent
+    return stub_docs, stub_dirs
+
+
+def write_transformed(transformed_dir, mapped_docs, post_processors):
+    """Write the transformed copies of mapped documents, leaving unchanged copies untouched.
+
+    A copy is only rewritten when its source changes, so Sphinx sees the
+    documents that include it as outdated exactly when needed.
+
+    Returns:
+        dict: {docname: transformed copy}.
+    """
+    pending = {docname: (mapped_docs[docname], steps) for docname, steps in post_processors.items()}
+    copies = {}
+    for docname, content in run_transforms(pending, {}).items():
+        path = transformed_dir / f"{docname}{mapped_docs[docname].suffix}"
+        if not path.is_file() or path.read_bytes() != content:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            path.write_bytes(content)
+        copies[docname] = path
+    return copies
+
+
+def write_autosummary_sources(generated_dir, mapped_docs, suffixes):
+    """Copy the mapped documents containing autosummary directives under generated_dir.
+
+    Unchanged copies are left untouched.
+
+    Returns:
+        dict: {docname: copy}.
+    """
+    sources = {}
+    for docname, path in mapped_docs.items():
+        if path.suffix not in suffixes or not path.is_file():
+            continue
+        data = path.read_bytes()
+        if not AUTOSUMMARY.search(data.decode("utf-8", errors="replace")):
+            continue
+        copy = generated_dir / f"{docname}{path.suffix}"
+        if not copy.is_file() or copy.read_bytes() != data:
+            copy.parent.mkdir(parents=True, exist_ok=True)
+            copy.write_bytes(data)
+        sources[docname] = copy
+    return sources
+
+
+def find_generated(generated_dir, names, sources, suffixes):
+    """Return {docname: stub file} of the autosummary stubs generated under generated_dir for the named submodules."""
+    stubs = {}
+    for name in names:
+        for path in sorted((generated_dir / name).rglob("*")):
+            docname = path.relative_to(generated_dir).with_suffix("").as_posix()
+            if path.suffix in suffixes and path.is_file() and docname not in sources:
+                stubs[docname] = path
+    return stubs
+
+
+def stub_root(app, name):
+    """Return the directory below which autosummary writes the stubs of a submodule's documents."""
+    generated = getattr(app, "_hed_generated", None)
+    if generated is not None and name in generated[1]:
+        return generated[0] / name
+    return Path(app.srcdir) / name
+
+
+def check_internals(app):
+    """Raise an ExtensionError if the Sphinx internals the mapping relies on are missing."""
+    missing = [f"Project.{name}" for name in PROJECT_TABLES if not isinstance(getattr(app.project, name, None), dict)]
+    missing += [f"BuildEnvironment.{name}" for name in ENVIRONMENT_METHODS if not hasattr(BuildEnvironment, name)]
+    if type(app.env) not in (BuildEnvironment, MappedEnvironment):
+        missing.append("a plain BuildEnvironment")
+    if missing:
+        raise ExtensionError(
+            f"hed_sources needs Sphinx internals that Sphinx {sphinx.__version__} does not provide "
+            f"({', '.join(missing)}); build without --zero-copy and --only, or with Sphinx < 10"
+        )
+
+
+def install_mapping(app):
+    """Swap in the mapped project and environment before autosummary looks for source files."""
+    repo_root = Path(app.confdir).resolve().parent.parent
+    submodules = get_submodules(repo_root)
+    selected = select_submodules(submodules, parse_only(app.config.hed_only))
+    excluded = [name for name in submodules if name not in selected]
+    app._hed_stubbed = {f"{name}/index" for name in excluded}
+    app._hed_generated = None
+
+    if not app.config.hed_zero_copy and not excluded:
+        if isinstance(app.project, MappedProject):
+            project = Project(app.srcdir, app.config.source_suffix)
+            project.restore(app.project)
+            app.project = app.env.project = project
+            app.env.__class__ = BuildEnvironment
+        return
+
+    check_internals(app)
+    mapped_docs, mapped_dirs, post_processors, transformed, sources = {}, {}, {}, {}, {}
+    if app.config.hed_zero_copy:
+        mapped_docs, mapped_dirs, post_processors = build_mapping(repo_root, selected)
+        transformed = write_transformed(Path(app.doctreedir) / TRANSFORMED_DIR, mapped_docs, post_processors)
+        logger.info(f"[hed_sources] mapped {len(mapped_docs)} submodule documents in place")
+        suffixes = tuple(app.config.source_suffix)
+        generated_dir = Path(app.doctreedir) / GENERATED_DIR
+        sources = write_autosummary_sources(generated_dir, mapped_docs, suffixes)
+        app._hed_generated = (generated_dir, list(mapped_dirs), sources, suffixes)
+        # Stubs generated by earlier builds; map_generated_stubs adds new ones
+        mapped_docs.update(find_generated(generated_dir, mapped_dirs, sources, suffixes))
+    if excluded:
+        # Mapping an excluded prefix to its stub hides any copies left in the source directory
+        stub_docs, stub_dirs = write_stubs(Path(app.doctreedir) / STUB_DIR, excluded)
+        mapped_docs.update(stub_docs)
+        mapped_dirs.update(stub_dirs)
+        logger.info(f"[hed_sources] partial build; stubbed {len(excluded)} submodules: {', '.join(excluded)}")
+
+    project = MappedProject(app.srcdir, app.config.source_suffix, mapped_docs, mapped_dirs, transformed)
+    project.restore(app.project)
+    app.project = app.env.project = project
+    app.env.__class__ = MappedEnvironment
+    app.env.find_files(app.config, app.builder)
+    app._hed_post_processors = post_processors
+
+    # autosummary reads its sources relative to srcdir, so hand it the real files, or the copies of
+    # documents with autosummary directives, for this run only
+    if app.config.autosummary_generate is True:
+        app._hed_autosummary_generate = True
+        app.config.autosummary_generate = [
+            str(sources.get(docname) or app.env.doc2path(docname)) for docname in sorted(app.env.found_docs)
+        ]
+
+
+def map_generated_stubs(app):
+    """Map the autosummary stubs generated by this build, which the read phase then finds."""
+    if getattr(app, "_hed_generated", None) is None:
+        return
+    generated_dir, names, sources, suffixes = app._hed_generated
+    app.project.mapped_docs.update(find_generated(generated_dir, names, sources, suffixes))
+
+
+def outdated_stubs(app, env, added, changed, removed):
+    """Re-read index pages that switched between a stub and the real document since the last build.
+
+    Their source file changes location, so its modification time says nothing.
+    """
+    previous = getattr(env, "hed_stubbed", set())
+    env.hed_stubbed = app._hed_stubbed
+    return sorted((previous ^ app._hed_stubbed) & env.found_docs - added - changed)
+
+
+def restore_autosummary_option(app):
+    """Restore autosummary_generate so the pickled configuration matches conf.py."""
+    if getattr(app, "_hed_autosummary_generate", None) is not None:
+        app.config.autosummary_generate = app._hed_autosummary_generate
+        app._hed_autosummary_generate = None
+
+
+def post_process_source(app, docname, source):
+    """Apply the copy step's transforms to a mapped document in memory."""
+    steps = getattr(app, "_hed_post_processors", {}).get(docname)
+    if steps:
+        source[0] = apply_transforms(source[0], steps)
+
+
+def setup(app):
+    app.add_config_value("hed_zero_copy", False, "env", bool)
+    app.add_config_value("hed_only", None, "html", (str, type(None)))
+    app.connect("builder-inited", install_mapping, priority=100)
+    # After autosummary generates its stubs (500)
+    app.connect("builder-inited", map_generated_stubs, priority=600)
+    app.connect("builder-inited", restore_autosummary_option, priority=900)
+    app.connect("env-get-outdated", outdated_stubs)
+    app.connect("source-read", post_process_source)
+    return {"version": "1.0", "parallel_read_safe": True, "parallel_write_safe": True}
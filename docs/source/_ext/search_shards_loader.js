@@ -0,0 +1,123 @@
+/**
+ * Load only the search index shards a query can match (written by hed_search_shards).
+ *
+ * The shard selection mirrors the lookups of Search._performSearch in Sphinx's
+ * searchtools.js, so the merged index gives the same results as the full one.
+ */
+
+var HedSearchShards = (() => {
+    'use strict';
+
+    let searchMap = null;
+    const shards = {};
+    const docRepos = {};
+
+    /**
+     * OR together the masks of the key groups in which some key passes the test
+     */
+    function maskOf(groups, test) {
+        let mask = 0;
+        for (const [groupMask, keys] of Object.entries(groups)) {
+            if (keys.some(test)) mask |= Number(groupMask);
+        }
+        return mask;
+    }
+
+    /**
+     * Return the bit mask of the shards with a document the query can match
+     */
+    function shardMask(query) {
+        const [searchQuery, searchTerms, , , objectTerms] = Search._parseQuery(query);
+        const queryLower = searchQuery.toLowerCase().trim();
+
+        let mask = maskOf(searchMap.titles, title => title.includes(queryLower));
+        mask |= maskOf(searchMap.entries, entry => entry.includes(queryLower));
+        objectTerms.forEach(term => {
+            mask |= maskOf(searchMap.objects, name => name.includes(term));
+        });
+        searchTerms.forEach(word => {
+            for (const key of ['terms', 'titleterms']) {
+                // Partial matches only count when no document has the exact term
+                const exact = maskOf(searchMap[key], term => term === word);
+                mask |= exact;
+                if (!exact && word.length > 2) {
+                    mask |= maskOf(searchMap[key], term => term.includes(word));
+                }
+            }
+        });
+        return mask;
+    }
+
+    /**
+     * Merge the loaded shards into one index with Sphinx's layout
+     */
+    function merge() {
+        const index = {
+            docnames: [], filenames: [], titles: [],
+            terms: {}, titleterms: {}, alltitles: {}, indexentries: {}, objects: {},
+            objnames: searchMap.objnames, objtypes: searchMap.objtypes, envversion: searchMap.envversion
+        };
+        const append = (target, key, values) => {
+            target[key] = Object.hasOwn(target, key) ? target[key].concat(values) : values;
+        };
+
+        for (const name of searchMap.shards) {
+            const shard = shards[name];
+            if (!shard) continue;
+            const offset = index.docnames.length;
+            shard.docnames.forEach(docname => { docRepos[docname] = name; });
+            for (const key of ['docnames', 'filenames', 'titles']) index[key].push(...shard[key]);
+
+            for (const key of ['terms', 'titleterms']) {
+                for (const [term, docs] of Object.entries(shard[key])) {
+                    const shifted = (Array.isArray(docs) ? docs : [docs]).map(doc => doc + offset);
+                    if (Object.hasOwn(index[key], term)) append(index[key], term, shifted);
+                    else index[key][term] = shifted.length === 1 ? shifted[0] : shifted;
+                }
+            }
+            for (const key of ['alltitles', 'indexentries', 'objects']) {
+                for (const [name, entries] of Object.entries(shard[key])) {
+                    append(index[key], name, entries.map(([doc, ...rest]) => [doc + offset, ...rest]));
+                }
+            }
+        }
+        return index;
+    }
+
+    function loadScript(url) {
+        return new Promise((resolve, reject) => {
+            const script = document.createElement('script');
+            script.src = url;
+            script.onload = resolve;
+            script.onerror = reject;
+            document.head.appendChild(script);
+        });
+    }
+
+    return {
+        init(map) {
+            searchMap = map;
+            const base = new URL('_searchindex/', document.currentScript.src);
+            const query = new URLSearchParams(window.location.search).get('q');
+            if (!query) return;
+
+            const mask = shardMask(query);
+            const needed = searchMap.shards.filter((name, position) => mask & (1 << position));
+            Promise.all(needed.map(name => loadScript(new URL(`${name}.js`, base))))
+                .then(() => Search.setIndex(merge()))
+                // Fall back to the unsplit index
+                .catch(() => Search.loadIndex(new URL('full.js', base)));
+        },
+
+        add(name, shard) {
+            shards[name] = shard;
+        },
+
+        /**
+         * Return the repository of a loaded document, or undefined
+         */
+        repoOf(docname) {
+            return docRepos[docname];
+        }
+    };
+})();
@@ -80,6 +80,13 @@
      * Get repository configuration for a given href
      */
     function getRepoConfig(href) {
+        // The sharded search index records the repository of every document it loaded
+        const repo = window.HedSearchShards ? HedSearchShards.repoOf(docnameOf(href)) : undefined;
+        if (repo !== undefined) {
+            const key = `${repo}/`;
+            return key in repoConfig ? { key: key, ...repoConfig[key] } : { key: 'default', ...repoConfig.default };
+        }
+
         for (const [path, conf] of Object.entries(repoConfig)) {
             if (path !== 'default' && href.includes(path)) {
                 return { key: path, ...conf };
@@ -88,6 +95,18 @@
         return { key: 'default', ...repoConfig.default };
     }
 
+    /**
+     * Get the docname of a search result link (docname + link suffix + anchor)
+     */
+    function docnameOf(href) {
+        const suffix = DOCUMENTATION_OPTIONS.LINK_SUFFIX || '';
+        let path = href.split('#')[0].split('?')[0];
+        if (suffix && path.endsWith(suffix)) {
+            path = path.slice(0, -suffix.length);
+        }
+        return path;
+    }
+
     /**
      * Group and organize search results by repository
      */
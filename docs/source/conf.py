@@ -21,6 +21,11 @@ logger = logging.getLogger(__name__)
 
 sys.path.insert(0, os.path.abspath("../../"))
 sys.path.insert(0, os.path.abspath("."))
+sys.path.insert(0, os.path.abspath(".."))
+sys.path.insert(0, os.path.abspath("_ext"))
+
+from build_unified import get_submodules, parse_only, select_submodules  # noqa: E402
+from submodule_imports import install_finder  # noqa: E402
 
 # -- Submodule documentation integration -------------------------------------
 # Add paths for submodule documentation sources
@@ -28,23 +33,10 @@ sys.path.insert(0, os.path.abspath("."))
 # Define the base submodules directory
 submodules_base = Path(__file__).parent.parent.parent / "submodules"
 
-# List of submodules with documentation to integrate
-submodule_docs = {
-    "hed-python": submodules_base / "hed-python" / "docs",
-    "table-remodeler": submodules_base / "table-remodeler" / "docs",
-    "hed-vis": submodules_base / "hed-vis" / "docs",
-    "hed-mcp": submodules_base / "hed-mcp",
-    "hed-javascript": submodules_base / "hed-javascript",
-    "hed-matlab": submodules_base / "hed-matlab" / "docs",
-    "ndx-hed": submodules_base / "ndx-hed" / "docs" / "source",
-    "hed-schemas": submodules_base / "hed-schemas" / "docs",
-    "hed-server": submodules_base / "hed-server" / "docs",
-    "CTagger": submodules_base / "CTagger" / "docs",
-    "hed-specification": submodules_base / "hed-specification" / "docs" / "source",
-    "hed-tests": submodules_base / "hed-tests" / "docs",
-}
+# Submodule documentation directories, taken from the build_unified.py manifest
+submodule_docs = {name: config["source"] for name, config in get_submodules(submodules_base.parent).items()}
 
-# Add submodule source code paths to sys.path for autodoc
+# Submodule source roots whose packages autodoc imports (resolved by docs/submodule_imports.py)
 submodule_sources = {
     "hed-python": submodules_base / "hed-python",
     "table-remodeler": submodules_base / "table-remodeler",
@@ -60,20 +52,40 @@ submodule_sources = {
     "hed-tests": submodules_base / "hed-tests",
 }
 
-for name, src_path in submodule_sources.items():
-    if src_path.exists():
-        sys.path.insert(0, str(src_path))
-        logger.info(f"Added submodule source path: {name} -> {src_path}")
-    else:
-        logger.warning(f"Submodule source path not found: {name} -> {src_path}")
 
-# Add submodule doc source directories to path if they exist
-for name, doc_path in submodule_docs.items():
-    if doc_path.exists():
-        sys.path.insert(0, str(doc_path))
-        logger.info(f"Added submodule documentation path: {name} -> {doc_path}")
-    else:
-        logger.warning(f"Submodule documentation path not found: {name} -> {doc_path}")
+def register_submodules(app, config):
+    """Make the packages and static files of the submodules selected by ``hed_only`` available.
+
+    This runs on config-inited rather than at import time because ``hed_only``
+    may be overridden on the command line (hed-build-docs --only/--core-only).
+    """
+    selected = select_submodules(submodule_docs, parse_only(config.hed_only))
+
+    roots = []
+    for name in selected:
+        for kind, path in (("source", submodule_sources.get(name)), ("documentation", submodule_docs[name])):
+            if path is None:
+                continue
+            if path.exists():
+                roots.append(path)
+            else:
+                logger.warning(f"Submodule {kind} path not found: {name} -> {path}")
+
+    # Map the submodules' top-level packages to their roots instead of prepending the roots to sys.path
+    packages = install_finder(roots)
+    for package, root in sorted(packages.items()):
+        logger.info(f"Resolving submodule package: {package} -> {root}")
+
+    # Add static files from submodules if they exist
+    for doc_path in selected.values():
+        static_path = doc_path / "_static"
+        if static_path.exists():
+            # Use absolute path for submodule static files
+            config.html_static_path.append(str(static_path))
+
+
+def setup(app):
+    app.connect("config-inited", register_submodules)
 
 
 # -- Project information -----------------------------------------------------
@@ -105,8 +117,43 @@ extensions = [
     "sphinx.ext.napoleon",
     "sphinx_design",
     "sphinx_copybutton",
+    "hed_sources",
+    "hed_profiler",
+    "hed_search_shards",
+    "hed_inventories",
+    "hed_api_cache",
+    "hed_images",
+    "hed_assets",
 ]
 
+# Serve submodule documentation in place instead of from copies (see _ext/hed_sources.py)
+hed_zero_copy = False
+
+# Comma-separated submodules to build, "" for the core documentation only, None for all
+# (see _ext/hed_sources.py; set with hed-build-docs --only/--core-only)
+hed_only = None
+
+# Per-phase and per-document build profiling (see _ext/hed_profiler.py)
+hed_profile = False
+hed_profile_top = 20
+
+# Split the search index into per-repository shards loaded on demand (see _ext/hed_search_shards.py)
+hed_search_shards = True
+
+# Reuse generated API documentation for unchanged submodule commits (see _ext/hed_api_cache.py)
+hed_api_cache = True
+
+# Minify, fingerprint and precompress the static assets of the HTML build (see _ext/hed_assets.py;
+# disable with hed-build-docs --no-optimize-assets)
+hed_optimize_assets = True
+# Write .gz/.br siblings of the text files for servers that send them (disable with
+# hed-build-docs --no-precompress for hosts that cannot, such as GitHub Pages)
+hed_precompress = True
+
+# Recompress the images of the HTML build, add WebP versions and lazy loading (see _ext/hed_images.py;
+# disable with hed-build-docs --no-optimize-assets)
+hed_optimize_images = True
+
 autosummary_generate = True
 autodoc_default_options = {"members": True, "inherited-members": True}
 add_module_names = False
@@ -143,6 +190,7 @@ master_doc = "index"
 # This pattern also affects html_static_path and html_extra_path.
 exclude_patterns = [
     "_build",
+    "_ext",
     "_templates",
     "Thumbs.db",
     ".DS_Store",
@@ -200,16 +248,11 @@ html_js_files = ["gh_icon_fix.js", "search_labels.js", "fix_sidebar_scroll.js"]
 # -- Intersphinx configuration -----------------------------------------------
 # Enable cross-references to external documentation
 
+# Inventories are read from .cache/intersphinx and refreshed after this many days
+# (see _ext/hed_inventories.py; fill the cache with hed-build-docs --prefetch-inventories)
+hed_inventory_ttl = 7
+
 intersphinx_mapping = {
     "python": ("https://docs.python.org/3", None),
     "hed-python": ("https://www.hedtags.org/hed-python", None),
 }
-
-# -- Submodule static files configuration ------------------------------------
-# Add static files from submodules if they exist
-
-for _name, doc_path in submodule_docs.items():
-    static_path = doc_path / "_static"
-    if static_path.exists():
-        # Use absolute path for submodule static files
-        html_static_path.append(str(static_path))
@@ -0,0 +1,92 @@
+"""Import hook resolving the Python packages of the integrated submodules.
+
+Putting every submodule checkout and documentation directory at the front of
+``sys.path`` makes each import during autodoc and autosummary stat all of them
+before reaching site-packages, and lets any directory in a submodule shadow an
+installed package of the same name. Instead, ``install_finder`` scans the
+submodule roots once for their top-level packages and modules (``hed``,
+``remodel``, ``hedvis``, ``ndx_hed``, ...) and installs a meta path finder
+that sends exactly those names to their root. The roots are also appended to
+the end of ``sys.path``, so names the scan cannot recognize, such as namespace
+packages (directories without an ``__init__.py``), still import once
+site-packages has been searched.
+"""
+
+import importlib.abc
+import importlib.machinery
+import sys
+
+# Top-level directories and modules that are not part of a submodule's importable code
+EXCLUDED_PACKAGES = frozenset({"docs", "test", "tests", "setup", "conftest", "noxfile"})
+
+
+def find_packages(root):
+    """Return the names of the top-level packages (directories with an ``__init__.py``) and modules in a source root."""
+    if not root.is_dir():
+        return []
+    names = set()
+    for path in root.iterdir():
+        if path.suffix == ".py" and path.is_file():
+            name = path.stem
+        elif (path / "__init__.py").is_file():
+            name = path.name
+        else:
+            continue
+        if name.isidentifier() and name not in EXCLUDED_PACKAGES:
+            names.add(name)
+    return sorted(names)
+
+
+class SubmoduleFinder(importlib.abc.MetaPathFinder):
+    """Meta path finder mapping top-level package names to the submodule roots that provide them."""
+
+    def __init__(self, packages, fallback_roots):
+        #: Top-level package name -> source root containing it.
+        self.packages = packages
+        #: Roots appended to sys.path for the names that are not mapped.
+        self.fallback_roots = fallback_roots
+
+    def find_spec(self, fullname, path=None, target=None):
+        # Subpackages are found through their parent's __path__ by the regular path finder
+        if path is not None:
+            return None
+        root = self.packages.get(fullname)
+        if root is None:
+            return None
+        # PathFinder keeps the directory listing of each root in sys.path_importer_cache
+        return importlib.machinery.PathFinder.find_spec(fullname, [str(root)])
+
+
+def uninstall_finder():
+    """Remove any finder installed by ``install_finder``, also one from an earlier import of this module."""
+    finders = [finder for finder in sys.meta_path if type(finder).__name__ == SubmoduleFinder.__name__]
+    for finder in finders:
+        sys.meta_path.remove(finder)
+        for root in getattr(finder, "fallback_roots", []):
+            if root in sys.path:
+                sys.path.remove(root)
+
+
+def install_finder(roots):
+    """Install a finder for the packages of the given source roots, replacing a previously installed one.
+
+    Args:
+        roots (list): Source roots in order of precedence; the first root providing a package wins.
+
+    Returns:
+        dict: Top-level package name -> source root.
+    """
+    packages = {}
+    for root in roots:
+        for name in find_packages(root):
+            packages.setdefault(name, root)
+
+    uninstall_finder()
+    fallback_roots = [root for root in dict.fromkeys(map(str, roots)) if root not in sys.path]
+    sys.path.extend(fallback_roots)
+    # Ahead of the path finder, so checked-out packages take precedence over installed ones
+    position = next(
+        (i for i, finder in enumerate(sys.meta_path) if finder is importlib.machinery.PathFinder), len(sys.meta_path)
+    )
+    sys.meta_path.insert(position, SubmoduleFinder(packages, fallback_roots))
+    return packages
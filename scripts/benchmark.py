@@ -0,0 +1,591 @@
+#!/usr/bin/env python3
+"""Benchmark the unified documentation build on synthetic submodules.
+
+A fixture repository is generated in a scratch directory: a copy of this
+repository's docs/ directory (conf.py, extensions, core pages and
+build_unified.py, i.e. the code being measured) and synthetic checkouts of
+the first N submodules of the build_unified.py manifest. Each synthetic
+submodule provides the files its manifest entry lists, extra pages in its
+listed directories, a Python package documented through autosummary for the
+submodules with an api/ directory, and random PNG images referenced from the
+pages. Intersphinx inventories are replaced by empty cached ones, so nothing
+is downloaded.
+
+Each repetition then measures, on a clean fixture:
+- the copy step (build_unified.copy_submodule_docs), cold and with nothing to do;
+- a full Sphinx HTML build in a child process, with its wall time, peak RSS and
+  the per-phase times of the build profiler (autosummary, read, resolve, write,
+  search index and the build-finished handlers that split it);
+- a rebuild with nothing changed;
+- the serve path: every page fetched from the hed-serve-docs request handler,
+  then revalidated with If-None-Match.
+
+The median of each metric is written as JSON and can be compared with an
+earlier result.
+
+Can be run as:
+- Command (after pip install -e .): hed-benchmark
+- Direct Python: python scripts/benchmark.py
+- Module: python -m scripts.benchmark
+
+Options:
+  --repos N        Number of synthetic submodules (default: 4)
+  --pages N        Extra pages in each listed directory of a submodule (default: 20)
+  --modules N      API modules per submodule with an api/ directory (default: 10)
+  --images N       Images per submodule (default: 5)
+  --repeat N       Repetitions; medians are reported (default: 1)
+  -j, --jobs N     Copy threads and Sphinx workers (default: 1)
+  --output FILE    Write the results here (default: docs/_build/benchmark.json)
+  --compare FILE   Compare with an earlier result; exit 1 on a regression
+  --threshold PCT  Slow-down in percent counted as a regression (default: 10)
+  --workdir DIR    Generate the fixture here and keep it (default: a temporary directory)
+"""
+
+import argparse
+import datetime
+import functools
+import http.client
+import http.server
+import json
+import os
+import platform
+import random
+import shutil
+import statistics
+import struct
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+import zlib
+from pathlib import Path
+
+if __package__:
+    from .build_docs import conf_literal
+    from .common import BUILD_DIR, DOCS_DIR, load_build_unified, load_docs_module, parse_jobs
+    from .serve_docs import DocsRequestHandler
+else:
+    from build_docs import conf_literal
+    from common import BUILD_DIR, DOCS_DIR, load_build_unified, load_docs_module, parse_jobs
+    from serve_docs import DocsRequestHandler
+
+RESULTS_VERSION = 1
+OUTPUT_FILE = BUILD_DIR / "benchmark.json"
+
+REPOS = 4
+PAGES = 20
+MODULES = 10
+IMAGES = 5
+THRESHOLD = 10
+# Differences below these are noise, whatever the percentage
+MIN_DIFFERENCE = {"seconds": 0.05, "bytes": 4 << 20}
+
+SECTIONS_PER_PAGE = 4
+CLASSES_PER_MODULE = 3
+FUNCTIONS_PER_MODULE = 5
+IMAGE_SIZE = (320, 240)
+WORDS = (
+    "annotation event sensor condition schema tag validation dataset onset duration stimulus participant "
+    "response task session recording channel library version definition sidecar column value label group"
+).split()
+
+# Copied from docs/ into the fixture; submodule copies and build output are generated there
+IGNORED_DOCS = ("_build", "__pycache__", "deprecated", ".sync-manifest.json")
+
+
+class QuietRequestHandler(DocsRequestHandler):
+    """The hed-serve-docs request handler without the request log."""
+
+    def log_message(self, format, *args):
+        pass
+
+
+# -- Fixture ------------------------------------------------------------------
+
+
+def sentence(rng, words=12):
+    text = " ".join(rng.choice(WORDS) for _ in range(words))
+    return text[0].upper() + text[1:] + "."
+
+
+def paragraph(rng, sentences=5):
+    return " ".join(sentence(rng, rng.randint(8, 16)) for _ in range(sentences))
+
+
+def png_image(rng, width, height):
+    """Return a PNG of random pixels, which compresses about as badly as a screenshot or photo."""
+
+    def chunk(kind, data):
+        return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data))
+
+    rows = b"".join(b"\x00" + rng.randbytes(width * 3) for _ in range(height))
+    header = struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0)
+    return b"\x89PNG\r\n\x1a\n" + chunk(b"IHDR", header) + chunk(b"IDAT", zlib.compress(rows, 1)) + chunk(b"IEND", b"")
+
+
+def markdown_page(rng, title, depth, images, links):
+    """Return a MyST page with sections, lists, code, a table, images and links to sibling pages."""
+    lines = [f"# {title}", "", paragraph(rng), ""]
+    for number in range(1, SECTIONS_PER_PAGE + 1):
+        lines += [f"## {title} section {number}", "", paragraph(rng), "", paragraph(rng, 3), ""]
+        lines += [f"- {sentence(rng, 6)}" for _ in range(4)] + [""]
+        lines += ["```python", f"value = {{'{rng.choice(WORDS)}': {number}}}", "print(value)", "```", ""]
+        lines += ["| Column | Description |", "| --- | --- |"]
+        lines += [f"| {rng.choice(WORDS)} | {sentence(rng, 8)} |" for _ in range(3)] + [""]
+        if images:
+            image = images[(number + len(title)) % len(images)]
+            lines += [f"![{title} figure {number}]({'../' * depth}_static/images/{image})", ""]
+    lines += ["## See also", ""] + [f"- [{link}]({link}.md)" for link in links] + [""]
+    return "\n".join(lines)
+
+
+def rst_page(rng, title, depth, images):
+    """Return a reStructuredText page with sections and images."""
+    lines = [title, "=" * len(title), "", paragraph(rng), ""]
+    for number in range(1, SECTIONS_PER_PAGE + 1):
+        heading = f"{title} section {number}"
+        lines += [heading, "-" * len(heading), "", paragraph(rng), ""]
+        lines += [f"* {sentence(rng, 6)}" for _ in range(4)] + [""]
+        if images:
+            image = images[(number + len(title)) % len(images)]
+            lines += [f".. image:: {'../' * depth}_static/images/{image}", ""]
+    return "\n".join(lines)
+
+
+def toctree_page(title, entries):
+    return "\n".join(
+        [title, "=" * len(title), "", ".. toctree::", "   :maxdepth: 2", ""] + [f"   {e}" for e in entries] + [""]
+    )
+
+
+def api_module(rng, package, number):
+    """Return the source of a module with documented classes and functions."""
+    lines = [f'"""{sentence(rng, 8)[:-1]} ({package} module {number})."""', ""]
+    for index in range(CLASSES_PER_MODULE):
+        lines += [
+            "",
+            f"class Record{number}x{index}:",
+            f'    """{sentence(rng, 10)}',
+            "",
+            "    Parameters:",
+            f"        name (str): {sentence(rng, 6)}",
+            f"        value (int): {sentence(rng, 6)}",
+            '    """',
+            "",
+            "    def __init__(self, name, value=0):",
+            "        self.name = name",
+            "        self.value = value",
+            "",
+            "    def describe(self, verbose=False):",
+            f'        """{sentence(rng, 8)}',
+            "",
+            "        Parameters:",
+            f"            verbose (bool): {sentence(rng, 6)}",
+            "",
+            "        Returns:",
+            f"            str: {sentence(rng, 6)}",
+            '        """',
+            '        return f"{self.name}={self.value}" if verbose else self.name',
+            "",
+        ]
+    for index in range(FUNCTIONS_PER_MODULE):
+        lines += [
+            "",
+            f"def process_{number}_{index}(values, scale=1.0):",
+            f'    """{sentence(rng, 10)}',
+            "",
+            "    Parameters:",
+            f"        values (list): {sentence(rng, 6)}",
+            f"        scale (float): {sentence(rng, 6)}",
+            "",
+            "    Returns:",
+            f"        list: {sentence(rng, 6)}",
+            '    """',
+            "    return [value * scale for value in values]",
+            "",
+        ]
+    return "\n".join(lines)
+
+
+def api_index(package, modules):
+    lines = ["API reference", "=============", "", ".. autosummary::", "   :toctree: _generated", ""]
+    return "\n".join(lines + [f"   {package}.module_{number:03d}" for number in range(modules)] + [""])
+
+
+def write_text(path, text):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(text, encoding="utf-8")
+
+
+def make_submodule(rng, root, name, config, pages, modules, images):
+    """Generate the documentation (and package) of one synthetic submodule."""
+    source = config["source"]
+    # conf.py resolves the packages of the submodules with an api/ directory from the checkout root
+    repo_dir = root / "submodules" / name
+
+    image_names = [f"figure_{number:02d}.png" for number in range(images)]
+    for image in image_names:
+        (source / "_static" / "images").mkdir(parents=True, exist_ok=True)
+        (source / "_static" / "images" / image).write_bytes(png_image(rng, *IMAGE_SIZE))
+
+    files = config["files"]
+    directories = [entry for entry in files if entry.endswith("/")]
+    page_dirs = [entry for entry in directories if entry != "api/"] or directories
+    stems = [Path(entry).stem for entry in files if not entry.endswith("/") and entry != "index.rst"]
+    for entry in files:
+        if entry == "index.rst":
+            toctree = stems + [f"{directory}index" for directory in directories]
+            write_text(source / entry, toctree_page(f"{name} documentation", toctree))
+        elif entry.endswith(".md"):
+            links = [stem for stem in stems if stem != Path(entry).stem][:3]
+            write_text(source / entry, markdown_page(rng, f"{name} {Path(entry).stem}", 0, image_names, links))
+        elif entry.endswith(".rst"):
+            write_text(source / entry, rst_page(rng, f"{name} {Path(entry).stem}", 0, image_names))
+
+    package = "bench_" + name.replace("-", "_").lower()
+    for directory in directories:
+        page_names = [f"page_{number:03d}" for number in range(pages)] if directory in page_dirs else []
+        entries = page_names[:]
+        if directory == "api/":
+            write_text(source / directory / "reference.rst", api_index(package, modules))
+            entries.insert(0, "reference")
+            for number in range(modules):
+                write_text(repo_dir / package / f"module_{number:03d}.py", api_module(rng, package, number))
+            write_text(repo_dir / package / "__init__.py", f'"""Synthetic package of {name}."""\n')
+        write_text(source / directory / "index.rst", toctree_page(f"{name} {directory[:-1]}", entries))
+        for index, page in enumerate(page_names):
+            links = [page_names[(index + step) % len(page_names)] for step in (1, 2)]
+            title = f"{name} {directory[:-1]} page {index}"
+            write_text(source / directory / f"{page}.md", markdown_page(rng, title, 1, image_names, links))
+
+
+def write_empty_inventories(root):
+    """Cache an empty inventory for every intersphinx entry of conf.py, so the build stays offline."""
+    inventory_cache = load_docs_module("inventory_cache")
+    cache_dir = root / ".cache" / "intersphinx"
+    metadata = {}
+    for name in conf_literal(root / "docs" / "source", "intersphinx_mapping", {}):
+        header = f"# Sphinx inventory version 2\n# Project: {name}\n# Version: \n"
+        data = header.encode() + b"# The remainder of this file is compressed using zlib.\n" + zlib.compress(b"")
+        inventory_cache.write_inventory(name, data, cache_dir)
+        metadata[name] = {"source": "hed-benchmark", "fetched": time.time()}
+    inventory_cache.save_metadata(metadata, cache_dir)
+
+
+def make_fixture(root, repos, pages, modules, images, seed=0):
+    """Generate the fixture repository.
+
+    Returns:
+        list: Names of the synthetic submodules.
+    """
+    build_unified = load_build_unified()
+    if root.exists():
+        shutil.rmtree(root)
+    manifest = build_unified.get_submodules(root)
+    dest_names = {config["dest"].name for config in manifest.values()}
+    shutil.copytree(
+        DOCS_DIR,
+        root / "docs",
+        ignore=lambda directory, names: [
+            name for name in names if name in IGNORED_DOCS or (Path(directory).name == "source" and name in dest_names)
+        ],
+    )
+    names = list(manifest)[:repos]
+    rng = random.Random(seed)
+    for name in names:
+        make_submodule(rng, root, name, manifest[name], pages, modules, images)
+    write_empty_inventories(root)
+    return names
+
+
+def fixture_size(root):
+    files = [path for path in (root / "submodules").rglob("*") if path.is_file()]
+    return {"files": len(files), "bytes": sum(path.stat().st_size for path in files)}
+
+
+# -- Measurements -------------------------------------------------------------
+
+
+def measure(function, *args, **kwargs):
+    """Call a function and return (seconds, peak traced bytes)."""
+    tracemalloc.start()
+    start = time.perf_counter()
+    try:
+        function(*args, **kwargs)
+        return time.perf_counter() - start, tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def run_child(cmd, cwd, log_file):
+    """Run a command and return (seconds, peak RSS in bytes or None); its output goes to log_file."""
+    start = time.perf_counter()
+    with open(log_file, "w", encoding="utf-8") as log:
+        process = subprocess.Popen(cmd, cwd=cwd, stdout=log, stderr=subprocess.STDOUT)
+        if hasattr(os, "wait4"):
+            _, status, usage = os.wait4(process.pid, 0)
+            process.returncode = os.waitstatus_to_exitcode(status)
+            # ru_maxrss is in kilobytes, except on macOS
+            peak = usage.ru_maxrss * (1 if sys.platform == "darwin" else 1024)
+        else:
+            process.wait()
+            peak = None
+    seconds = time.perf_counter() - start
+    if process.returncode:
+        raise RuntimeError(f"{' '.join(cmd[:4])} ... failed with status {process.returncode} (see {log_file})")
+    return seconds, peak
+
+
+def copy_step(root, names, jobs):
+    build_unified = load_build_unified()
+    only = None if len(names) == len(build_unified.get_submodules(root)) else names
+    with open(os.devnull, "w") as devnull:
+        stdout, sys.stdout = sys.stdout, devnull
+        try:
+            build_unified.copy_submodule_docs(root, jobs=jobs, only=only)
+        finally:
+            sys.stdout = stdout
+
+
+def sphinx_build(root, names, jobs, label):
+    """Build the fixture's HTML with the profiler enabled and return its metrics."""
+    build_dir = root / "docs" / "_build"
+    build_dir.mkdir(parents=True, exist_ok=True)
+    profile_file = build_dir / f"profile-{label}.json"
+    cmd = [sys.executable, "-m", "sphinx", "-b", "html", "-j", str(jobs)]
+    overrides = {"hed_profile": "1", "hed_profile_output": str(profile_file), "hed_api_cache": "0"}
+    if len(names) < len(load_build_unified().get_submodules(root)):
+        overrides["hed_only"] = ",".join(names)
+    for name, value in overrides.items():
+        cmd += ["-D", f"{name}={value}"]
+    cmd += [str(root / "docs" / "source"), str(build_dir / "html")]
+
+    log_file = build_dir / f"sphinx-{label}.log"
+    seconds, peak = run_child(cmd, root, log_file)
+    metrics = {f"build.{label}.seconds": seconds, f"build.{label}.peak_rss_bytes": peak}
+    metrics[f"build.{label}.warnings"] = log_file.read_text(encoding="utf-8").count("WARNING:")
+    report = json.loads(profile_file.read_text(encoding="utf-8"))
+    for phase, entry in report["phases"].items():
+        metrics[f"build.{label}.phase.{phase}.seconds"] = entry["seconds"]
+        metrics[f"build.{label}.phase.{phase}.peak_bytes"] = entry["peak_bytes"]
+    return metrics
+
+
+def fetch_pages(port, pages, etags=None):
+    """Fetch pages over one keep-alive connection, revalidating with etags if given.
+
+    Returns:
+        tuple: (seconds per request, {page: ETag}).
+    """
+    connection = http.client.HTTPConnection("127.0.0.1", port)
+    latencies, received = [], {}
+    try:
+        for page in pages:
+            headers = {"Accept-Encoding": "gzip, br"}
+            if etags and page in etags:
+                headers["If-None-Match"] = etags[page]
+            start = time.perf_counter()
+            connection.request("GET", "/" + page, headers=headers)
+            response = connection.getresponse()
+            response.read()
+            latencies.append(time.perf_counter() - start)
+            received[page] = response.getheader("ETag")
+    finally:
+        connection.close()
+    return latencies, received
+
+
+def serve_path(html_dir):
+    """Fetch every page from the hed-serve-docs handler, then revalidate them."""
+    pages = sorted(path.relative_to(html_dir).as_posix() for path in html_dir.rglob("*.html"))
+    handler = functools.partial(QuietRequestHandler, directory=str(html_dir))
+    with http.server.ThreadingHTTPServer(("127.0.0.1", 0), handler) as httpd:
+        thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+        thread.start()
+        try:
+            port = httpd.server_address[1]
+            latencies, etags = fetch_pages(port, pages)
+            revalidations, _ = fetch_pages(port, pages, etags)
+        finally:
+            httpd.shutdown()
+    return {
+        "serve.pages": len(pages),
+        "serve.get.seconds": sum(latencies),
+        "serve.get.p95_seconds": percentile(latencies, 95),
+        "serve.revalidate.seconds": sum(revalidations),
+    }
+
+
+def percentile(values, percent):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * percent / 100))] if ordered else 0.0
+
+
+def clean_fixture(root, names):
+    """Remove the copies and build output of an earlier repetition."""
+    manifest = load_build_unified().get_submodules(root)
+    for name in names:
+        shutil.rmtree(manifest[name]["dest"], ignore_errors=True)
+    shutil.rmtree(root / "docs" / "_build", ignore_errors=True)
+
+
+def run_once(root, names, jobs):
+    clean_fixture(root, names)
+    metrics = {}
+    metrics["copy.cold.seconds"], metrics["copy.cold.peak_bytes"] = measure(copy_step, root, names, jobs)
+    metrics["copy.noop.seconds"], metrics["copy.noop.peak_bytes"] = measure(copy_step, root, names, jobs)
+    metrics.update(sphinx_build(root, names, jobs, "cold"))
+    metrics.update(sphinx_build(root, names, jobs, "noop"))
+    metrics.update(serve_path(root / "docs" / "_build" / "html"))
+    return metrics
+
+
+# -- Results ------------------------------------------------------------------
+
+
+def unit_of(metric):
+    """Return the unit of a metric ("seconds", "bytes") or None for counts, which are not compared."""
+    if metric.endswith("seconds"):
+        return "seconds"
+    if metric.endswith("bytes"):
+        return "bytes"
+    return None
+
+
+def format_value(metric, value):
+    if value is None:
+        return "-"
+    unit = unit_of(metric)
+    if unit == "seconds":
+        return f"{value:.3f}s"
+    if unit == "bytes":
+        return f"{value / 1e6:.1f}MB"
+    return str(value)
+
+
+def compare(results, baseline, threshold):
+    """Print current against baseline metrics.
+
+    Returns:
+        list: Metrics that got slower or bigger by more than threshold percent.
+    """
+    if results["fixture"]["parameters"] != baseline.get("fixture", {}).get("parameters"):
+        print("[WARN] The baseline was measured on a different fixture; differences may not be meaningful")
+    regressions = []
+    print(f"{'metric':<48}{'baseline':>12}{'current':>12}{'change':>9}")
+    for metric, value in results["metrics"].items():
+        old = baseline["metrics"].get(metric)
+        unit = unit_of(metric)
+        if unit is None or value is None or not old:
+            continue
+        change = (value - old) / old * 100
+        regressed = change > threshold and value - old > MIN_DIFFERENCE[unit]
+        flag = "  REGRESSION" if regressed else ""
+        print(f"{metric:<48}{format_value(metric, old):>12}{format_value(metric, value):>12}{change:>+8.1f}%{flag}")
+        if regressed:
+            regressions.append(metric)
+    return regressions
+
+
+def parse_args(argv=None):
+    """Parse the command-line options of hed-benchmark."""
+    parser = argparse.ArgumentParser(description="Benchmark the unified documentation build on synthetic submodules.")
+    parser.add_argument("--repos", type=int, default=REPOS, help=f"synthetic submodules (default: {REPOS})")
+    parser.add_argument(
+        "--pages", type=int, default=PAGES, help=f"extra pages per listed directory of a submodule (default: {PAGES})"
+    )
+    parser.add_argument(
+        "--modules",
+        type=int,
+        default=MODULES,
+        help=f"API modules per submodule with an api/ directory (default: {MODULES})",
+    )
+    parser.add_argument("--images", type=int, default=IMAGES, help=f"images per submodule (default: {IMAGES})")
+    parser.add_argument("--repeat", type=int, default=1, help="repetitions; medians are reported (default: 1)")
+    parser.add_argument(
+        "-j", "--jobs", type=parse_jobs, default=1, metavar="N", help="copy threads and Sphinx workers (default: 1)"
+    )
+    parser.add_argument(
+        "--output", type=Path, default=OUTPUT_FILE, help="results file (default: docs/_build/benchmark.json)"
+    )
+    parser.add_argument("--compare", type=Path, metavar="FILE", help="compare with an earlier results file")
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=THRESHOLD,
+        metavar="PCT",
+        help=f"slow-down in percent counted as a regression (default: {THRESHOLD})",
+    )
+    parser.add_argument("--workdir", type=Path, help="generate the fixture here and keep it")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    """Run the benchmark and write, print and optionally compare the results."""
+    args = parse_args(argv)
+    manifest_size = len(load_build_unified().get_submodules())
+    if not 0 <= args.repos <= manifest_size:
+        print(
+            f"[ERROR] --repos must be between 0 and {manifest_size} (the submodules in the manifest)", file=sys.stderr
+        )
+        return 1
+    baseline = None
+    if args.compare:
+        try:
+            baseline = json.loads(args.compare.read_text(encoding="utf-8"))
+        except (OSError, ValueError) as e:
+            print(f"[ERROR] Cannot read {args.compare}: {e}", file=sys.stderr)
+            return 1
+
+    parameters = {"repos": args.repos, "pages": args.pages, "modules": args.modules, "images": args.images}
+    with tempfile.TemporaryDirectory(prefix="hed-benchmark-") as tmp_dir:
+        root = (args.workdir or Path(tmp_dir) / "repo").resolve()
+        print(f"Generating fixture in {root} ({', '.join(f'{k}={v}' for k, v in parameters.items())})...")
+        names = make_fixture(root, **parameters)
+        samples = {}
+        for repetition in range(1, args.repeat + 1):
+            print(f"Run {repetition}/{args.repeat}...")
+            try:
+                metrics = run_once(root, names, args.jobs)
+            except RuntimeError as e:
+                print(f"[ERROR] {e}", file=sys.stderr)
+                return 1
+            for metric, value in metrics.items():
+                samples.setdefault(metric, []).append(value)
+        size = fixture_size(root)
+
+    results = {
+        "version": RESULTS_VERSION,
+        "created": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "jobs": args.jobs,
+        "repeat": args.repeat,
+        "fixture": {"parameters": parameters, "submodules": names, **size},
+        "metrics": {
+            metric: None if None in values else statistics.median(values) for metric, values in samples.items()
+        },
+        "samples": samples,
+    }
+    args.output.parent.mkdir(parents=True, exist_ok=True)
+    args.output.write_text(json.dumps(results, indent=2), encoding="utf-8")
+
+    print()
+    for metric, value in results["metrics"].items():
+        print(f"{metric:<48}{format_value(metric, value):>12}")
+    print(f"\nResults written to {args.output}")
+
+    if baseline is not None:
+        print()
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print(f"[ERROR] {len(regressions)} metrics regressed by more than {args.threshold:g}%", file=sys.stderr)
+            return 1
+        print(f"[OK] No regressions above {args.threshold:g}%")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
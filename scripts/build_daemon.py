@@ -0,0 +1,407 @@
+#!/usr/bin/env python3
+"""Keep a warm Sphinx application resident and build HED documentation on request.
+
+A regular build starts a new interpreter, imports Sphinx, every extension and
+the documented packages, executes conf.py and unpickles the environment before
+reading a single document. The daemon keeps the interpreter and everything it
+imported. Each build still gets a new Sphinx application, so the start-up work
+of the extensions (autosummary stubs, document mapping, API cache keys,
+inventory refresh) sees the current state of the submodules. The daemon serves
+builds over a local socket, and hed-build-docs and hed-serve-docs --watch use
+it automatically whenever it is running.
+
+Can be run as:
+- Command (after pip install -e .): hed-build-daemon
+- Direct Python: python scripts/build_daemon.py
+- Module: python -m scripts.build_daemon
+
+Options:
+  --zero-copy   Read submodule docs in place (same as hed-build-docs --zero-copy)
+  --only NAMES, --core-only
+                Build only some submodules (same as hed-build-docs)
+  -j, --jobs N  Build with N parallel workers ('auto' for all cores)
+  --port N      Listen on this localhost port (default: any free port)
+  --status      Show the status of the running daemon
+  --stop        Stop the running daemon
+
+Protocol: each connection sends one JSON request line, such as
+``{"command": "build", "docnames": ["index"]}``. The daemon answers with zero
+or more ``{"stream": ..., "output": ...}`` lines carrying Sphinx's output,
+followed by one final response line with an ``ok`` field. Supported commands:
+
+- ``status``: report the process id, options and number of builds
+- ``build``: build incrementally. ``docnames`` restricts the build to those
+  documents, ``full`` rebuilds everything with a fresh environment, and
+  ``sync`` first syncs the submodule documentation (skipped in zero-copy mode)
+- ``stop``: shut the daemon down
+"""
+
+import argparse
+import contextlib
+import json
+import os
+import socket
+import socketserver
+import sys
+import threading
+import time
+from pathlib import Path
+
+if __package__:
+    from .common import (
+        BUILD_DIR,
+        DOCS_DIR,
+        HTML_DIR,
+        REPO_ROOT,
+        SOURCE_DIR,
+        add_selection_arguments,
+        load_build_unified,
+        parse_jobs,
+        save_overrides,
+        selection_overrides,
+    )
+else:
+    from common import (
+        BUILD_DIR,
+        DOCS_DIR,
+        HTML_DIR,
+        REPO_ROOT,
+        SOURCE_DIR,
+        add_selection_arguments,
+        load_build_unified,
+        parse_jobs,
+        save_overrides,
+        selection_overrides,
+    )
+
+HOST = "127.0.0.1"
+STATE_FILE = BUILD_DIR / ".build-daemon.json"
+SUBMODULES_DIR = REPO_ROOT / "submodules"
+
+
+class OutputRelay:
+    """File-like stream forwarding Sphinx output to the client of the current request.
+
+    Without a client the output goes to the daemon's own terminal.
+    """
+
+    def __init__(self, name, fallback):
+        self.name = name
+        self.fallback = fallback
+        self.target = None
+
+    def write(self, text):
+        if self.target is None:
+            self.fallback.write(text)
+        elif text:
+            self.target(self.name, text)
+        return len(text)
+
+    def flush(self):
+        if self.target is None:
+            self.fallback.flush()
+
+    def isatty(self):
+        return False
+
+
+class BuildDaemon:
+    """Keeps Sphinx and the imported code resident and runs one build at a time, each with a new application."""
+
+    def __init__(self, overrides, jobs):
+        self.overrides = overrides
+        self.jobs = jobs
+        self.status_stream = OutputRelay("status", sys.stdout)
+        self.warning_stream = OutputRelay("warning", sys.stderr)
+        self.lock = threading.Lock()
+        self.builds = 0
+        self.app = None
+        self._app_context = None
+        self._module_stamps = {}
+
+    @contextlib.contextmanager
+    def client(self, on_output):
+        """Send Sphinx's output (and anything printed) to ``on_output`` for the duration of a request."""
+        self.status_stream.target = self.warning_stream.target = on_output
+        try:
+            with contextlib.redirect_stdout(self.status_stream):
+                yield
+        finally:
+            self.status_stream.target = self.warning_stream.target = None
+
+    def load(self, fresh=False):
+        """Create the Sphinx application for the next build, replacing any unused one."""
+        if fresh and self.app is not None:
+            print("Starting a full rebuild")
+        self.close()
+
+        from sphinx.application import Sphinx
+        from sphinx.util.docutils import docutils_namespace, patch_docutils
+
+        self._app_context = contextlib.ExitStack()
+        # conf.py prepends its directories to sys.path each time it is executed
+        self._app_context.callback(sys.path.__setitem__, slice(None), list(sys.path))
+        self._app_context.enter_context(patch_docutils(SOURCE_DIR))
+        self._app_context.enter_context(docutils_namespace())
+        try:
+            self.app = Sphinx(
+                SOURCE_DIR,
+                SOURCE_DIR,
+                HTML_DIR,
+                HTML_DIR / ".doctrees",
+                "html",
+                confoverrides=dict(self.overrides),
+                status=self.status_stream,
+                warning=self.warning_stream,
+                freshenv=fresh,
+                parallel=self.jobs,
+            )
+        except BaseException:
+            self.close()
+            raise
+
+    def close(self):
+        """Drop the Sphinx application and restore the docutils state it patched."""
+        self.app = None
+        if self._app_context is not None:
+            self._app_context.close()
+            self._app_context = None
+
+    def evict_stale_modules(self):
+        """Forget imported modules whose files changed, so the next build imports them again.
+
+        Submodule packages (the autodoc targets) are evicted as a whole. The
+        documentation's own modules import each other, so a change to any of
+        them evicts all of them.
+        """
+        stale = set()
+        for name, (path, mtime) in self._module_stamps.items():
+            try:
+                current = path.stat().st_mtime_ns
+            except OSError:
+                current = None
+            if current != mtime:
+                stale.add(name.partition(".")[0])
+        docs_modules = {name for name, (path, _) in self._module_stamps.items() if path.is_relative_to(DOCS_DIR)}
+        if stale & docs_modules:
+            stale |= docs_modules
+        for name in list(sys.modules):
+            if name.partition(".")[0] in stale:
+                del sys.modules[name]
+        if stale:
+            print(f"Reloading changed packages: {', '.join(sorted(stale))}")
+
+    def record_modules(self):
+        """Remember the files of the imported submodule code (the autodoc targets) and documentation modules."""
+        stamps = {}
+        for name, module in list(sys.modules.items()):
+            path = getattr(module, "__file__", None)
+            if not path or not any(Path(path).is_relative_to(root) for root in (SUBMODULES_DIR, DOCS_DIR)):
+                continue
+            with contextlib.suppress(OSError):
+                stamps[name] = (Path(path), Path(path).stat().st_mtime_ns)
+        self._module_stamps = stamps
+
+    def doc_files(self, docnames):
+        """Return the source files of ``docnames``, or an empty list if any cannot be built on its own.
+
+        New documents and documents read in place (zero-copy) are picked up by
+        an incremental build instead.
+        """
+        env = self.app.env
+        files = [Path(env.doc2path(docname)) for docname in docnames if docname in env.found_docs]
+        if len(files) != len(docnames) or not all(path.is_relative_to(self.app.srcdir) for path in files):
+            return []
+        return files
+
+    def status(self):
+        return {
+            "ok": True,
+            "pid": os.getpid(),
+            "overrides": self.overrides,
+            "jobs": self.jobs,
+            "builds": self.builds,
+            "busy": self.lock.locked(),
+        }
+
+    def build(self, docnames=None, full=False, sync=False):
+        """Run one build and return the final response for the client."""
+        with self.lock:
+            start = time.perf_counter()
+            if sync and not self.overrides.get("hed_zero_copy"):
+                build_unified = load_build_unified()
+                build_unified.copy_submodule_docs(
+                    REPO_ROOT, only=build_unified.parse_only(self.overrides.get("hed_only"))
+                )
+            self.evict_stale_modules()
+            # The application loaded at start-up serves the first build; later builds get their own
+            if full or self.app is None:
+                self.load(fresh=full)
+
+            app = self.app
+            filenames = [] if full or not docnames else self.doc_files(docnames)
+            try:
+                app.build(force_all=full, filenames=filenames)
+            finally:
+                self.record_modules()
+                self.close()
+            self.builds += 1
+            save_overrides(HTML_DIR / ".doctrees", self.overrides)
+            return {"ok": app.statuscode == 0, "status": app.statuscode, "seconds": time.perf_counter() - start}
+
+
+class DaemonRequestHandler(socketserver.StreamRequestHandler):
+    """Handles one JSON request per connection."""
+
+    def handle(self):
+        daemon = self.server.build_daemon
+        try:
+            request = json.loads(self.rfile.readline())
+            command = request.get("command")
+        except (ValueError, AttributeError):
+            return self.send({"ok": False, "error": "expected one JSON object per line"})
+
+        try:
+            if command == "status":
+                response = daemon.status()
+            elif command == "build":
+                with daemon.client(self.send_output):
+                    response = daemon.build(
+                        docnames=request.get("docnames"),
+                        full=bool(request.get("full")),
+                        sync=bool(request.get("sync")),
+                    )
+            elif command == "stop":
+                response = {"ok": True}
+                threading.Thread(target=self.server.shutdown).start()
+            else:
+                response = {"ok": False, "error": f"unknown command {command!r}"}
+        except Exception as e:
+            response = {"ok": False, "error": f"{type(e).__name__}: {e}"}
+        self.send(response)
+
+    def send_output(self, stream, text):
+        self.send({"stream": stream, "output": text})
+
+    def send(self, message):
+        # A client that went away must not interrupt the build it started
+        with contextlib.suppress(OSError):
+            self.wfile.write(json.dumps(message).encode("utf-8") + b"\n")
+            self.wfile.flush()
+
+
+def print_output(stream, text):
+    """Default output handler of request_daemon: echo Sphinx output to this terminal."""
+    (sys.stderr if stream == "warning" else sys.stdout).write(text)
+
+
+def request_daemon(command, on_output=print_output, **params):
+    """Send a request to the running build daemon.
+
+    Args:
+        command (str): "status", "build" or "stop".
+        on_output (callable): Called with (stream, text) for the Sphinx output of a build.
+        **params: Request parameters, e.g. ``docnames``, ``full`` or ``sync`` for builds.
+
+    Returns:
+        dict or None: The daemon's final response, or None if no daemon is running.
+    """
+    try:
+        state = json.loads(STATE_FILE.read_text(encoding="utf-8"))
+        sock = socket.create_connection((state["host"], state["port"]), timeout=5)
+    except (OSError, ValueError, KeyError):
+        return None
+
+    with sock:
+        # Builds take as long as they take
+        sock.settimeout(None)
+        sock.sendall(json.dumps({"command": command, **params}).encode("utf-8") + b"\n")
+        with sock.makefile("r", encoding="utf-8") as replies:
+            for line in replies:
+                message = json.loads(line)
+                if "output" in message:
+                    on_output(message["stream"], message["output"])
+                else:
+                    return message
+    return {"ok": False, "error": "the daemon closed the connection"}
+
+
+def parse_args(argv=None):
+    """Parse the command-line options of hed-build-daemon."""
+    parser = argparse.ArgumentParser(
+        description="Keep a warm Sphinx application and build HED documentation on request."
+    )
+    parser.add_argument(
+        "--zero-copy",
+        action="store_true",
+        help="read submodule docs in place instead of syncing copies",
+    )
+    add_selection_arguments(parser)
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        type=parse_jobs,
+        default=1,
+        metavar="N",
+        help="build with N parallel workers ('auto' uses all available cores)",
+    )
+    parser.add_argument("--port", type=int, default=0, help="localhost port to listen on (default: any free port)")
+    actions = parser.add_mutually_exclusive_group()
+    actions.add_argument("--status", action="store_true", help="show the status of the running daemon")
+    actions.add_argument("--stop", action="store_true", help="stop the running daemon")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    """Run the build daemon, or query or stop a running one."""
+    args = parse_args(argv)
+
+    running = request_daemon("status")
+    if args.status or args.stop:
+        if running is None:
+            print("No build daemon is running")
+            return 1
+        if args.stop:
+            request_daemon("stop")
+            print(f"[OK] Stopped build daemon (pid {running['pid']})")
+        else:
+            print(json.dumps(running, indent=2))
+        return 0
+    if running is not None:
+        print(f"[ERROR] A build daemon is already running (pid {running['pid']})", file=sys.stderr)
+        return 1
+
+    overrides = selection_overrides(args.only)
+    if args.zero_copy:
+        overrides["hed_zero_copy"] = "1"
+    daemon = BuildDaemon(overrides, args.jobs)
+    print("Loading the Sphinx application...")
+    try:
+        daemon.load()
+    except Exception as e:
+        print(f"[ERROR] Could not load the Sphinx application: {e}", file=sys.stderr)
+        return 1
+
+    with socketserver.ThreadingTCPServer((HOST, args.port), DaemonRequestHandler) as server:
+        server.daemon_threads = True
+        server.build_daemon = daemon
+        port = server.server_address[1]
+        STATE_FILE.parent.mkdir(parents=True, exist_ok=True)
+        STATE_FILE.write_text(
+            json.dumps({"pid": os.getpid(), "host": HOST, "port": port, "overrides": overrides}),
+            encoding="utf-8",
+        )
+        print(f"[OK] Build daemon listening on {HOST}:{port} (press Ctrl+C to stop)")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            STATE_FILE.unlink(missing_ok=True)
+            daemon.close()
+    print("[OK] Build daemon stopped")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
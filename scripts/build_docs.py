@@ -4,52 +4,243 @@
 This script:
 1. Copies submodule documentation using build_unified.py
 2. Builds Sphinx documentation to HTML
+3. With --builders, runs the other builders from the environment step 2 read
 
 Can be run as:
 - Command (after pip install -e .): hed-build-docs
 - Direct Python: python scripts/build_docs.py
 - Module: python -m scripts.build_docs
+
+Options:
+  --zero-copy   Skip the copy step and let Sphinx read submodule docs in place
+  --profile     Record per-phase and per-document build times and memory
+                (report written to docs/_build/profile.json)
+  --no-optimize-assets
+                Skip minifying, fingerprinting and precompressing the static
+                assets of the built site
+  --no-precompress
+                Write no .gz/.br siblings of the text files, for hosts that
+                cannot serve them such as GitHub Pages
+  -j, --jobs N  Build with N parallel workers ('auto' for all cores), after
+                checking that every conf.py extension is parallel safe
+  --only NAMES  Copy, register and build only these comma-separated submodules
+                (e.g. hed-python,hed-specification); the index pages of the
+                others are replaced by short stubs
+  --core-only   Build the core documentation without any submodule
+  --no-daemon   Build in a new process even if hed-build-daemon is running
+  --builders NAMES
+                Run these comma-separated Sphinx builders (default: html, e.g.
+                html,json,linkcheck). The first reads the documents; the others
+                start from a copy of the environment it pickled and run their
+                write phase concurrently in their own processes
+  --archive [FILE]
+                Also write the built HTML site to a single zip archive
+                (default: docs/_build/site.zip) that hed-serve-docs --archive
+                serves without extracting it
+  --prefetch-inventories
+                Fill the local intersphinx inventory cache and exit (the
+                hed-python inventory is built from the checked-out submodule)
+
+When hed-build-daemon is running with the same --zero-copy/--profile/--only options
+(and without --no-optimize-assets or --no-precompress),
+the build is handed to it and skips Sphinx start-up.
 """
 
+import argparse
+import ast
+import importlib
+import shutil
 import subprocess
 import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
+if __package__:
+    from .build_daemon import request_daemon
+    from .common import (
+        REPO_ROOT,
+        add_selection_arguments,
+        load_build_unified,
+        load_docs_module,
+        parse_jobs,
+        save_overrides,
+        selection_overrides,
+    )
+    from .site_archive import ARCHIVE_FILE, write_archive
+else:
+    from build_daemon import request_daemon
+    from common import (
+        REPO_ROOT,
+        add_selection_arguments,
+        load_build_unified,
+        load_docs_module,
+        parse_jobs,
+        save_overrides,
+        selection_overrides,
+    )
+    from site_archive import ARCHIVE_FILE, write_archive
 
-def main():
-    """Build the unified HED documentation."""
-    # Get the repository root (parent of scripts directory)
-    repo_root = Path(__file__).resolve().parent.parent
-    docs_dir = repo_root / "docs"
-    build_unified_script = docs_dir / "build_unified.py"
-    source_dir = docs_dir / "source"
-    build_dir = docs_dir / "_build" / "html"
+# Lines of output shown for a failed builder of --builders
+OUTPUT_TAIL = 20
 
-    print("=" * 60)
-    print("Building Unified HED Documentation")
-    print("=" * 60)
+
+def conf_literal(source_dir, name, default=None):
+    """Return the literal value of a top-level conf.py assignment without executing conf.py."""
+    tree = ast.parse((source_dir / "conf.py").read_text(encoding="utf-8"))
+    for node in tree.body:
+        if isinstance(node, ast.Assign) and any(getattr(t, "id", None) == name for t in node.targets):
+            return ast.literal_eval(node.value)
+    return default
+
+
+def conf_extensions(source_dir):
+    """Return the ``extensions`` list of conf.py without executing it."""
+    return list(conf_literal(source_dir, "extensions", []))
+
+
+def prefetch_inventories(source_dir):
+    """Fill the local intersphinx inventory cache for conf.py's intersphinx_mapping."""
+    inventory_cache = load_docs_module("inventory_cache")
+    mapping = conf_literal(source_dir, "intersphinx_mapping", {})
+    print(f"Prefetching {len(mapping)} intersphinx inventories into {inventory_cache.CACHE_DIR}...")
+    failed = inventory_cache.prefetch_inventories(mapping)
+    if failed:
+        print(f"[ERROR] Could not cache: {', '.join(failed)}", file=sys.stderr)
+        return 1
+    print("[OK] Intersphinx inventories cached")
+    return 0
+
+
+def warm_imports(names):
+    """Import modules ahead of time so Sphinx start-up does not pay for them later."""
+    for name in ["sphinx.application", "sphinx.builders.html", *names]:
+        try:
+            importlib.import_module(name)
+        except Exception:
+            # Import problems are reported properly when Sphinx loads the extension
+            pass
+
+
+def check_parallel_safety(app, names):
+    """Print the parallel read/write safety of each conf.py extension.
+
+    Returns:
+        list: Names of the extensions that are not declared safe for both parallel reading and writing.
+    """
+    unsafe = []
+    print(f"Parallel safety of conf.py extensions ({app.parallel} workers):")
+    for name in names:
+        extension = app.extensions.get(name)
+        if extension is None:
+            continue
+        read_safe, write_safe = extension.parallel_read_safe, extension.parallel_write_safe
+        labels = {True: "safe", False: "UNSAFE", None: "undeclared"}
+        print(f"  {name:<28} read: {labels[read_safe]:<11} write: {labels[write_safe]}")
+        if read_safe is not True or write_safe is not True:
+            unsafe.append(name)
+    return unsafe
+
+
+def parse_builders(value):
+    """Parse a --builders value: comma-separated Sphinx builder names, without duplicates."""
+    names = list(dict.fromkeys(name.strip() for name in value.split(",") if name.strip()))
+    if not names:
+        raise argparse.ArgumentTypeError("expected at least one builder name")
+    return names
+
+
+def build_parallel(args, source_dir, build_dir, doctree_dir, builder):
+    """Copy submodule docs and build with Sphinx in-process using ``args.jobs`` workers.
+
+    The copy step runs concurrently with importing Sphinx and the conf.py
+    extensions, which is the part of Sphinx start-up that does not depend on the
+    copied files (autosummary scans them as soon as the application is created).
+    """
+    extensions = conf_extensions(source_dir)
+    warmer = threading.Thread(target=warm_imports, args=(extensions,), daemon=True)
+    warmer.start()
+
+    if args.zero_copy:
+        print("Step 1: Skipped copying (submodule documentation is read in place)")
+    else:
+        print(f"Step 1: Copying submodule documentation ({args.jobs} threads, overlapping Sphinx start-up)...")
+        try:
+            load_build_unified().copy_submodule_docs(REPO_ROOT, jobs=args.jobs, only=args.only)
+        except Exception as e:
+            print(f"[ERROR] Failed to copy submodule documentation: {e}", file=sys.stderr)
+            return 1
+    warmer.join()
     print()
 
-    # Step 1: Copy submodule documentation
-    print("Step 1: Copying submodule documentation...")
+    print(f"Step 2: Building Sphinx documentation with {args.jobs} parallel workers...")
     try:
-        subprocess.run(
-            [sys.executable, str(build_unified_script)],
-            cwd=repo_root,
-            check=True,
+        from sphinx.application import Sphinx
+        from sphinx.util.docutils import docutils_namespace, patch_docutils
+        from sphinx.util.parallel import parallel_available
+    except ImportError:
+        print("[ERROR] Sphinx not found. Install with: pip install -e .[docs]", file=sys.stderr)
+        return 1
+
+    with patch_docutils(source_dir), docutils_namespace():
+        app = Sphinx(
+            source_dir,
+            source_dir,
+            build_dir,
+            doctree_dir,
+            builder,
+            confoverrides=sphinx_overrides(args),
+            parallel=args.jobs,
         )
-        print("[OK] Submodule documentation copied successfully")
-    except subprocess.CalledProcessError as e:
-        print(f"[ERROR] Failed to copy submodule documentation: {e}", file=sys.stderr)
+        unsafe = check_parallel_safety(app, extensions)
+        if not parallel_available:
+            print("[WARN] Parallel builds are not supported on this platform; building serially")
+            app.parallel = 1
+        elif unsafe:
+            print(f"[WARN] Not parallel safe: {', '.join(unsafe)}; falling back to a serial build")
+            app.parallel = 1
+        print()
+        app.build()
+
+    if app.statuscode:
+        print(f"[ERROR] Sphinx build failed with status {app.statuscode}", file=sys.stderr)
         return 1
+    print("[OK] Sphinx build completed successfully")
+    return 0
+
+
+def build_serial(args, source_dir, build_dir, doctree_dir, builder):
+    """Copy submodule docs with build_unified.py and build with sphinx-build."""
+    # Step 1: Copy submodule documentation
+    if args.zero_copy:
+        print("Step 1: Skipped copying (submodule documentation is read in place)")
+    else:
+        print("Step 1: Copying submodule documentation...")
+        copy_cmd = [sys.executable, str(REPO_ROOT / "docs" / "build_unified.py")]
+        if args.only is not None:
+            copy_cmd += ["--only", ",".join(args.only)]
+        try:
+            subprocess.run(
+                copy_cmd,
+                cwd=REPO_ROOT,
+                check=True,
+            )
+            print("[OK] Submodule documentation copied successfully")
+        except subprocess.CalledProcessError as e:
+            print(f"[ERROR] Failed to copy submodule documentation: {e}", file=sys.stderr)
+            return 1
     print()
 
     # Step 2: Build Sphinx documentation
     print("Step 2: Building Sphinx documentation...")
     try:
+        sphinx_cmd = ["sphinx-build", "-b", builder, "-d", str(doctree_dir), str(source_dir), str(build_dir)]
+        for name, value in sphinx_overrides(args).items():
+            sphinx_cmd += ["-D", f"{name}={value}"]
         subprocess.run(
-            ["sphinx-build", "-b", "html", str(source_dir), str(build_dir)],
-            cwd=repo_root,
+            sphinx_cmd,
+            cwd=REPO_ROOT,
             check=True,
         )
         print("[OK] Sphinx build completed successfully")
@@ -62,11 +253,210 @@ def main():
             file=sys.stderr,
         )
         return 1
+    return 0
+
+
+def run_builders(args, source_dir, doctree_dir, builders):
+    """Run more Sphinx builders concurrently from the environment pickled by the first build.
+
+    Each builder runs in its own process on a copy of doctree_dir in its output
+    directory. No source has changed since the environment was pickled, so only
+    the documents Sphinx always re-reads (those with a globbed toctree) are read
+    again, which is why the builders must not share one directory, and each
+    process otherwise only runs its builder's write phase.
+
+    Returns:
+        list: (builder, seconds, completed process) for each builder.
+    """
+
+    def run(builder):
+        start = time.perf_counter()
+        builder_doctrees = builder_dir(builder) / ".doctrees"
+        shutil.rmtree(builder_doctrees, ignore_errors=True)
+        shutil.copytree(doctree_dir, builder_doctrees)
+        sphinx_cmd = [sys.executable, "-m", "sphinx", "-b", builder, "-d", str(builder_doctrees)]
+        sphinx_cmd += [str(source_dir), str(builder_dir(builder))]
+        for name, value in sphinx_overrides(args).items():
+            sphinx_cmd += ["-D", f"{name}={value}"]
+        result = subprocess.run(sphinx_cmd, cwd=REPO_ROOT, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
+        return builder, time.perf_counter() - start, result
+
+    with ThreadPoolExecutor(max_workers=len(builders)) as executor:
+        return list(executor.map(run, builders))
+
+
+def builder_dir(builder):
+    """Return the output directory of a builder: docs/_build/<builder>."""
+    return REPO_ROOT / "docs" / "_build" / builder
+
+
+def build_with_daemon(args):
+    """Sync and build through a running hed-build-daemon.
+
+    Returns:
+        int or None: The exit code, or None if no daemon with matching options is running.
+    """
+    status = request_daemon("status")
+    if status is None:
+        return None
+    if status["overrides"] != sphinx_overrides(args):
+        print("[WARN] hed-build-daemon is running with different options; building without it")
+        print()
+        return None
+
+    print(f"Syncing and building with hed-build-daemon (pid {status['pid']})...")
+    response = request_daemon("build", sync=True)
+    if response is None or not response["ok"]:
+        error = "the daemon stopped" if response is None else response.get("error", f"status {response.get('status')}")
+        print(f"[ERROR] Daemon build failed: {error}", file=sys.stderr)
+        return 1
+    print(f"[OK] Sphinx build completed successfully in {response['seconds']:.1f}s")
+    return 0
+
+
+def sphinx_overrides(args):
+    """Return the conf.py overrides selected by the command-line options."""
+    overrides = selection_overrides(args.only)
+    if args.zero_copy:
+        overrides["hed_zero_copy"] = "1"
+    if args.profile:
+        overrides["hed_profile"] = "1"
+    if args.no_optimize_assets:
+        overrides["hed_optimize_assets"] = "0"
+        overrides["hed_optimize_images"] = "0"
+    if args.no_precompress:
+        overrides["hed_precompress"] = "0"
+    return overrides
+
+
+def parse_args(argv=None):
+    """Parse the command-line options of hed-build-docs."""
+    parser = argparse.ArgumentParser(description="Build the unified HED documentation.")
+    parser.add_argument(
+        "--zero-copy",
+        action="store_true",
+        help="skip the copy step and serve submodule docs to Sphinx in place",
+    )
+    parser.add_argument(
+        "--profile",
+        action="store_true",
+        help="profile the build per phase, document and submodule (writes docs/_build/profile.json)",
+    )
+    parser.add_argument(
+        "--no-optimize-assets",
+        action="store_true",
+        help="skip optimizing the static assets and images (see _ext/hed_assets.py and _ext/hed_images.py)",
+    )
+    parser.add_argument(
+        "--no-precompress",
+        action="store_true",
+        help="write no .gz/.br siblings of the text files, for hosts that cannot serve them (e.g. GitHub Pages)",
+    )
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        type=parse_jobs,
+        default=1,
+        metavar="N",
+        help="build with N parallel workers ('auto' uses all available cores)",
+    )
+    add_selection_arguments(parser)
+    parser.add_argument(
+        "--no-daemon",
+        action="store_true",
+        help="do not hand the build to a running hed-build-daemon",
+    )
+    parser.add_argument(
+        "--builders",
+        type=parse_builders,
+        default=["html"],
+        metavar="NAMES",
+        help="comma-separated Sphinx builders, e.g. html,json,linkcheck; "
+        "the first reads the documents, the others write concurrently from its environment",
+    )
+    parser.add_argument(
+        "--archive",
+        nargs="?",
+        const=ARCHIVE_FILE,
+        type=Path,
+        metavar="FILE",
+        help="also write the built site to a zip archive (default: docs/_build/site.zip) for hed-serve-docs --archive",
+    )
+    parser.add_argument(
+        "--prefetch-inventories",
+        action="store_true",
+        help="fill the local intersphinx inventory cache (.cache/intersphinx) and exit",
+    )
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    """Build the unified HED documentation."""
+    args = parse_args(argv)
+
+    # Get the repository root (parent of scripts directory)
+    repo_root = Path(__file__).resolve().parent.parent
+    docs_dir = repo_root / "docs"
+    source_dir = docs_dir / "source"
+    build_dir = docs_dir / "_build" / "html"
+    # Shared by every builder, so the environment is read once whatever the builders
+    doctree_dir = build_dir / ".doctrees"
+    first, *others = args.builders
+
+    if args.prefetch_inventories:
+        return prefetch_inventories(source_dir)
+    if args.archive is not None and "html" not in args.builders:
+        print("[ERROR] --archive needs the html builder", file=sys.stderr)
+        return 1
+
+    print("=" * 60)
+    print("Building Unified HED Documentation")
+    print("=" * 60)
     print()
 
+    start = time.perf_counter()
+    # The daemon keeps an HTML application
+    exit_code = None if args.no_daemon or first != "html" else build_with_daemon(args)
+    if exit_code is None and args.jobs > 1:
+        exit_code = build_parallel(args, source_dir, builder_dir(first), doctree_dir, first)
+    if exit_code is None:
+        exit_code = build_serial(args, source_dir, builder_dir(first), doctree_dir, first)
+    if exit_code:
+        return 1
+    # hed-serve-docs --watch rebuilds this environment with the same options
+    save_overrides(doctree_dir, sphinx_overrides(args))
+    timings = [(first, time.perf_counter() - start)]
+    print()
+
+    if others:
+        print(f"Step 3: Running {', '.join(others)} from the shared environment...")
+        failed = []
+        for builder, seconds, result in run_builders(args, source_dir, doctree_dir, others):
+            timings.append((builder, seconds))
+            if result.returncode:
+                print(f"  [ERROR] {builder} failed with status {result.returncode}; last output:", file=sys.stderr)
+                for line in result.stdout.rstrip().splitlines()[-OUTPUT_TAIL:]:
+                    print(f"    {line}", file=sys.stderr)
+                failed.append(builder)
+        if failed:
+            return 1
+        print("[OK] All builders completed successfully")
+        print()
+
+    if args.archive is not None:
+        print(f"Writing the site archive {args.archive}...")
+        entries = write_archive(build_dir, args.archive)
+        print(f"[OK] Archived {entries} files ({args.archive.stat().st_size / 1e6:.1f} MB)")
+        print()
+
     print("=" * 60)
     print("Build completed successfully!")
-    print(f"Documentation available at: {build_dir / 'index.html'}")
+    if others:
+        for builder, seconds in timings:
+            note = " (read and write)" if builder == first else ""
+            print(f"  {builder:<12} {seconds:>6.1f}s{note}  {builder_dir(builder)}")
+    if "html" in args.builders:
+        print(f"Documentation available at: {build_dir / 'index.html'}")
     print("=" * 60)
 
     return 0
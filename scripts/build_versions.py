@@ -0,0 +1,447 @@
+#!/usr/bin/env python3
+"""Build several versions of the unified HED documentation side by side.
+
+The versions are defined in [tool.hed-docs.versions] of pyproject.toml. Each
+maps the submodules to pin to a ref (tag, branch or commit); the other
+submodules are built as they are checked out:
+
+    [tool.hed-docs.versions]
+    latest = {}
+    "2025.1" = {hed-python = "0.6.0", hed-specification = "hed-specification-3.3.0"}
+
+Every version is built in its own workspace under .cache/versions/<version>:
+a synced copy of docs/ and a submodules/ directory pointing at the checkouts
+or at exported trees of the pinned commits (fetched shallowly if needed, and
+limited to the files the build uses, as hed-fetch-docs does). Workspaces are
+kept between runs, so Sphinx only rebuilds what changed in each version, and
+the versions are built concurrently.
+
+The output is stored content-addressed in docs/_build/versions: each file is
+kept once under objects/ by its SHA-256 digest, and docs/_build/versions/<version>/
+holds hard links to those objects. Pages and assets that are identical across
+versions therefore take the space of one copy. ``hed-serve-docs --versions``
+serves every version with a version switcher.
+
+Can be run as:
+- Command (after pip install -e .): hed-build-versions
+- Direct Python: python scripts/build_versions.py
+- Module: python -m scripts.build_versions
+
+Options:
+  --versions NAMES  Build only these comma-separated versions
+  --only NAMES      Build only these comma-separated submodules in every version
+  --core-only       Build the core documentation without any submodule
+  -j, --jobs N      Build N versions at a time (default: all cores, at most one per version)
+  --config FILE     Read the versions from FILE (default: pyproject.toml)
+"""
+
+import argparse
+import io
+import json
+import os
+import re
+import shutil
+import subprocess
+import sys
+import tarfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+try:
+    import tomllib
+except ModuleNotFoundError:  # Python < 3.11; tomli is installed with Sphinx
+    import tomli as tomllib
+
+if __package__:
+    from .common import (
+        BUILD_DIR,
+        DOCS_DIR,
+        REPO_ROOT,
+        add_selection_arguments,
+        default_jobs,
+        load_build_unified,
+        load_docs_module,
+        parse_jobs,
+        selection_overrides,
+    )
+    from .deploy_delta import build_manifest
+    from .fetch_docs import FetchError, docs_patterns, git, package_patterns
+else:
+    from common import (
+        BUILD_DIR,
+        DOCS_DIR,
+        REPO_ROOT,
+        add_selection_arguments,
+        default_jobs,
+        load_build_unified,
+        load_docs_module,
+        parse_jobs,
+        selection_overrides,
+    )
+    from deploy_delta import build_manifest
+    from fetch_docs import FetchError, docs_patterns, git, package_patterns
+
+CONFIG_FILE = REPO_ROOT / "pyproject.toml"
+STORE_DIR = BUILD_DIR / "versions"
+WORKSPACES_DIR = REPO_ROOT / ".cache" / "versions"
+TREES_DIR = WORKSPACES_DIR / "_trees"
+STORE_VERSION = 1
+
+VERSION_NAME = re.compile(r"[A-Za-z0-9][A-Za-z0-9._-]*")
+RESERVED_NAMES = {"objects", "manifests"}
+IGNORED_DOCS = ("_build", "__pycache__", "deprecated")
+# Caches keyed by content or commit, shared by the workspaces; the intersphinx cache holds an
+# inventory built from the hed-python checkout, so each workspace starts from a copy of it
+SHARED_CACHES = ("api", "images", "transforms")
+
+
+def load_versions(config_file, submodules):
+    """Return {version: {submodule: ref}} from [tool.hed-docs.versions], in the order given.
+
+    Raises:
+        ValueError: If a version name or submodule is invalid, or no version is defined.
+    """
+    with open(config_file, "rb") as f:
+        versions = tomllib.load(f).get("tool", {}).get("hed-docs", {}).get("versions", {})
+    if not versions:
+        raise ValueError("no versions defined in [tool.hed-docs.versions]")
+    for version, refs in versions.items():
+        if not VERSION_NAME.fullmatch(version) or version in RESERVED_NAMES:
+            raise ValueError(f"invalid version name {version!r}")
+        unknown = sorted(set(refs) - set(submodules))
+        if unknown:
+            raise ValueError(f"version {version}: unknown submodules {', '.join(unknown)}")
+    return versions
+
+
+def sync_tree(source, target, ignore):
+    """Make target a copy of source, copying only changed files (with their times) and removing extra ones.
+
+    Returns:
+        int: The number of files copied.
+    """
+    copied = 0
+    target.mkdir(parents=True, exist_ok=True)
+    wanted = set()
+    for entry in os.scandir(source):
+        if ignore(source, entry.name):
+            continue
+        wanted.add(entry.name)
+        destination = target / entry.name
+        if entry.is_dir():
+            if destination.is_file() or destination.is_symlink():
+                destination.unlink()
+            copied += sync_tree(Path(entry.path), destination, ignore)
+            continue
+        stat = entry.stat()
+        try:
+            current = destination.stat()
+            unchanged = (current.st_size, current.st_mtime_ns) == (stat.st_size, stat.st_mtime_ns)
+        except FileNotFoundError:
+            unchanged = False
+        if not unchanged:
+            if destination.is_dir():
+                shutil.rmtree(destination)
+            shutil.copy2(entry.path, destination)
+            copied += 1
+    for entry in os.scandir(target):
+        if entry.name not in wanted and not ignore(source, entry.name):
+            if entry.is_dir(follow_symlinks=False):
+                shutil.rmtree(entry.path)
+            else:
+                os.unlink(entry.path)
+    return copied
+
+
+def export_paths(tree, name, config):
+    """Return the paths of a commit's tree that the documentation build uses (see hed-fetch-docs)."""
+    prefixes = [pattern.lstrip("/") for pattern in docs_patterns(name, config) + package_patterns(tree)]
+    return [
+        path
+        for path in tree
+        if "/" not in path or any(path == prefix or path.startswith(prefix.rstrip("/") + "/") for prefix in prefixes)
+    ]
+
+
+def pinned_tree(name, ref, config):
+    """Return the directory holding the used files of a submodule at a ref, exporting them if needed.
+
+    The ref is fetched shallowly into the submodule checkout if it is not known there.
+
+    Raises:
+        FetchError: If the ref cannot be fetched or exported.
+    """
+    repo = REPO_ROOT / "submodules" / name
+    # Without a checkout of its own, git would run in this repository instead
+    if not (repo / ".git").exists():
+        raise FetchError(f"submodules/{name} is not checked out (run hed-fetch-docs)")
+    try:
+        commit = git("rev-parse", "--verify", "-q", f"{ref}^{{commit}}", cwd=repo).strip()
+    except FetchError:
+        git("fetch", "-q", "--no-tags", "--depth", "1", "--filter=blob:none", "origin", ref, cwd=repo)
+        commit = git("rev-parse", "FETCH_HEAD^{commit}", cwd=repo).strip()
+    target = TREES_DIR / name / commit
+    if target.is_dir():
+        return target
+
+    paths = export_paths(git("ls-tree", "-r", "--name-only", commit, cwd=repo).splitlines(), name, config)
+    result = subprocess.run(["git", "archive", "--format=tar", commit, "--", *paths], cwd=repo, capture_output=True)
+    if result.returncode != 0:
+        raise FetchError(f"git archive {commit}: {result.stderr.decode(errors='replace').strip()}")
+    partial = target.with_name(f"{commit}.partial")
+    shutil.rmtree(partial, ignore_errors=True)
+    with tarfile.open(fileobj=io.BytesIO(result.stdout)) as archive:
+        # Extraction filters exist from Python 3.10.12/3.11.4 on; git archives hold no links or devices
+        archive.extractall(partial, **({"filter": "data"} if hasattr(tarfile, "data_filter") else {}))
+    partial.rename(target)
+    return target
+
+
+def link_submodule(workspace, name, target):
+    """Point a workspace's submodules/<name> at a checkout or exported tree."""
+    link = workspace / "submodules" / name
+    if link.is_symlink() and Path(os.readlink(link)) == target:
+        return
+    if link.is_symlink() or link.is_file():
+        link.unlink()
+    elif link.exists():
+        shutil.rmtree(link)
+    link.symlink_to(target, target_is_directory=True)
+
+
+def prepare_workspace(version, refs, submodules, locks):
+    """Sync the workspace of a version: docs/, the shared caches and the submodules it builds from.
+
+    ``locks`` holds a lock per submodule, so versions pinning refs of the same
+    submodule fetch and export them one at a time.
+    """
+    workspace = WORKSPACES_DIR / version
+    dest_names = {Path(config["dest"]).name for config in submodules.values()}
+
+    def ignore(directory, name):
+        return name in IGNORED_DOCS or (Path(directory).name == "source" and name in dest_names)
+
+    sync_tree(DOCS_DIR, workspace / "docs", ignore)
+    cache_dir = workspace / ".cache"
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    for name in SHARED_CACHES:
+        (REPO_ROOT / ".cache" / name).mkdir(parents=True, exist_ok=True)
+        if not (cache_dir / name).is_symlink():
+            (cache_dir / name).symlink_to(REPO_ROOT / ".cache" / name, target_is_directory=True)
+    intersphinx = REPO_ROOT / ".cache" / "intersphinx"
+    if intersphinx.is_dir() and not (cache_dir / "intersphinx").exists():
+        shutil.copytree(intersphinx, cache_dir / "intersphinx")
+
+    (workspace / "submodules").mkdir(exist_ok=True)
+    for name, config in submodules.items():
+        if name in refs:
+            with locks[name]:
+                target = pinned_tree(name, refs[name], config)
+        else:
+            target = REPO_ROOT / "submodules" / name
+        link_submodule(workspace, name, target)
+    return workspace
+
+
+def build_version(workspace, only):
+    """Copy the submodule documentation into a workspace and build its HTML; output goes to its build.log.
+
+    Returns:
+        tuple: (exit status, seconds, log file).
+    """
+    build_dir = workspace / "docs" / "_build"
+    build_dir.mkdir(parents=True, exist_ok=True)
+    log_file = build_dir / "build.log"
+    copy_cmd = [sys.executable, str(workspace / "docs" / "build_unified.py")]
+    if only is not None:
+        copy_cmd += ["--only", ",".join(only)]
+    sphinx_cmd = [sys.executable, "-m", "sphinx", "-b", "html"]
+    for name, value in selection_overrides(only).items():
+        sphinx_cmd += ["-D", f"{name}={value}"]
+    sphinx_cmd += [str(workspace / "docs" / "source"), str(build_dir / "html")]
+
+    start = time.perf_counter()
+    with open(log_file, "w", encoding="utf-8") as log:
+        status = subprocess.run(copy_cmd, cwd=workspace, stdout=log, stderr=subprocess.STDOUT).returncode
+        if status == 0:
+            status = subprocess.run(sphinx_cmd, cwd=workspace, stdout=log, stderr=subprocess.STDOUT).returncode
+    return status, time.perf_counter() - start, log_file
+
+
+def object_path(store, digest):
+    return store / "objects" / digest[:2] / digest
+
+
+def add_objects(store, html_dir, files):
+    """Copy the files of a built site that are not stored yet into the object store; returns how many."""
+    added = 0
+    for rel_path, entry in files.items():
+        target = object_path(store, entry["sha256"])
+        if target.is_file():
+            continue
+        target.parent.mkdir(parents=True, exist_ok=True)
+        partial = target.with_name(f"{target.name}.partial")
+        shutil.copy2(html_dir / rel_path, partial)
+        partial.replace(target)
+        added += 1
+    return added
+
+
+def link_or_copy(source, target):
+    """Hard link an object into a version tree, or copy it where the file system cannot link."""
+    try:
+        os.link(source, target)
+    except OSError:
+        shutil.copy2(source, target)
+
+
+def publish_version(store, version, files):
+    """Replace the tree of a version by hard links to its objects, and save its manifest."""
+    partial = store / f".{version}.partial"
+    shutil.rmtree(partial, ignore_errors=True)
+    for rel_path, entry in files.items():
+        target = partial / rel_path
+        target.parent.mkdir(parents=True, exist_ok=True)
+        link_or_copy(object_path(store, entry["sha256"]), target)
+
+    tree = store / version
+    previous = store / f".{version}.previous"
+    shutil.rmtree(previous, ignore_errors=True)
+    if tree.exists():
+        tree.rename(previous)
+    partial.rename(tree)
+    shutil.rmtree(previous, ignore_errors=True)
+
+    manifests = store / "manifests"
+    manifests.mkdir(parents=True, exist_ok=True)
+    manifest = {"version": STORE_VERSION, "files": files}
+    (manifests / f"{version}.json").write_text(json.dumps(manifest, sort_keys=True), encoding="utf-8")
+
+
+def load_manifests(store):
+    """Return {version: files} for the versions in the store."""
+    manifests = {}
+    for path in sorted((store / "manifests").glob("*.json")):
+        try:
+            manifest = json.loads(path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            continue
+        if manifest.get("version") == STORE_VERSION:
+            manifests[path.stem] = manifest["files"]
+    return manifests
+
+
+def prune_store(store, versions):
+    """Remove the versions no longer defined and the objects no version uses; returns the manifests kept."""
+    manifests = load_manifests(store)
+    for version in set(manifests) - set(versions):
+        shutil.rmtree(store / version, ignore_errors=True)
+        (store / "manifests" / f"{version}.json").unlink()
+        del manifests[version]
+    used = {entry["sha256"] for files in manifests.values() for entry in files.values()}
+    for path in (store / "objects").glob("*/*"):
+        if path.name not in used:
+            path.unlink()
+    return manifests
+
+
+def save_index(store, versions, manifests):
+    """Write versions.json, listing the versions in the store in the configured order."""
+    available = [version for version in versions if version in manifests]
+    index = {"version": STORE_VERSION, "default": available[0] if available else None, "versions": available}
+    (store / "versions.json").write_text(json.dumps(index, indent=2), encoding="utf-8")
+
+
+def parse_versions(value):
+    return [name.strip() for name in value.split(",") if name.strip()]
+
+
+def parse_args(argv=None):
+    """Parse the command-line options of hed-build-versions."""
+    parser = argparse.ArgumentParser(description="Build several versions of the HED documentation side by side.")
+    parser.add_argument(
+        "--versions", type=parse_versions, metavar="NAMES", help="build only these comma-separated versions"
+    )
+    add_selection_arguments(parser)
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        type=parse_jobs,
+        default=default_jobs(),
+        metavar="N",
+        help="build N versions at a time (default: all available cores)",
+    )
+    parser.add_argument("--config", type=Path, default=CONFIG_FILE, help="versions file (default: pyproject.toml)")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    """Build the configured documentation versions and store them deduplicated."""
+    args = parse_args(argv)
+    build_unified = load_build_unified()
+    submodules = build_unified.select_submodules(build_unified.get_submodules(REPO_ROOT), args.only)
+    try:
+        versions = load_versions(args.config, build_unified.get_submodules(REPO_ROOT))
+    except (OSError, ValueError) as e:
+        print(f"[ERROR] Could not read the versions from {args.config}: {e}", file=sys.stderr)
+        return 1
+    selected = args.versions or list(versions)
+    unknown = sorted(set(selected) - set(versions))
+    if unknown:
+        print(f"[ERROR] Unknown versions: {', '.join(unknown)} (defined: {', '.join(versions)})", file=sys.stderr)
+        return 1
+
+    print("=" * 60)
+    print(f"Building {len(selected)} documentation versions: {', '.join(selected)}")
+    print("=" * 60)
+    start = time.perf_counter()
+    # Imported once here rather than concurrently by the threads exporting the pinned trees
+    load_docs_module("submodule_imports")
+    locks = {name: threading.Lock() for name in submodules}
+
+    def build(version):
+        try:
+            workspace = prepare_workspace(version, versions[version], submodules, locks)
+        except FetchError as e:
+            return version, None, str(e)
+        status, seconds, log_file = build_version(workspace, args.only)
+        if status:
+            return version, None, f"build failed with status {status} (see {log_file})"
+        return version, workspace, f"built in {seconds:.1f}s"
+
+    store = STORE_DIR
+    store.mkdir(parents=True, exist_ok=True)
+    failed = []
+    with ThreadPoolExecutor(max_workers=min(args.jobs, len(selected))) as executor:
+        for version, workspace, message in executor.map(build, selected):
+            if workspace is None:
+                print(f"  [ERROR] {version}: {message}", file=sys.stderr)
+                failed.append(version)
+                continue
+            html_dir = workspace / "docs" / "_build" / "html"
+            files = build_manifest(html_dir, args.jobs)
+            added = add_objects(store, html_dir, files)
+            publish_version(store, version, files)
+            print(f"  {version:<16} {message}; {len(files)} files, {added} new objects")
+
+    manifests = prune_store(store, versions)
+    save_index(store, versions, manifests)
+    sizes = {entry["sha256"]: entry["size"] for files in manifests.values() for entry in files.values()}
+    logical = sum(entry["size"] for files in manifests.values() for entry in files.values())
+    stored = sum(sizes.values())
+    print()
+    print(
+        f"{len(manifests)} versions: {logical / 1e6:.1f} MB of files stored as {len(sizes)} objects "
+        f"taking {stored / 1e6:.1f} MB ({time.perf_counter() - start:.1f}s)"
+    )
+    if failed:
+        print(f"[ERROR] Could not build {', '.join(failed)}", file=sys.stderr)
+        return 1
+    print(f"[OK] Versions available in {store}; serve them with hed-serve-docs --versions")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
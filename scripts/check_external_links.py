@@ -0,0 +1,290 @@
+#!/usr/bin/env python3
+"""Check the external links of the HED documentation with a persistent result cache.
+
+External URLs are collected from docs/source/*.md and from the built HTML in
+docs/_build/html, and checked concurrently with asyncio. The accepted status
+codes, timeout, retries, concurrency, user agent and the ``exclude`` and
+``exclude_path`` patterns are read from lychee.toml (and .lycheeignore, if
+present), so this checker and lychee agree on what counts as broken.
+
+Results are kept in .cache/links/results.json. A URL is only fetched again once
+its result is older than the time to live for its status, so runs over
+unchanged documentation finish almost immediately. Failures are always
+checked again.
+
+Can be run as:
+- Command (after pip install -e .): hed-check-external-links
+- Direct Python: python scripts/check_external_links.py
+- Module: python -m scripts.check_external_links
+
+Options:
+  --per-host N     At most N concurrent requests per host (default: 2)
+  --refresh        Ignore cached results and check every URL
+  --no-html        Do not collect URLs from the built HTML
+  --config FILE    Read the lychee settings from FILE (default: lychee.toml)
+  --cache FILE     Keep results in FILE (default: .cache/links/results.json)
+  URL ...          Check only these URLs
+"""
+
+import argparse
+import asyncio
+import json
+import re
+import ssl
+import sys
+import time
+import urllib.parse
+from pathlib import Path
+
+try:
+    import tomllib
+except ModuleNotFoundError:  # Python < 3.11; tomli is installed with Sphinx
+    import tomli as tomllib
+
+if __package__:
+    from .check_links import scan_site
+    from .common import HTML_DIR, REPO_ROOT, SOURCE_DIR, default_jobs
+else:
+    from check_links import scan_site
+    from common import HTML_DIR, REPO_ROOT, SOURCE_DIR, default_jobs
+
+CONFIG_FILE = REPO_ROOT / "lychee.toml"
+IGNORE_FILE = REPO_ROOT / ".lycheeignore"
+CACHE_FILE = REPO_ROOT / ".cache" / "links" / "results.json"
+CACHE_VERSION = 1
+
+# lychee's defaults for settings missing from lychee.toml
+DEFAULT_CONFIG = {
+    "accept": [200],
+    "timeout": 20,
+    "max_retries": 3,
+    "max_concurrency": 128,
+    "max_redirects": 10,
+    "user_agent": "hed-check-external-links",
+    "exclude": [],
+    "exclude_path": [],
+}
+PER_HOST = 2
+RETRY_DELAY = 1.0
+
+# Days a cached result stays valid; accepted statuses that say little about the link expire sooner
+DEFAULT_TTL_DAYS = 7
+STATUS_TTL_DAYS = {403: 1, 429: 0.25, 503: 0.25}
+
+URL_PATTERN = re.compile(r"https?://[^\s<>()\[\]\"'`]+")
+TRAILING_PUNCTUATION = ".,;:!?*_"
+REDIRECT_STATUSES = {301, 302, 303, 307, 308}
+# Characters left alone when percent-encoding a request target
+URL_SAFE = "/%?=&;:@!$'()*+,~"
+
+
+def load_config(config_file=CONFIG_FILE, ignore_file=IGNORE_FILE):
+    """Return the lychee settings, with the patterns of .lycheeignore added to ``exclude``."""
+    config = dict(DEFAULT_CONFIG)
+    if config_file.is_file():
+        with open(config_file, "rb") as f:
+            config.update(tomllib.load(f))
+    if ignore_file.is_file():
+        lines = ignore_file.read_text(encoding="utf-8").splitlines()
+        config["exclude"] = [*config["exclude"], *(line for line in lines if line and not line.startswith("#"))]
+    return config
+
+
+def markdown_urls(source_dir=SOURCE_DIR):
+    """Return {url: set of locations} for the URLs in the top-level markdown files of docs/source."""
+    urls = {}
+    for path in sorted(source_dir.glob("*.md")):
+        for number, line in enumerate(path.read_text(encoding="utf-8").splitlines(), 1):
+            for match in URL_PATTERN.finditer(line):
+                url = match.group().rstrip(TRAILING_PUNCTUATION)
+                urls.setdefault(url, set()).add(f"{path.relative_to(REPO_ROOT).as_posix()}:{number}")
+    return urls
+
+
+def html_urls(html_dir, exclude_path, jobs):
+    """Return {url: set of locations} for the external links of the built pages not matching exclude_path."""
+    excluded = [re.compile(pattern) for pattern in exclude_path]
+    records, _ = scan_site(html_dir, {}, jobs)
+    urls = {}
+    for page, record in records.items():
+        if any(pattern.search(page) for pattern in excluded):
+            continue
+        for line, url in record["links"]:
+            if url.startswith(("http://", "https://")):
+                urls.setdefault(url.split("#", 1)[0], set()).add(f"{page}:{line}")
+    return urls
+
+
+def load_cache(cache_file):
+    try:
+        cache = json.loads(cache_file.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return {}
+    return cache["results"] if cache.get("version") == CACHE_VERSION else {}
+
+
+def save_cache(cache_file, results):
+    cache_file.parent.mkdir(parents=True, exist_ok=True)
+    tmp_file = cache_file.with_suffix(".tmp")
+    tmp_file.write_text(json.dumps({"version": CACHE_VERSION, "results": results}, indent=1, sort_keys=True))
+    tmp_file.replace(cache_file)
+
+
+def is_fresh(result, accept, now=None):
+    """Return True if a cached result is still valid."""
+    if result.get("status") not in accept:
+        return False
+    ttl_days = STATUS_TTL_DAYS.get(result["status"], DEFAULT_TTL_DAYS)
+    return (now or time.time()) - result["checked"] < ttl_days * 86400
+
+
+async def request_status(url, timeout, user_agent):
+    """Send a GET request and return (status, Location header) without reading the body."""
+    parts = urllib.parse.urlsplit(url)
+    secure = parts.scheme == "https"
+    port = parts.port or (443 if secure else 80)
+    reader, writer = await asyncio.wait_for(
+        asyncio.open_connection(parts.hostname, port, ssl=ssl.create_default_context() if secure else None),
+        timeout,
+    )
+    try:
+        target = urllib.parse.quote(
+            urllib.parse.urlunsplit(("", "", parts.path or "/", parts.query, "")), safe=URL_SAFE
+        )
+        writer.write(
+            f"GET {target} HTTP/1.1\r\nHost: {parts.netloc}\r\nUser-Agent: {user_agent}\r\n"
+            f"Accept: */*\r\nConnection: close\r\n\r\n".encode("latin-1")
+        )
+        await writer.drain()
+        status_line = await asyncio.wait_for(reader.readline(), timeout)
+        try:
+            status = int(status_line.split()[1])
+        except (IndexError, ValueError):
+            raise ConnectionError(f"invalid response {status_line[:40]!r}") from None
+        location = None
+        while True:
+            line = await asyncio.wait_for(reader.readline(), timeout)
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            if name.strip().lower() == "location":
+                location = value.strip()
+        return status, location
+    finally:
+        writer.close()
+
+
+class LinkChecker:
+    """Checks URLs concurrently with a global and a per-host limit."""
+
+    def __init__(self, config, per_host=PER_HOST):
+        self.config = config
+        self.accept = set(config["accept"])
+        self.per_host = per_host
+        self.limit = asyncio.Semaphore(config["max_concurrency"])
+        self.hosts = {}
+
+    def host_limit(self, url):
+        host = urllib.parse.urlsplit(url).hostname or ""
+        if host not in self.hosts:
+            self.hosts[host] = asyncio.Semaphore(self.per_host)
+        return self.hosts[host]
+
+    async def fetch(self, url):
+        """Follow redirects and return the final status."""
+        for _ in range(self.config["max_redirects"] + 1):
+            async with self.host_limit(url), self.limit:
+                status, location = await request_status(url, self.config["timeout"], self.config["user_agent"])
+            if status not in REDIRECT_STATUSES or not location:
+                return status
+            url = urllib.parse.urljoin(url, location)
+        raise ConnectionError("too many redirects")
+
+    async def check(self, url):
+        """Return the result of checking a URL, retrying network errors and unaccepted server errors."""
+        error = None
+        for attempt in range(self.config["max_retries"] + 1):
+            if attempt:
+                await asyncio.sleep(RETRY_DELAY * 2 ** (attempt - 1))
+            try:
+                status = await self.fetch(url)
+            except (OSError, asyncio.TimeoutError, ConnectionError, ValueError) as e:
+                error = str(e) or type(e).__name__
+                continue
+            if status in self.accept or status < 500:
+                return {"status": status, "checked": time.time()}
+            error = f"HTTP {status}"
+        return {"status": None, "error": error, "checked": time.time()}
+
+    async def check_all(self, urls):
+        results = await asyncio.gather(*(self.check(url) for url in urls))
+        return dict(zip(urls, results, strict=True))
+
+
+def parse_args(argv=None):
+    """Parse the command-line options of hed-check-external-links."""
+    parser = argparse.ArgumentParser(description="Check the external links of the HED documentation.")
+    parser.add_argument("urls", nargs="*", metavar="URL", help="check only these URLs")
+    parser.add_argument(
+        "--per-host",
+        type=int,
+        default=PER_HOST,
+        metavar="N",
+        help=f"at most N concurrent requests per host (default: {PER_HOST})",
+    )
+    parser.add_argument("--refresh", action="store_true", help="ignore cached results and check every URL")
+    parser.add_argument("--no-html", action="store_true", help="do not collect URLs from the built HTML")
+    parser.add_argument("--config", type=Path, default=CONFIG_FILE, help="lychee configuration (default: lychee.toml)")
+    parser.add_argument(
+        "--cache",
+        type=Path,
+        default=CACHE_FILE,
+        help="result cache (default: .cache/links/results.json)",
+    )
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    """Check the external links of the documentation."""
+    args = parse_args(argv)
+    config = load_config(args.config)
+
+    if args.urls:
+        urls = {url: {"command line"} for url in args.urls}
+    else:
+        urls = markdown_urls()
+        if not args.no_html and HTML_DIR.is_dir():
+            for url, locations in html_urls(HTML_DIR, config["exclude_path"], default_jobs()).items():
+                urls.setdefault(url, set()).update(locations)
+    excluded = [re.compile(pattern) for pattern in config["exclude"]]
+    urls = {url: locations for url, locations in urls.items() if not any(p.search(url) for p in excluded)}
+
+    start = time.perf_counter()
+    cache = {} if args.refresh else load_cache(args.cache)
+    accept = set(config["accept"])
+    stale = sorted(url for url in urls if url not in cache or not is_fresh(cache[url], accept))
+    print(f"Checking {len(stale)} of {len(urls)} external URLs ({len(urls) - len(stale)} cached)...")
+
+    checker = LinkChecker(config, args.per_host)
+    cache.update(asyncio.run(checker.check_all(stale)))
+    save_cache(args.cache, cache)
+
+    failures = sorted(url for url in urls if cache[url]["status"] not in accept)
+    for url in failures:
+        result = cache[url]
+        reason = result.get("error") or f"HTTP {result['status']}"
+        print(f"{url} - {reason}")
+        for location in sorted(urls[url]):
+            print(f"    {location}")
+    if failures:
+        print()
+    print(f"Checked {len(stale)} URLs in {time.perf_counter() - start:.1f}s")
+    if failures:
+        print(f"[ERROR] {len(failures)} broken external links", file=sys.stderr)
+        return 1
+    print("[OK] No broken external links")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,258 @@
+#!/usr/bin/env python3
+"""Check the internal links and anchors of the built HED documentation offline.
+
+Every HTML page under docs/_build/html is parsed in parallel worker processes
+into its element ids and links. Each internal link (href/src) is then checked
+against that index: the target page or file must exist, and a #fragment must
+name an id on the target page. This covers links between the integrated
+submodules, which live side by side in the same site. External URLs are left
+to lychee (see lychee.toml).
+
+Can be run as:
+- Command (after pip install -e .): hed-check-links
+- Direct Python: python scripts/check_links.py
+- Module: python -m scripts.check_links
+
+Options:
+  -j, --jobs N     Parse pages with N worker processes (default: all cores)
+  --incremental    Parse only pages whose content changed since the last run
+                   and re-check only their links and the links into them
+                   (state kept in docs/_build/.link-check.json)
+  --html-dir DIR   Check this directory instead of docs/_build/html
+"""
+
+import argparse
+import hashlib
+import html.parser
+import json
+import posixpath
+import sys
+import time
+import urllib.parse
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+if __package__:
+    from .common import BUILD_DIR, HTML_DIR, default_jobs, parse_jobs
+else:
+    from common import BUILD_DIR, HTML_DIR, default_jobs, parse_jobs
+
+STATE_FILE = BUILD_DIR / ".link-check.json"
+STATE_VERSION = 1
+
+# Attributes holding the links of each element
+LINK_ATTRIBUTES = {
+    "a": "href",
+    "area": "href",
+    "link": "href",
+    "img": "src",
+    "script": "src",
+    "iframe": "src",
+    "source": "src",
+}
+
+
+class PageParser(html.parser.HTMLParser):
+    """Collects the ids and links of an HTML page."""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.ids = set()
+        self.links = []
+
+    def handle_starttag(self, tag, attrs):
+        attrs = dict(attrs)
+        if attrs.get("id"):
+            self.ids.add(attrs["id"])
+        if tag == "a" and attrs.get("name"):
+            self.ids.add(attrs["name"])
+        attribute = LINK_ATTRIBUTES.get(tag)
+        if attribute and attrs.get(attribute):
+            self.links.append((self.getpos()[0], attrs[attribute]))
+
+    handle_startendtag = handle_starttag
+
+
+def scan_page(path, previous_hash=None):
+    """Parse one page into its hash, ids and links; runs in a worker process.
+
+    Returns:
+        dict or None: The page record, or None if the page still has previous_hash.
+    """
+    data = path.read_bytes()
+    digest = hashlib.sha256(data).hexdigest()
+    if digest == previous_hash:
+        return None
+    parser = PageParser()
+    parser.feed(data.decode("utf-8", errors="replace"))
+    parser.close()
+    return {"hash": digest, "ids": sorted(parser.ids), "links": parser.links}
+
+
+def resolve(page, url):
+    """Return the site-relative target and fragment of a link on a page, or None for external links."""
+    parts = urllib.parse.urlsplit(url)
+    if parts.scheme or parts.netloc:
+        return None
+    path = urllib.parse.unquote(parts.path)
+    target = posixpath.normpath(posixpath.join(posixpath.dirname(page), path)) if path else page
+    return target, urllib.parse.unquote(parts.fragment)
+
+
+def check_link(page, url, records, files):
+    """Return what is wrong with an internal link, or None if it is valid or external."""
+    resolved = resolve(page, url)
+    if resolved is None:
+        return None
+    target, fragment = resolved
+    if target == ".." or target.startswith("../"):
+        return "points outside the site"
+    if target not in records and target not in files:
+        index = "index.html" if target == "." else f"{target}/index.html"
+        if index not in records:
+            return f"{target} does not exist"
+        target = index
+    if fragment and target in records and fragment not in records[target]["ids"]:
+        return f"no anchor #{fragment} in {target}"
+    return None
+
+
+def load_state(html_dir):
+    try:
+        state = json.loads(STATE_FILE.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return {}
+    if state.get("version") != STATE_VERSION or state.get("html_dir") != str(html_dir):
+        return {}
+    return state["pages"]
+
+
+def save_state(html_dir, records):
+    STATE_FILE.parent.mkdir(parents=True, exist_ok=True)
+    state = {"version": STATE_VERSION, "html_dir": str(html_dir), "pages": records}
+    STATE_FILE.write_text(json.dumps(state, separators=(",", ":")), encoding="utf-8")
+
+
+def scan_site(html_dir, previous, jobs):
+    """Parse the pages of the site whose hash differs from the previous run.
+
+    Returns:
+        tuple: ({page: record} for every page, set of the pages that were parsed).
+    """
+    pages = sorted(path.relative_to(html_dir).as_posix() for path in html_dir.rglob("*.html"))
+    hashes = [previous.get(page, {}).get("hash") for page in pages]
+    paths = [html_dir / page for page in pages]
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        results = list(executor.map(scan_page, paths, hashes, chunksize=max(1, len(pages) // (jobs * 8))))
+
+    records, changed = {}, set()
+    for page, record in zip(pages, results, strict=True):
+        if record is None:
+            records[page] = previous[page]
+        else:
+            records[page] = record
+            changed.add(page)
+    return records, changed
+
+
+def link_target(page, url):
+    """Return the page or file an internal link points to (without its fragment), or None for external links."""
+    resolved = resolve(page, url)
+    return None if resolved is None else resolved[0]
+
+
+def touched_targets(changed, removed):
+    """Return the link targets affected by changed or removed pages, including directories of index pages."""
+    touched = changed | removed
+    return touched | {posixpath.dirname(page) or "." for page in touched if posixpath.basename(page) == "index.html"}
+
+
+def links_to_check(records, changed, touched):
+    """Return {page: links} to check: every link of changed pages, and the links of other pages into touched targets."""
+    selected = {}
+    for page, record in records.items():
+        if page in changed:
+            selected[page] = record["links"]
+            continue
+        links = [link for link in record["links"] if link_target(page, link[1]) in touched]
+        if links:
+            selected[page] = links
+    return selected
+
+
+def parse_args(argv=None):
+    """Parse the command-line options of hed-check-links."""
+    parser = argparse.ArgumentParser(description="Check internal links and anchors of the built HED documentation.")
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        type=parse_jobs,
+        default=default_jobs(),
+        metavar="N",
+        help="parse pages with N worker processes (default: all available cores)",
+    )
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help="parse only changed pages and re-check only the links from and into them",
+    )
+    parser.add_argument(
+        "--html-dir", type=Path, default=HTML_DIR, help="built site to check (default: docs/_build/html)"
+    )
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    """Check the internal links of the built documentation."""
+    args = parse_args(argv)
+    html_dir = args.html_dir.resolve()
+    if not html_dir.is_dir():
+        print(f"[ERROR] Documentation not built yet: {html_dir} does not exist", file=sys.stderr)
+        return 1
+
+    start = time.perf_counter()
+    previous = load_state(html_dir) if args.incremental else {}
+    records, changed = scan_site(html_dir, previous, args.jobs)
+    files = {path.relative_to(html_dir).as_posix() for path in html_dir.rglob("*") if path.is_file()}
+
+    touched = touched_targets(changed, set(previous) - set(records))
+    if previous:
+        check = links_to_check(records, changed, touched)
+    else:
+        check = {page: record["links"] for page, record in records.items()}
+
+    links = 0
+    for page, page_links in check.items():
+        record = records[page]
+        # Keep the earlier results of unchanged pages for links that were not re-checked
+        record["problems"] = [
+            problem
+            for problem in ([] if page in changed else record.get("problems", []))
+            if link_target(page, problem[1]) not in touched
+        ]
+        for line, url in page_links:
+            links += 1
+            problem = check_link(page, url, records, files)
+            if problem:
+                record["problems"].append((line, url, problem))
+    save_state(html_dir, records)
+
+    problems = [(page, *problem) for page, record in sorted(records.items()) for problem in record["problems"]]
+    for page, line, url, problem in problems:
+        print(f"{page}:{line}: {url} - {problem}")
+    if problems:
+        print()
+    anchors = sum(len(record["ids"]) for record in records.values())
+    print(
+        f"Checked {links} links on {len(check)} pages ({len(changed)} parsed) against {len(records)} pages "
+        f"and {anchors} anchors in {time.perf_counter() - start:.1f}s"
+    )
+    if problems:
+        print(f"[ERROR] {len(problems)} broken internal links", file=sys.stderr)
+        return 1
+    print("[OK] No broken internal links")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
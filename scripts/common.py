@@ -0,0 +1,105 @@
+"""Paths and helpers shared by the HED documentation scripts."""
+
+import argparse
+import importlib.util
+import json
+import os
+import sys
+from pathlib import Path
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+DOCS_DIR = REPO_ROOT / "docs"
+SOURCE_DIR = DOCS_DIR / "source"
+BUILD_DIR = DOCS_DIR / "_build"
+HTML_DIR = BUILD_DIR / "html"
+# Kept with the pickled environment: the conf.py overrides it was built with
+OVERRIDES_FILE = "hed-overrides.json"
+
+
+def load_docs_module(name):
+    """Import a helper module from the docs directory (e.g. docs/build_unified.py) under its own name.
+
+    The module is registered in ``sys.modules`` under the same name conf.py uses,
+    so an in-process Sphinx build shares it and its state.
+    """
+    if name in sys.modules:
+        return sys.modules[name]
+    spec = importlib.util.spec_from_file_location(name, DOCS_DIR / f"{name}.py")
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+def load_build_unified():
+    """Import docs/build_unified.py as the ``build_unified`` module."""
+    return load_docs_module("build_unified")
+
+
+def default_jobs():
+    """Return the number of cores available to this process."""
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+def parse_jobs(value):
+    """Parse a --jobs value: a positive integer or 'auto'."""
+    if value == "auto":
+        return default_jobs()
+    try:
+        jobs = int(value)
+    except ValueError:
+        jobs = 0
+    if jobs < 1:
+        raise argparse.ArgumentTypeError(f"expected a positive integer or 'auto', got {value!r}")
+    return jobs
+
+
+def parse_submodule_names(value):
+    """Parse an --only value: comma-separated names from the build_unified.py manifest."""
+    build_unified = load_build_unified()
+    names = build_unified.parse_only(value)
+    try:
+        build_unified.select_submodules(build_unified.get_submodules(REPO_ROOT), names)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e)) from None
+    return names
+
+
+def add_selection_arguments(parser):
+    """Add the --only and --core-only options, which both set ``args.only`` (None builds every submodule)."""
+    selection = parser.add_mutually_exclusive_group()
+    selection.add_argument(
+        "--only",
+        type=parse_submodule_names,
+        metavar="NAMES",
+        help="build only these comma-separated submodules (e.g. hed-python,hed-specification)",
+    )
+    selection.add_argument(
+        "--core-only",
+        dest="only",
+        action="store_const",
+        const=[],
+        help="build the core documentation without any submodule",
+    )
+
+
+def selection_overrides(only):
+    """Return the conf.py overrides selecting the submodules to build."""
+    return {} if only is None else {"hed_only": ",".join(only)}
+
+
+def save_overrides(doctree_dir, overrides):
+    """Record the conf.py overrides the environment in doctree_dir was built with."""
+    doctree_dir.mkdir(parents=True, exist_ok=True)
+    (doctree_dir / OVERRIDES_FILE).write_text(json.dumps(overrides, sort_keys=True), encoding="utf-8")
+
+
+def load_overrides(doctree_dir):
+    """Return the conf.py overrides recorded for the environment in doctree_dir, or none if unknown."""
+    try:
+        return json.loads((doctree_dir / OVERRIDES_FILE).read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return {}
@@ -0,0 +1,206 @@
+#!/usr/bin/env python3
+"""Write the content manifest of the built HED documentation and the delta to deploy.
+
+Every file of docs/_build/html (except hidden ones such as .doctrees and
+.buildinfo, which are not deployed) is hashed in parallel threads, and the
+SHA-256 digest and size of each are written to deploy-manifest.json at the
+root of the site, so the manifest is deployed with it.
+
+Given the manifest of the previous deploy (a file, or its URL on the
+published site), the files whose content was added or changed are copied to
+a delta directory together with the new manifest, and the removed files are
+listed in removed.txt there. Pages that Sphinx
+rewrote with identical bytes are not part of the delta. A report of the
+changed, added and removed files and the bytes saved against uploading the
+whole site is printed and written as JSON.
+
+Can be run as:
+- Command (after pip install -e .): hed-deploy-delta
+- Direct Python: python scripts/deploy_delta.py
+- Module: python -m scripts.deploy_delta
+
+Options:
+  --previous FILE|URL  Manifest of the previous deploy (default: none, so everything is new)
+  --html-dir DIR       Use this built site instead of docs/_build/html
+  --delta-dir DIR      Write the delta here (default: docs/_build/delta)
+  --report FILE        Write the JSON report here (default: docs/_build/deploy-delta.json)
+  -j, --jobs N         Hash with N threads (default: all cores)
+"""
+
+import argparse
+import json
+import shutil
+import sys
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+if __package__:
+    from .common import BUILD_DIR, HTML_DIR, default_jobs, load_build_unified, parse_jobs
+else:
+    from common import BUILD_DIR, HTML_DIR, default_jobs, load_build_unified, parse_jobs
+
+MANIFEST_NAME = "deploy-manifest.json"
+MANIFEST_VERSION = 1
+# The manifest, and the compressed siblings hed_assets wrote for an earlier one
+MANIFEST_FILES = (MANIFEST_NAME, f"{MANIFEST_NAME}.gz", f"{MANIFEST_NAME}.br")
+REMOVED_NAME = "removed.txt"
+DELTA_DIR = BUILD_DIR / "delta"
+REPORT_FILE = BUILD_DIR / "deploy-delta.json"
+FETCH_TIMEOUT = 30
+
+
+def site_files(html_dir):
+    """Return the site-relative paths of the deployed files, skipping hidden files and directories."""
+    files = []
+    for path in html_dir.rglob("*"):
+        rel_path = path.relative_to(html_dir).as_posix()
+        if (
+            path.is_file()
+            and rel_path not in MANIFEST_FILES
+            and not any(part.startswith(".") for part in rel_path.split("/"))
+        ):
+            files.append(rel_path)
+    return sorted(files)
+
+
+def build_manifest(html_dir, jobs):
+    """Return {site-relative path: {"sha256", "size"}} for every deployed file of a site."""
+    hash_file = load_build_unified().hash_file
+    paths = site_files(html_dir)
+
+    def describe(rel_path):
+        path = html_dir / rel_path
+        return rel_path, {"sha256": hash_file(path), "size": path.stat().st_size}
+
+    # hashlib releases the GIL while hashing
+    with ThreadPoolExecutor(max_workers=jobs) as executor:
+        return dict(executor.map(describe, paths))
+
+
+def load_manifest(source):
+    """Load the files of a deploy manifest from a path or an http(s) URL.
+
+    Raises:
+        ValueError: If the manifest cannot be read or is not a deploy manifest.
+    """
+    try:
+        if source.startswith(("http://", "https://")):
+            with urllib.request.urlopen(source, timeout=FETCH_TIMEOUT) as response:
+                data = response.read()
+        else:
+            data = Path(source).read_bytes()
+        manifest = json.loads(data)
+    except (OSError, urllib.error.URLError, ValueError) as e:
+        raise ValueError(f"could not read {source}: {e}") from None
+    if not isinstance(manifest, dict) or manifest.get("version") != MANIFEST_VERSION:
+        raise ValueError(f"{source} is not a version {MANIFEST_VERSION} deploy manifest")
+    return manifest["files"]
+
+
+def save_manifest(html_dir, files):
+    manifest = {"version": MANIFEST_VERSION, "files": files}
+    for name in MANIFEST_FILES[1:]:
+        (html_dir / name).unlink(missing_ok=True)
+    path = html_dir / MANIFEST_NAME
+    path.write_text(json.dumps(manifest, indent=1, sort_keys=True), encoding="utf-8")
+    return path
+
+
+def diff_manifests(previous, current):
+    """Return the sorted (added, changed, removed) paths between two manifests."""
+    added = sorted(set(current) - set(previous))
+    removed = sorted(set(previous) - set(current))
+    changed = sorted(path for path in set(current) & set(previous) if current[path] != previous[path])
+    return added, changed, removed
+
+
+def write_delta(html_dir, delta_dir, paths, removed, manifest_file):
+    """Write the delta directory: the given files, the new manifest and the list of removed files."""
+    shutil.rmtree(delta_dir, ignore_errors=True)
+    delta_dir.mkdir(parents=True)
+    # Copied rather than hard linked: the next build rewrites pages in place
+    for rel_path in paths:
+        target = delta_dir / rel_path
+        target.parent.mkdir(parents=True, exist_ok=True)
+        shutil.copy2(html_dir / rel_path, target)
+    shutil.copy2(manifest_file, delta_dir / MANIFEST_NAME)
+    (delta_dir / REMOVED_NAME).write_text("".join(f"{rel_path}\n" for rel_path in removed), encoding="utf-8")
+
+
+def parse_args(argv=None):
+    """Parse the command-line options of hed-deploy-delta."""
+    parser = argparse.ArgumentParser(description="Write the deploy manifest and delta of the built HED documentation.")
+    parser.add_argument(
+        "--previous",
+        metavar="FILE|URL",
+        help="manifest of the previous deploy (default: none, so every file is in the delta)",
+    )
+    parser.add_argument("--html-dir", type=Path, default=HTML_DIR, help="built site (default: docs/_build/html)")
+    parser.add_argument(
+        "--delta-dir", type=Path, default=DELTA_DIR, help="directory for the delta (default: docs/_build/delta)"
+    )
+    parser.add_argument(
+        "--report", type=Path, default=REPORT_FILE, help="JSON report (default: docs/_build/deploy-delta.json)"
+    )
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        type=parse_jobs,
+        default=default_jobs(),
+        metavar="N",
+        help="hash with N threads (default: all available cores)",
+    )
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    """Write the deploy manifest of the built documentation and the delta against the previous deploy."""
+    args = parse_args(argv)
+    html_dir = args.html_dir.resolve()
+    if not html_dir.is_dir():
+        print(f"[ERROR] Documentation not built yet: {html_dir} does not exist", file=sys.stderr)
+        return 1
+    try:
+        previous = load_manifest(args.previous) if args.previous else {}
+    except ValueError as e:
+        print(f"[ERROR] Previous manifest: {e}", file=sys.stderr)
+        return 1
+
+    start = time.perf_counter()
+    files = build_manifest(html_dir, args.jobs)
+    manifest_file = save_manifest(html_dir, files)
+    added, changed, removed = diff_manifests(previous, files)
+    write_delta(html_dir, args.delta_dir, added + changed, removed, manifest_file)
+
+    total_bytes = sum(entry["size"] for entry in files.values()) + manifest_file.stat().st_size
+    delta_bytes = sum(files[rel_path]["size"] for rel_path in added + changed) + manifest_file.stat().st_size
+    report = {
+        "previous": args.previous,
+        "files": len(files),
+        "added": added,
+        "changed": changed,
+        "removed": removed,
+        "total_bytes": total_bytes,
+        "delta_bytes": delta_bytes,
+        "saved_bytes": total_bytes - delta_bytes,
+    }
+    args.report.parent.mkdir(parents=True, exist_ok=True)
+    args.report.write_text(json.dumps(report, indent=2), encoding="utf-8")
+
+    saved = 100 * report["saved_bytes"] / total_bytes
+    print(f"Hashed {len(files)} files in {time.perf_counter() - start:.1f}s; manifest written to {manifest_file}")
+    unchanged = len(files) - len(added) - len(changed)
+    print(f"  {len(added)} added, {len(changed)} changed, {len(removed)} removed, {unchanged} unchanged")
+    print(
+        f"  delta {delta_bytes / 1e6:.2f} MB of {total_bytes / 1e6:.2f} MB "
+        f"({report['saved_bytes'] / 1e6:.2f} MB, {saved:.0f}% saved) written to {args.delta_dir}"
+    )
+    print(f"[OK] Report written to {args.report}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
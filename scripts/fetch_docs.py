@@ -0,0 +1,272 @@
+#!/usr/bin/env python3
+"""Fetch only the parts of the HED submodules the documentation build uses.
+
+Instead of cloning every submodule with its full history and tree
+(``git submodule update --init --recursive``), each submodule is fetched as a
+shallow, partial clone (``--depth 1 --filter=blob:none``) with a sparse
+checkout of:
+
+- its root-level files (pyproject.toml, setup.py, README.md, ...);
+- the ``files`` its build_unified.py manifest entry lists, and the ``_static``
+  directory of its documentation;
+- its top-level Python packages (as found by docs/submodule_imports.py,
+  including those under ``src/``), which autodoc imports and which
+  ``pip install submodules/<name>`` needs. Skipped with --docs-only.
+
+All submodules are fetched concurrently. By default each is checked out at the
+commit recorded in this repository; with --remote, at the tip of the branch
+named in .gitmodules (or of the remote's default branch), as
+``git submodule update --remote`` does. The commit of each submodule is written
+to .cache/submodules/commits.json, which CI can use as a cache key.
+
+Submodules that are already full (non-sparse) checkouts are left as they are.
+
+Can be run as:
+- Command (after pip install -e .): hed-fetch-docs
+- Direct Python: python scripts/fetch_docs.py
+- Module: python -m scripts.fetch_docs
+
+Options:
+  --remote          Check out the tip of each submodule's branch
+  --only NAMES      Fetch only these comma-separated submodules
+  --core-only       Fetch no submodules (only writes an empty commits file)
+  --docs-only       Leave out the Python packages of the submodules
+  --mirror BASE     Fetch from BASE/<repository>.git instead of the .gitmodules URLs
+                    (e.g. a directory of local bare repositories)
+  -j, --jobs N      Fetch N submodules at a time (default: all at once)
+  --output FILE     Write the commits here (default: .cache/submodules/commits.json)
+"""
+
+import argparse
+import json
+import posixpath
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+if __package__:
+    from .common import REPO_ROOT, add_selection_arguments, load_build_unified, load_docs_module, parse_jobs
+else:
+    from common import REPO_ROOT, add_selection_arguments, load_build_unified, load_docs_module, parse_jobs
+
+OUTPUT_FILE = REPO_ROOT / ".cache" / "submodules" / "commits.json"
+COMMITS_VERSION = 2
+# Fields of a submodule record written to the commits file. File counts and timings are only
+# printed, so the file (and the CI cache key hashed from it) changes only with what is checked out.
+COMMITS_FIELDS = ("url", "ref", "commit", "patterns", "skipped")
+SUBMODULES_DIR = "submodules"
+
+
+class FetchError(Exception):
+    """Raised when a git command fails while fetching a submodule."""
+
+
+def git(*args, cwd=REPO_ROOT, stdin=None):
+    """Run a git command and return its standard output.
+
+    Raises:
+        FetchError: If the command fails.
+    """
+    result = subprocess.run(["git", *args], cwd=cwd, input=stdin, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise FetchError(f"git {' '.join(args)}: {result.stderr.strip() or f'exit status {result.returncode}'}")
+    return result.stdout
+
+
+def submodule_settings(path):
+    """Return the url and branch .gitmodules gives the submodule at a repository-relative path."""
+    settings = {}
+    for key in ("url", "branch"):
+        try:
+            settings[key] = git("config", "-f", ".gitmodules", f"submodule.{path}.{key}").strip()
+        except FetchError:
+            settings[key] = None
+    if settings["url"] is None:
+        raise FetchError(f"{path} is not a submodule in .gitmodules")
+    return settings
+
+
+def recorded_commit(path):
+    """Return the commit this repository records for the submodule at a repository-relative path, or None."""
+    for line in git("ls-files", "--stage", "--", path).splitlines():
+        mode, commit, _ = line.split(maxsplit=2)
+        if mode == "160000":
+            return commit
+    return None
+
+
+def mirror_url(url, mirror):
+    """Return the URL of a repository in a mirror: BASE/<repository>.git."""
+    name = posixpath.basename(url.rstrip("/")).removesuffix(".git")
+    return f"{mirror.rstrip('/')}/{name}.git"
+
+
+def docs_patterns(name, config):
+    """Return the sparse-checkout patterns of the documentation files a manifest entry uses."""
+    root = REPO_ROOT / SUBMODULES_DIR / name
+    prefix = Path(config["source"]).relative_to(root).as_posix()
+    prefix = "" if prefix == "." else f"{prefix}/"
+    patterns = [f"/{prefix}{item}" for item in config["files"]]
+    patterns.append(f"/{prefix}_static/")
+    return patterns
+
+
+def package_patterns(tree):
+    """Return the sparse-checkout patterns of the top-level packages and modules in a list of the paths of a commit.
+
+    Modules at the top of the checkout are already matched by its ``/*`` pattern.
+    """
+    excluded = load_docs_module("submodule_imports").EXCLUDED_PACKAGES
+    patterns = []
+    for path in tree:
+        parts = path.split("/")
+        if parts[-1] == "__init__.py" and parts[0] == "src" and len(parts) == 3:
+            name, pattern = parts[1], f"/{'/'.join(parts[:-1])}/"
+        elif parts[-1] == "__init__.py" and len(parts) == 2:
+            name, pattern = parts[0], f"/{parts[0]}/"
+        elif parts[0] == "src" and len(parts) == 2 and parts[1].endswith(".py"):
+            name, pattern = parts[1].removesuffix(".py"), f"/{path}"
+        else:
+            continue
+        if name.isidentifier() and name not in excluded:
+            patterns.append(pattern)
+    return patterns
+
+
+def is_full_checkout(root):
+    """Return True if root is a checkout of its own that does not use a sparse checkout."""
+    if not (root / ".git").exists():
+        return False
+    try:
+        toplevel = Path(git("rev-parse", "--show-toplevel", cwd=root).strip())
+        git("rev-parse", "--verify", "-q", "HEAD", cwd=root)
+    except FetchError:
+        # Not a repository, or one an interrupted fetch left without a checkout
+        return False
+    if toplevel.resolve() != root.resolve():
+        return False
+    try:
+        return git("config", "--bool", "core.sparseCheckout", cwd=root).strip() != "true"
+    except FetchError:
+        return True
+
+
+def fetch_submodule(name, config, remote, mirror, with_packages):
+    """Shallow-fetch and sparsely check out one submodule.
+
+    Returns:
+        dict: The record of the submodule: url, ref, commit, patterns, files and seconds,
+        or a "skipped" reason.
+    """
+    start = time.perf_counter()
+    path = f"{SUBMODULES_DIR}/{name}"
+    root = REPO_ROOT / path
+    if is_full_checkout(root):
+        commit = git("rev-parse", "HEAD", cwd=root).strip()
+        return {"commit": commit, "skipped": "full checkout, left as it is"}
+
+    settings = submodule_settings(path)
+    url = mirror_url(settings["url"], mirror) if mirror else settings["url"]
+    ref = None if remote else recorded_commit(path)
+    if ref is None:
+        ref = f"refs/heads/{settings['branch']}" if settings["branch"] else "HEAD"
+
+    root.mkdir(parents=True, exist_ok=True)
+    if not (root / ".git").exists():
+        git("init", "-q", cwd=root)
+    remotes = git("remote", cwd=root).split()
+    git("remote", "set-url" if "origin" in remotes else "add", "origin", url, cwd=root)
+    git("fetch", "-q", "--no-tags", "--depth", "1", "--filter=blob:none", "origin", ref, cwd=root)
+    commit = git("rev-parse", "FETCH_HEAD^{commit}", cwd=root).strip()
+
+    patterns = ["/*", "!/*/", *docs_patterns(name, config)]
+    if with_packages:
+        # The tree is known without its files, so the packages can be found before checking out
+        patterns += package_patterns(git("ls-tree", "-r", "--name-only", commit, cwd=root).splitlines())
+    git("sparse-checkout", "set", "--no-cone", "--stdin", cwd=root, stdin="\n".join(patterns) + "\n")
+    git("checkout", "-q", "--detach", commit, cwd=root)
+    # Files outside the sparse checkout are listed with the skip-worktree tag "S"
+    files = sum(not line.startswith("S ") for line in git("ls-files", "-t", cwd=root).splitlines())
+    return {
+        "url": url,
+        "ref": ref,
+        "commit": commit,
+        "patterns": patterns,
+        "files": files,
+        "seconds": round(time.perf_counter() - start, 2),
+    }
+
+
+def save_commits(output, records):
+    output.parent.mkdir(parents=True, exist_ok=True)
+    records = {
+        name: {field: value for field, value in record.items() if field in COMMITS_FIELDS}
+        for name, record in records.items()
+    }
+    commits = {"version": COMMITS_VERSION, "submodules": records}
+    output.write_text(json.dumps(commits, indent=2, sort_keys=True) + "\n", encoding="utf-8")
+
+
+def parse_args(argv=None):
+    """Parse the command-line options of hed-fetch-docs."""
+    parser = argparse.ArgumentParser(description="Fetch the documentation parts of the HED submodules.")
+    parser.add_argument(
+        "--remote", action="store_true", help="check out the tip of each submodule's branch instead of its commit"
+    )
+    add_selection_arguments(parser)
+    parser.add_argument("--docs-only", action="store_true", help="leave out the Python packages of the submodules")
+    parser.add_argument(
+        "--mirror", metavar="BASE", help="fetch from BASE/<repository>.git instead of the .gitmodules URLs"
+    )
+    parser.add_argument(
+        "-j", "--jobs", type=parse_jobs, metavar="N", help="fetch N submodules at a time (default: all at once)"
+    )
+    parser.add_argument(
+        "--output", type=Path, default=OUTPUT_FILE, help="commits file (default: .cache/submodules/commits.json)"
+    )
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    """Fetch the submodules the documentation build uses."""
+    args = parse_args(argv)
+    build_unified = load_build_unified()
+    submodules = build_unified.select_submodules(build_unified.get_submodules(REPO_ROOT), args.only)
+
+    # Imported once here rather than concurrently by the threads finding the packages
+    load_docs_module("submodule_imports")
+    start = time.perf_counter()
+    records, failed = {}, []
+
+    def fetch(name):
+        try:
+            return name, fetch_submodule(name, submodules[name], args.remote, args.mirror, not args.docs_only)
+        except FetchError as e:
+            return name, e
+
+    if submodules:
+        with ThreadPoolExecutor(max_workers=args.jobs or len(submodules)) as executor:
+            for name, record in executor.map(fetch, submodules):
+                if isinstance(record, FetchError):
+                    print(f"  [ERROR] {name}: {record}", file=sys.stderr)
+                    failed.append(name)
+                elif "skipped" in record:
+                    records[name] = record
+                    print(f"  {name:<20} {record['commit'][:10]}  {record['skipped']}")
+                else:
+                    records[name] = record
+                    print(f"  {name:<20} {record['commit'][:10]}  {record['files']:>5} files  {record['seconds']:.1f}s")
+    save_commits(args.output, records)
+
+    print(f"Fetched {len(records)} submodules in {time.perf_counter() - start:.1f}s; commits written to {args.output}")
+    if failed:
+        print(f"[ERROR] Could not fetch {', '.join(failed)}", file=sys.stderr)
+        return 1
+    print("[OK] Submodule documentation fetched successfully")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
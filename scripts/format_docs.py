@@ -4,57 +4,185 @@
 Formats only docs/source/*.md (direct files, not submodule subdirectories)
 and root-level *.md files.
 
+Files are formatted in parallel worker processes through mdformat's Python
+API, with every installed mdformat plugin enabled (as the mdformat command
+does). The content hash of each file known to be correctly formatted is kept
+in .cache/format/formatted.json, and such files are skipped until they change
+or a different version of mdformat or of one of its plugins is installed. A
+check after a typical edit therefore only formats the edited files.
+
 Can be run as:
 - Command (after pip install -e .): hed-format-docs
 - Direct Python: python scripts/format_docs.py
 - Module: python -m scripts.format_docs
 
 Options:
-  --check   Check formatting without making changes (exit 1 if changes needed)
+  --check      Check formatting without making changes (exit 1 if changes needed)
+  -j, --jobs N Format with N worker processes (default: all cores)
+  --no-cache   Format every file, ignoring the cache
 """
 
-import subprocess
+import argparse
+import hashlib
+import importlib.metadata
+import json
 import sys
-from pathlib import Path
-
-
-def main():
+from concurrent.futures import ProcessPoolExecutor
+
+if __package__:
+    from .common import REPO_ROOT, SOURCE_DIR, default_jobs, parse_jobs
+else:
+    from common import REPO_ROOT, SOURCE_DIR, default_jobs, parse_jobs
+
+CACHE_FILE = REPO_ROOT / ".cache" / "format" / "formatted.json"
+CACHE_VERSION = 1
+
+# Same options as `mdformat --wrap no --number` in CI (see [tool.mdformat] in pyproject.toml)
+MDFORMAT_OPTIONS = {"wrap": "no", "number": True}
+PLUGIN_GROUPS = ("mdformat.parser_extension", "mdformat.codeformatter")
+
+
+def markdown_files():
+    """Return the direct .md files of docs/source followed by the root-level .md files."""
+    return sorted(SOURCE_DIR.glob("*.md")) + sorted(REPO_ROOT.glob("*.md"))
+
+
+def toolchain():
+    """Return the versions of mdformat and its installed plugins, and the options used."""
+    versions = {"mdformat": importlib.metadata.version("mdformat")}
+    for group in PLUGIN_GROUPS:
+        for entry_point in importlib.metadata.entry_points(group=group):
+            if entry_point.dist is not None:
+                versions[entry_point.dist.name] = entry_point.dist.version
+    return {"versions": versions, "options": MDFORMAT_OPTIONS}
+
+
+def file_hash(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+def load_cache(cache_file, current_toolchain):
+    """Return {relative path: hash} of the files known to be formatted, if made by the current toolchain."""
+    try:
+        cache = json.loads(cache_file.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return {}
+    if cache.get("version") != CACHE_VERSION or cache.get("toolchain") != current_toolchain:
+        return {}
+    return cache["files"]
+
+
+def save_cache(cache_file, current_toolchain, files):
+    cache_file.parent.mkdir(parents=True, exist_ok=True)
+    tmp_file = cache_file.with_suffix(".tmp")
+    cache = {"version": CACHE_VERSION, "toolchain": current_toolchain, "files": files}
+    tmp_file.write_text(json.dumps(cache, indent=1, sort_keys=True), encoding="utf-8")
+    tmp_file.replace(cache_file)
+
+
+def format_file(path, check):
+    """Format one file with mdformat; runs in a worker process.
+
+    Returns:
+        tuple: (status, hash of the formatted content or None, message), where
+        status is "formatted" (already correct), "reformatted" (rewritten),
+        "unformatted" (needs changes, in check mode) or "error".
+    """
+    import mdformat
+    import mdformat.plugins
+
+    try:
+        original = path.read_bytes().decode()
+        formatted = mdformat.text(
+            original,
+            options=MDFORMAT_OPTIONS,
+            extensions=list(mdformat.plugins.PARSER_EXTENSIONS),
+            codeformatters=list(mdformat.plugins.CODEFORMATTERS),
+        )
+    except (OSError, ValueError) as e:
+        return "error", None, str(e)
+    # mdformat writes LF line endings; files using CRLF keep them
+    if "\r\n" in original:
+        formatted = formatted.replace("\n", "\r\n")
+
+    if formatted == original:
+        return "formatted", file_hash(original.encode()), None
+    if check:
+        return "unformatted", None, None
+    path.write_bytes(formatted.encode())
+    return "reformatted", file_hash(formatted.encode()), None
+
+
+def format_files(paths, check, jobs):
+    """Format files, in worker processes when there is more than one to do."""
+    checks = [check] * len(paths)
+    if jobs == 1 or len(paths) < 2:
+        return list(map(format_file, paths, checks))
+    with ProcessPoolExecutor(max_workers=min(jobs, len(paths))) as executor:
+        return list(executor.map(format_file, paths, checks))
+
+
+def parse_args(argv=None):
+    """Parse the command-line options of hed-format-docs."""
+    parser = argparse.ArgumentParser(description="Format the HED documentation markdown files with mdformat.")
+    parser.add_argument(
+        "--check", action="store_true", help="check formatting without making changes (exit 1 if changes needed)"
+    )
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        type=parse_jobs,
+        default=default_jobs(),
+        metavar="N",
+        help="format with N worker processes (default: all available cores)",
+    )
+    parser.add_argument("--no-cache", action="store_true", help="format every file, ignoring the cache")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
     """Run mdformat on documentation markdown files."""
-    repo_root = Path(__file__).resolve().parent.parent
-    source_dir = repo_root / "docs" / "source"
-
-    # Collect files: direct .md files in docs/source/ (non-recursive)
-    # and root-level .md files
-    md_files = sorted(source_dir.glob("*.md")) + sorted(repo_root.glob("*.md"))
+    args = parse_args(argv)
+    md_files = markdown_files()
 
     if not md_files:
         print("No markdown files found.")
         return 0
 
-    check_mode = "--check" in sys.argv
-
-    cmd = ["mdformat", "--wrap", "no", "--number"]
-    if check_mode:
-        cmd.append("--check")
-    cmd.extend(str(f) for f in md_files)
-
-    mode_label = "Checking" if check_mode else "Formatting"
-    print(f"{mode_label} {len(md_files)} markdown file(s)...")
-
-    result = subprocess.run(cmd)
-
-    if result.returncode != 0:
-        if check_mode:
+    current_toolchain = toolchain()
+    cache = {} if args.no_cache else load_cache(CACHE_FILE, current_toolchain)
+    names = {path: path.relative_to(REPO_ROOT).as_posix() for path in md_files}
+    stale = [path for path in md_files if cache.get(names[path]) != file_hash(path.read_bytes())]
+
+    mode_label = "Checking" if args.check else "Formatting"
+    print(f"{mode_label} {len(stale)} of {len(md_files)} markdown file(s) ({len(md_files) - len(stale)} cached)...")
+
+    failed = False
+    files = {names[path]: cache[names[path]] for path in md_files if path not in stale}
+    for path, (status, digest, message) in zip(stale, format_files(stale, args.check, args.jobs), strict=True):
+        if digest is not None:
+            files[names[path]] = digest
+        if status == "reformatted":
+            print(f"Reformatted {names[path]}")
+        elif status == "unformatted":
+            print(f'File "{names[path]}" is not formatted.')
+            failed = True
+        elif status == "error":
+            print(f'Could not format "{names[path]}": {message}', file=sys.stderr)
+            failed = True
+    save_cache(CACHE_FILE, current_toolchain, files)
+
+    if failed:
+        if args.check:
             print("mdformat check failed: some files need reformatting.")
         else:
             print("mdformat encountered errors.")
+        return 1
+    if args.check:
+        print("All files are correctly formatted.")
     else:
-        if check_mode:
-            print("All files are correctly formatted.")
-        else:
-            print("Done.")
-
-    return result.returncode
+        print("Done.")
+    return 0
 
 
 if __name__ == "__main__":
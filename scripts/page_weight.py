@@ -0,0 +1,418 @@
+#!/usr/bin/env python3
+"""Report the weight of each page of the built HED documentation against budgets.
+
+Every HTML page under docs/_build/html is parsed in parallel worker processes
+for the stylesheets, scripts and images it loads. The bytes of the page and of
+those files are attributed to the page's docname and to the integrated
+repository it belongs to, both uncompressed and as transferred (the smallest
+of the file and its .gz/.br siblings). When the build was profiled
+(hed-build-docs --profile), the read, resolve and write times of each docname
+are taken from docs/_build/profile.json.
+
+The figures are checked against the budgets of [tool.hed-docs.page-budget] and
+[tool.hed-docs.repository-budget] in pyproject.toml, whose ``overrides``
+tables set other limits for docnames or repositories matching a glob pattern.
+Limits are in kilobytes (``*_kb``) or seconds (``build_seconds``).
+
+Can be run as:
+- Command (after pip install -e .): hed-page-weight
+- Direct Python: python scripts/page_weight.py
+- Module: python -m scripts.page_weight
+
+Options:
+  -j, --jobs N     Parse pages with N worker processes (default: all cores)
+  --html-dir DIR   Report on this directory instead of docs/_build/html
+  --profile FILE   Build profile with the build times (default: docs/_build/profile.json)
+  --config FILE    Read the budgets from FILE (default: pyproject.toml)
+  --output FILE    Write the JSON report here (default: docs/_build/page-weight.json)
+  --html FILE      Write the HTML report here (default: docs/_build/page-weight.html)
+  --top N          Print the N heaviest pages (default: 20)
+"""
+
+import argparse
+import fnmatch
+import html
+import html.parser
+import json
+import posixpath
+import sys
+import time
+import urllib.parse
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+try:
+    import tomllib
+except ModuleNotFoundError:  # Python < 3.11; tomli is installed with Sphinx
+    import tomli as tomllib
+
+if __package__:
+    from .common import BUILD_DIR, HTML_DIR, REPO_ROOT, SOURCE_DIR, default_jobs, load_build_unified, parse_jobs
+else:
+    from common import BUILD_DIR, HTML_DIR, REPO_ROOT, SOURCE_DIR, default_jobs, load_build_unified, parse_jobs
+
+CONFIG_FILE = REPO_ROOT / "pyproject.toml"
+PROFILE_FILE = BUILD_DIR / "profile.json"
+OUTPUT_FILE = BUILD_DIR / "page-weight.json"
+HTML_REPORT_FILE = BUILD_DIR / "page-weight.html"
+
+CORE_REPO = "hed-resources"
+# Where the pages standing in for the submodules left out of a partial build live (see _ext/hed_sources.py)
+STUBS_DIR = "hed_stubs"
+CATEGORIES = ("html", "css", "js", "images")
+LIMITS = ("html_kb", "css_kb", "js_kb", "images_kb", "total_kb", "transfer_kb", "build_seconds")
+
+
+class ResourceParser(html.parser.HTMLParser):
+    """Collects the stylesheets, scripts and images an HTML page loads."""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.resources = []
+
+    def handle_starttag(self, tag, attrs):
+        attrs = dict(attrs)
+        if tag == "link" and "stylesheet" in (attrs.get("rel") or "").split() and attrs.get("href"):
+            self.resources.append(("css", attrs["href"]))
+        elif tag == "script" and attrs.get("src"):
+            self.resources.append(("js", attrs["src"]))
+        # Browsers fetch one candidate of a <picture>; the <img> fallback is the largest of them
+        elif tag == "img" and attrs.get("src"):
+            self.resources.append(("images", attrs["src"]))
+
+    handle_startendtag = handle_starttag
+
+
+def scan_page(path):
+    """Return the (category, url) of the resources a page loads; runs in a worker process."""
+    parser = ResourceParser()
+    parser.feed(path.read_bytes().decode("utf-8", errors="replace"))
+    parser.close()
+    return parser.resources
+
+
+def resource_target(page, url):
+    """Return the site-relative file a resource URL of a page points to, or None for external URLs."""
+    parts = urllib.parse.urlsplit(url)
+    if parts.scheme or parts.netloc or not parts.path:
+        return None
+    return posixpath.normpath(posixpath.join(posixpath.dirname(page), urllib.parse.unquote(parts.path)))
+
+
+def file_weight(html_dir, target, weights):
+    """Return (bytes, transferred bytes) of a site file, or None if it does not exist; memoized in weights."""
+    if target not in weights:
+        path = html_dir / target
+        if not path.is_file():
+            weights[target] = None
+        else:
+            size = path.stat().st_size
+            siblings = [path.with_name(path.name + suffix) for suffix in (".gz", ".br")]
+            transfer = min([size] + [sibling.stat().st_size for sibling in siblings if sibling.is_file()])
+            weights[target] = (size, transfer)
+    return weights[target]
+
+
+def repository_prefixes():
+    """Return {top-level directory under docs/source: repository} for the integrated submodules."""
+    prefixes = {}
+    for name, entry in load_build_unified().get_submodules(REPO_ROOT).items():
+        prefixes[Path(entry["dest"]).relative_to(SOURCE_DIR).parts[0]] = name
+    return prefixes
+
+
+def repository_of(docname, prefixes):
+    """Return the integrated repository a docname belongs to."""
+    parts = docname.split("/")
+    if parts[0] == STUBS_DIR and len(parts) > 1:
+        parts = parts[1:]
+    return prefixes.get(parts[0], CORE_REPO)
+
+
+def load_profile(profile_file):
+    """Return {docname: build profile entry} from a --profile report, or {} if there is none."""
+    try:
+        return json.loads(profile_file.read_text(encoding="utf-8"))["docs"]
+    except (OSError, ValueError, KeyError):
+        return {}
+
+
+def load_budgets(config_file):
+    """Return the [tool.hed-docs] budget tables of pyproject.toml (missing tables are empty)."""
+    with open(config_file, "rb") as f:
+        config = tomllib.load(f).get("tool", {}).get("hed-docs", {})
+    budgets = {}
+    for kind in ("page-budget", "repository-budget"):
+        table = dict(config.get(kind, {}))
+        overrides = table.pop("overrides", {})
+        unknown = [name for limits in (table, *overrides.values()) for name in limits if name not in LIMITS]
+        if unknown:
+            raise ValueError(f"unknown [tool.hed-docs.{kind}] limits: {', '.join(sorted(set(unknown)))}")
+        budgets[kind] = (table, overrides)
+    return budgets
+
+
+def limits_for(name, budget):
+    """Return the limits that apply to a docname or repository; matching overrides apply in order."""
+    defaults, overrides = budget
+    limits = dict(defaults)
+    for pattern, values in overrides.items():
+        if fnmatch.fnmatchcase(name, pattern):
+            limits.update(values)
+    return limits
+
+
+def figures_of(entry):
+    """Return the budgeted figures of a page or repository entry."""
+    figures = {f"{category}_kb": entry["bytes"][category] / 1000 for category in CATEGORIES}
+    figures["total_kb"] = entry["total"] / 1000
+    figures["transfer_kb"] = entry["transfer"] / 1000
+    figures["build_seconds"] = entry.get("build_seconds")
+    return figures
+
+
+def over_budget(entry, limits):
+    """Return [(limit name, value, limit)] for the figures of an entry above their limit."""
+    figures = figures_of(entry)
+    return [
+        (name, figures[name], limit)
+        for name, limit in limits.items()
+        if figures[name] is not None and figures[name] > limit
+    ]
+
+
+def measure_pages(html_dir, jobs):
+    """Return {page: [(category, target)]} with the local resources of every page of the site."""
+    pages = sorted(path.relative_to(html_dir).as_posix() for path in html_dir.rglob("*.html"))
+    paths = [html_dir / page for page in pages]
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        results = list(executor.map(scan_page, paths, chunksize=max(1, len(pages) // (jobs * 8))))
+    resources = {}
+    for page, page_resources in zip(pages, results, strict=True):
+        targets = [(category, resource_target(page, url)) for category, url in page_resources]
+        resources[page] = [(category, target) for category, target in targets if target is not None]
+    return resources
+
+
+def build_report(html_dir, resources, profile, budgets):
+    """Attribute the bytes and build times to pages and repositories and check them against the budgets."""
+    prefixes = repository_prefixes()
+    weights = {}
+    pages, repositories = {}, {}
+    for page, page_resources in resources.items():
+        docname = page.removesuffix(".html")
+        repository = repository_of(docname, prefixes)
+        size, transfer = file_weight(html_dir, page, weights)
+        entry = {
+            "repository": repository,
+            "bytes": {"html": size, "css": 0, "js": 0, "images": 0},
+            "transfer": transfer,
+            "missing": [],
+        }
+        repo = repositories.setdefault(repository, {"pages": 0, "html": 0, "html_transfer": 0, "files": {}})
+        repo["pages"] += 1
+        repo["html"] += size
+        repo["html_transfer"] += transfer
+        # A file loaded twice by a page (or by several pages of a repository) is only downloaded once
+        for category, target in dict.fromkeys(page_resources):
+            weight = file_weight(html_dir, target, weights)
+            if weight is None:
+                entry["missing"].append(target)
+                continue
+            entry["bytes"][category] += weight[0]
+            entry["transfer"] += weight[1]
+            repo["files"][target] = (category, *weight)
+        entry["total"] = sum(entry["bytes"].values())
+        if docname in profile:
+            timings = profile[docname]
+            entry["build"] = {phase: timings.get(phase, 0.0) for phase in ("read", "resolve", "write")}
+            entry["build_seconds"] = timings["total"]
+        if not entry["missing"]:
+            del entry["missing"]
+        entry["over_budget"] = over_budget(entry, limits_for(docname, budgets["page-budget"]))
+        pages[docname] = entry
+
+    for name, repo in repositories.items():
+        files = repo.pop("files")
+        totals = {"html": repo.pop("html"), "css": 0, "js": 0, "images": 0}
+        transfer = repo.pop("html_transfer")
+        for category, size, file_transfer in files.values():
+            totals[category] += size
+            transfer += file_transfer
+        repo.update(bytes=totals, total=sum(totals.values()), transfer=transfer)
+        if profile:
+            repo["build_seconds"] = sum(
+                page.get("build_seconds", 0.0) for page in pages.values() if page["repository"] == name
+            )
+        repo["over_budget"] = over_budget(repo, limits_for(name, budgets["repository-budget"]))
+
+    return {
+        "html_dir": str(html_dir),
+        "profiled": bool(profile),
+        "repositories": dict(sorted(repositories.items(), key=lambda item: item[1]["total"], reverse=True)),
+        "pages": dict(sorted(pages.items(), key=lambda item: item[1]["total"], reverse=True)),
+    }
+
+
+def violations(report):
+    """Return (kind, name, limit name, value, limit) for every figure above its budget."""
+    return [
+        (kind, name, *problem)
+        for kind, key in (("repository", "repositories"), ("page", "pages"))
+        for name, entry in report[key].items()
+        for problem in entry["over_budget"]
+    ]
+
+
+def format_value(name, value):
+    return f"{value:.2f}s" if name == "build_seconds" else f"{value:,.0f} KB"
+
+
+def format_table(report, top):
+    """Return the repository and heaviest-page tables of a report as text lines."""
+    header = f"{'html':>9}{'css':>8}{'js':>8}{'images':>9}{'total':>9}{'transfer':>10}{'build s':>9}"
+
+    def row(entry):
+        kb = {category: entry["bytes"][category] / 1000 for category in CATEGORIES}
+        seconds = entry.get("build_seconds")
+        return (
+            f"{kb['html']:>9.0f}{kb['css']:>8.0f}{kb['js']:>8.0f}{kb['images']:>9.0f}"
+            f"{entry['total'] / 1000:>9.0f}{entry['transfer'] / 1000:>10.0f}"
+            f"{'-' if seconds is None else f'{seconds:.2f}':>9}"
+        )
+
+    lines = [f"{'repository (KB)':<24}{'pages':>6}{header}"]
+    for name, entry in report["repositories"].items():
+        lines.append(f"{name:<24}{entry['pages']:>6}{row(entry)}")
+    lines += ["", f"{'page (KB)':<48}{header}"]
+    for docname, entry in list(report["pages"].items())[:top]:
+        lines.append(f"{docname[:47]:<48}{row(entry)}")
+    return lines
+
+
+def write_html_report(report, output):
+    """Write the report as a standalone HTML page, with the figures above their budget highlighted."""
+
+    def cells(entry):
+        over = {problem[0] for problem in entry["over_budget"]}
+        figures = figures_of(entry)
+        result = []
+        for name in LIMITS:
+            value = figures[name]
+            text = "" if value is None else format_value(name, value)
+            result.append(f'<td class="{"over" if name in over else ""}">{text}</td>')
+        return "".join(result)
+
+    header = "".join(f"<th>{name.removesuffix('_kb').replace('_', ' ')}</th>" for name in LIMITS)
+    repository_rows = "".join(
+        f"<tr><td>{html.escape(name)}</td><td>{entry['pages']}</td>{cells(entry)}</tr>"
+        for name, entry in report["repositories"].items()
+    )
+    page_rows = "".join(
+        f"<tr><td>{html.escape(docname)}</td><td>{html.escape(entry['repository'])}</td>{cells(entry)}</tr>"
+        for docname, entry in report["pages"].items()
+    )
+    problems = len(violations(report))
+    summary = f"{problems} figures over budget" if problems else "All pages and repositories are within budget"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(
+        f"""<!DOCTYPE html>
+<html lang="en">
+<head>
+<meta charset="utf-8">
+<title>HED documentation page weight</title>
+<style>
+body {{ font-family: sans-serif; margin: 2em; }}
+table {{ border-collapse: collapse; margin-bottom: 2em; }}
+th, td {{ border: 1px solid #ccc; padding: 0.2em 0.6em; }}
+td + td {{ text-align: right; }}
+td.over {{ background: #fdd; font-weight: bold; }}
+</style>
+</head>
+<body>
+<h1>HED documentation page weight</h1>
+<p>{summary}. Sizes are uncompressed, except for the transfer column.</p>
+<h2>Repositories</h2>
+<table><tr><th>repository</th><th>pages</th>{header}</tr>{repository_rows}</table>
+<h2>Pages</h2>
+<table><tr><th>page</th><th>repository</th>{header}</tr>{page_rows}</table>
+</body>
+</html>
+""",
+        encoding="utf-8",
+    )
+
+
+def parse_args(argv=None):
+    """Parse the command-line options of hed-page-weight."""
+    parser = argparse.ArgumentParser(description="Report the page weight of the built HED documentation.")
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        type=parse_jobs,
+        default=default_jobs(),
+        metavar="N",
+        help="parse pages with N worker processes (default: all available cores)",
+    )
+    parser.add_argument(
+        "--html-dir", type=Path, default=HTML_DIR, help="built site to report on (default: docs/_build/html)"
+    )
+    parser.add_argument(
+        "--profile",
+        type=Path,
+        default=PROFILE_FILE,
+        help="build profile with the build times (default: docs/_build/profile.json)",
+    )
+    parser.add_argument("--config", type=Path, default=CONFIG_FILE, help="budgets file (default: pyproject.toml)")
+    parser.add_argument(
+        "--output", type=Path, default=OUTPUT_FILE, help="JSON report (default: docs/_build/page-weight.json)"
+    )
+    parser.add_argument(
+        "--html", type=Path, default=HTML_REPORT_FILE, help="HTML report (default: docs/_build/page-weight.html)"
+    )
+    parser.add_argument("--top", type=int, default=20, metavar="N", help="print the N heaviest pages (default: 20)")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    """Report the page weight of the built documentation and check it against the budgets."""
+    args = parse_args(argv)
+    html_dir = args.html_dir.resolve()
+    if not html_dir.is_dir():
+        print(f"[ERROR] Documentation not built yet: {html_dir} does not exist", file=sys.stderr)
+        return 1
+    try:
+        budgets = load_budgets(args.config)
+    except (OSError, ValueError) as e:
+        print(f"[ERROR] Could not read the budgets from {args.config}: {e}", file=sys.stderr)
+        return 1
+
+    start = time.perf_counter()
+    profile = load_profile(args.profile)
+    report = build_report(html_dir, measure_pages(html_dir, args.jobs), profile, budgets)
+    args.output.parent.mkdir(parents=True, exist_ok=True)
+    args.output.write_text(json.dumps(report, indent=2), encoding="utf-8")
+    write_html_report(report, args.html)
+
+    for line in format_table(report, args.top):
+        print(line)
+    print()
+    if not profile:
+        print(f"No build times: {args.profile} not found (build with hed-build-docs --profile)")
+    print(
+        f"Measured {len(report['pages'])} pages of {len(report['repositories'])} repositories "
+        f"in {time.perf_counter() - start:.1f}s; reports written to {args.output} and {args.html}"
+    )
+
+    problems = violations(report)
+    for kind, name, limit_name, value, limit in problems:
+        print(f"{kind} {name}: {limit_name} {format_value(limit_name, value)} > {format_value(limit_name, limit)}")
+    if problems:
+        print(f"[ERROR] {len(problems)} figures over budget", file=sys.stderr)
+        return 1
+    print("[OK] All pages and repositories are within budget")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -5,20 +5,563 @@ Can be run as:
 - Command (after pip install -e .): hed-serve-docs
 - Direct Python: python scripts/serve_docs.py
 - Module: python -m scripts.serve_docs
+
+Options:
+  --port N        Port to listen on (default: 8000)
+  --bind ADDRESS  Address to bind to (default: all interfaces)
+  --watch         Watch docs/source and the submodule documentation for
+                  changes, resync and rebuild only what changed, and
+                  live-reload open pages. Rebuilds go through
+                  hed-build-daemon when it is running.
+  --versions      Serve the versions built by hed-build-versions
+                  (docs/_build/versions) under /<version>/, with a version
+                  switcher on every page
+  --archive FILE  Serve the site from an archive written by
+                  hed-build-docs --archive, without extracting it
+
+Files are served by a threaded server with ETag/Last-Modified revalidation,
+precompressed .br/.gz variants when present (text assets are otherwise
+gzipped on the fly) and long-lived caching of content-hashed assets.
+Archive entries are read through a memory map and sent as they are stored
+(deflated entries as gzip) to clients that accept it.
 """
 
+import argparse
+import datetime
+import email.utils
+import functools
+import gzip
+import html
 import http.server
-import socketserver
+import io
+import json
+import os
+import re
+import subprocess
 import sys
+import threading
+import time
+import urllib.parse
 import webbrowser
-from pathlib import Path
+import zipfile
+from http import HTTPStatus
+from pathlib import Path, PurePosixPath
+
+if __package__:
+    from .build_daemon import request_daemon
+    from .common import REPO_ROOT, load_build_unified, load_overrides
+    from .site_archive import SiteArchive
+else:
+    from build_daemon import request_daemon
+    from common import REPO_ROOT, load_build_unified, load_overrides
+    from site_archive import SiteArchive
+
+PORT = 8000
+
+# Server-sent-events endpoint used by open pages to reload after a rebuild
+LIVERELOAD_PATH = "/__livereload"
+LIVERELOAD_SCRIPT = (
+    b'<script>new EventSource("' + LIVERELOAD_PATH.encode() + b'").onmessage = () => location.reload();</script>'
+)
+DOC_SUFFIXES = (".rst", ".md")
+
+# Index of the versions written by hed-build-versions, at the root of its store
+VERSIONS_INDEX = "versions.json"
+VERSION_SWITCHER = (
+    '<div style="position:fixed;right:1em;bottom:1em;z-index:1000"><select aria-label="Documentation version" '
+    "onchange=\"location.href='/'+this.value+location.pathname.slice({prefix})+location.hash\">{options}</select></div>"
+)
+
+# Precompressed siblings, in order of preference
+PRECOMPRESSED = (("br", ".br"), ("gzip", ".gz"))
+COMPRESSIBLE = {".html", ".css", ".js", ".json", ".map", ".svg", ".txt", ".xml"}
+MIN_COMPRESS_SIZE = 1024
+# Fingerprinted file names (name.<hash>.ext) and Sphinx/furo cache-busting queries (?v=<hash>, ?digest=<hash>)
+HASHED_NAME = re.compile(r"\.[0-9a-f]{8,}\.\w+$")
+HASHED_QUERY = re.compile(r"(?:^|&)(?:v|digest)=[0-9a-f]{8,}")
+
+
+class LiveReload:
+    """Broadcasts reload notifications to every connected server-sent-events client."""
+
+    def __init__(self):
+        self._condition = threading.Condition()
+        self._generation = 0
+
+    def notify(self):
+        with self._condition:
+            self._generation += 1
+            self._condition.notify_all()
+
+    def wait(self, generation, timeout):
+        """Wait until a notification newer than ``generation``; return the current generation."""
+        with self._condition:
+            self._condition.wait_for(lambda: self._generation != generation, timeout)
+            return self._generation
+
+    @property
+    def generation(self):
+        with self._condition:
+            return self._generation
+
+
+class DocsRequestHandler(http.server.SimpleHTTPRequestHandler):
+    """Serves the built HTML with caching and compression, plus the live-reload channel when enabled.
+
+    Precompressed ``.br``/``.gz`` siblings are served when the client accepts
+    them, and other text assets are gzipped on the fly. Every file carries an
+    ETag and Last-Modified date so revisits are answered with 304 Not Modified.
+    Assets whose URL contains a content hash are cached for good.
+    """
+
+    # Keep-alive lets a page fetch its many assets over a few connections
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        # Custom logging format
+        print(f"[{self.log_date_time_string()}] {format % args}")
+
+    def do_GET(self):
+        livereload = getattr(self.server, "livereload", None)
+        if livereload is not None and self.path == LIVERELOAD_PATH:
+            return self.stream_reload_events(livereload)
+        return super().do_GET()
+
+    def copyfile(self, source, outputfile):
+        if isinstance(source, BufferBody):
+            for part in source.parts:
+                outputfile.write(part)
+        else:
+            super().copyfile(source, outputfile)
+
+    def send_head(self):
+        """Send the response headers and return the body to copy, or None."""
+        url = urllib.parse.urlsplit(self.path)
+        archive = getattr(self.server, "archive", None)
+        if archive is not None:
+            return self.send_archive_entry(archive, url)
+        path = Path(self.translate_path(self.path))
+        if path.is_dir() and url.path.endswith("/"):
+            path = path / "index.html"
+        versions = self.versions_index()
+        if versions is not None:
+            location = version_location(url.path, path, versions)
+            if location is not None:
+                return self.send_redirect(location)
+        if not path.is_file():
+            # Directory redirects, listings and 404s
+            return super().send_head()
+        if path.suffix == ".html":
+            snippet = b""
+            if getattr(self.server, "livereload", None) is not None:
+                snippet += LIVERELOAD_SCRIPT
+            if versions is not None:
+                snippet += version_switcher(url.path, versions)
+            if snippet:
+                return self.send_injected_page(path, snippet)
+
+        stat = path.stat()
+        body_file, encoding = self.select_variant(path, stat)
+        body = None
+        if encoding is None and path.suffix in COMPRESSIBLE and stat.st_size >= MIN_COMPRESS_SIZE:
+            if "gzip" in accepted_encodings(self.headers.get("Accept-Encoding", "")):
+                body, encoding = gzip_file(path, stat.st_mtime_ns, stat.st_size), "gzip"
+
+        etag = f'"{stat.st_mtime_ns:x}-{stat.st_size:x}{"-" + encoding if encoding else ""}"'
+        if not self.send_cached_headers(path, url.query, etag, stat.st_mtime, encoding):
+            return None
+        if body is not None:
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            return io.BytesIO(body)
+        # Closed by SimpleHTTPRequestHandler once copied
+        file = open(body_file, "rb")
+        self.send_header("Content-Length", str(os.fstat(file.fileno()).st_size))
+        self.end_headers()
+        return file
+
+    def send_cached_headers(self, path, query, etag, mtime, encoding):
+        """Send the status and caching headers of a file, ending them for a 304 Not Modified.
+
+        Returns:
+            bool: True if the body follows, so Content-Length is still to be sent.
+        """
+        not_modified = self.is_not_modified(etag, mtime)
+        self.send_response(HTTPStatus.NOT_MODIFIED if not_modified else HTTPStatus.OK)
+        self.send_header("Content-Type", self.guess_type(str(path)))
+        self.send_header("ETag", etag)
+        self.send_header("Last-Modified", self.date_time_string(int(mtime)))
+        self.send_header("Cache-Control", cache_control(path, query))
+        if path.suffix in COMPRESSIBLE or encoding:
+            self.send_header("Vary", "Accept-Encoding")
+        if not_modified:
+            self.end_headers()
+            return False
+        if encoding:
+            self.send_header("Content-Encoding", encoding)
+        return True
+
+    def send_archive_entry(self, archive, url):
+        """Send a file of the site archive, as it is stored when the client accepts that encoding."""
+        name = urllib.parse.unquote(url.path).lstrip("/")
+        if name in archive.directories:
+            # Like SimpleHTTPRequestHandler, so relative links resolve from the directory
+            return self.send_redirect(urllib.parse.urlunsplit(("", "", url.path + "/", url.query, "")), moved=True)
+        if not name or name.endswith("/"):
+            name += "index.html"
+        info = archive.entries.get(name)
+        if info is None:
+            self.send_error(HTTPStatus.NOT_FOUND, "File not found")
+            return None
+
+        accepted = accepted_encodings(self.headers.get("Accept-Encoding", ""))
+        brotli_info = archive.entries.get(name + ".br")
+        if "br" in accepted and brotli_info is not None:
+            body, encoding = BufferBody(archive.raw(brotli_info)), "br"
+        elif "gzip" in accepted and info.compress_type == zipfile.ZIP_DEFLATED:
+            body, encoding = BufferBody(*archive.gzip_parts(info)), "gzip"
+        else:
+            body, encoding = BufferBody(archive.read(info)), None
+
+        etag = f'"{info.CRC:08x}-{info.file_size:x}{"-" + encoding if encoding else ""}"'
+        if not self.send_cached_headers(PurePosixPath(name), url.query, etag, archive.mtime(info), encoding):
+            return None
+        self.send_header("Content-Length", str(sum(len(part) for part in body.parts)))
+        self.end_headers()
+        return body
+
+    def select_variant(self, path, stat):
+        """Return the file to send and its content encoding, preferring an up-to-date precompressed sibling."""
+        accepted = accepted_encodings(self.headers.get("Accept-Encoding", ""))
+        for encoding, suffix in PRECOMPRESSED:
+            variant = path.with_name(path.name + suffix)
+            if encoding in accepted and variant.is_file() and variant.stat().st_mtime_ns >= stat.st_mtime_ns:
+                return variant, encoding
+        return path, None
+
+    def is_not_modified(self, etag, mtime):
+        """Evaluate If-None-Match (preferred) or If-Modified-Since against the file being served."""
+        if_none_match = self.headers.get("If-None-Match")
+        if if_none_match is not None:
+            tags = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+            return "*" in tags or etag in tags
+        if_modified_since = self.headers.get("If-Modified-Since")
+        if not if_modified_since:
+            return False
+        try:
+            since = email.utils.parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError, IndexError, OverflowError):
+            return False
+        if since.tzinfo is None:
+            since = since.replace(tzinfo=datetime.timezone.utc)
+        return int(mtime) <= since.timestamp()
+
+    def versions_index(self):
+        """Return the versions index when serving the hed-build-versions store, else None."""
+        if not getattr(self.server, "versions", False):
+            return None
+        index_file = Path(self.directory) / VERSIONS_INDEX
+        try:
+            return load_versions_index(index_file, index_file.stat().st_mtime_ns)
+        except (OSError, ValueError):
+            return None
+
+    def send_redirect(self, location, moved=False):
+        self.send_response(HTTPStatus.MOVED_PERMANENTLY if moved else HTTPStatus.FOUND)
+        self.send_header("Location", location)
+        self.send_header("Content-Length", "0")
+        self.send_header("Cache-Control", "no-cache")
+        self.end_headers()
+        return None
+
+    def send_injected_page(self, path, snippet):
+        """Send an HTML page with a snippet (live-reload client, version switcher) injected."""
+        body = path.read_bytes()
+        index = body.rfind(b"</body>")
+        body = body[:index] + snippet + body[index:] if index >= 0 else body + snippet
+        self.send_response(HTTPStatus.OK)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("Cache-Control", "no-store")
+        self.end_headers()
+        return io.BytesIO(body)
+
+    def stream_reload_events(self, livereload):
+        """Hold the connection open and send an event after every rebuild."""
+        self.send_response(HTTPStatus.OK)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-store")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        generation = livereload.generation
+        try:
+            while True:
+                current = livereload.wait(generation, timeout=15)
+                # A comment line keeps idle connections from timing out
+                self.wfile.write(b"data: reload\n\n" if current != generation else b": keep-alive\n\n")
+                self.wfile.flush()
+                generation = current
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+
+class BufferBody:
+    """A response body of buffers, such as memory-mapped archive entries, written without copying."""
+
+    def __init__(self, *parts):
+        self.parts = parts
+
+    def close(self):
+        pass
+
+
+def accepted_encodings(header):
+    """Return the content codings an Accept-Encoding header allows."""
+    accepted = set()
+    for item in header.split(","):
+        coding, _, params = item.strip().partition(";")
+        if coding and params.replace(" ", "") not in ("q=0", "q=0.0", "q=0.00", "q=0.000"):
+            accepted.add(coding.lower())
+    return accepted
 
 
-def main():
+def cache_control(path, query):
+    """Return the Cache-Control header: immutable for content-hashed assets, revalidate for the rest."""
+    if HASHED_NAME.search(path.name) or HASHED_QUERY.search(query):
+        return "public, max-age=31536000, immutable"
+    return "no-cache"
+
+
+@functools.lru_cache(maxsize=4)
+def load_versions_index(index_file, mtime_ns):
+    """Return the parsed versions index; the modification time keys the cache."""
+    return json.loads(index_file.read_text(encoding="utf-8"))
+
+
+def version_location(url_path, path, index):
+    """Return where to redirect a request to the versions store, or None to serve it as it is.
+
+    The root goes to the default version, and a page missing from a version
+    (e.g. after switching versions) to that version's start page.
+    """
+    if url_path == "/":
+        return f"/{index['default']}/" if index["default"] else None
+    version, _, rest = url_path.lstrip("/").partition("/")
+    if version not in index["versions"] or path.exists() or url_path == f"/{version}/":
+        return None
+    if rest.endswith(("/", ".html")):
+        return f"/{version}/"
+    return None
+
+
+def version_switcher(url_path, index):
+    """Return the version switcher of a page of the versions store, or b"" outside a version."""
+    version = url_path.lstrip("/").partition("/")[0]
+    if version not in index["versions"]:
+        return b""
+    options = "".join(
+        f"<option{' selected' if name == version else ''}>{html.escape(name)}</option>" for name in index["versions"]
+    )
+    return VERSION_SWITCHER.format(prefix=len(version) + 1, options=options).encode()
+
+
+@functools.lru_cache(maxsize=128)
+def gzip_file(path, mtime_ns, size):
+    """Return the gzipped contents of a file; the stat values key the cache."""
+    return gzip.compress(path.read_bytes(), compresslevel=6)
+
+
+class DocsWatcher(threading.Thread):
+    """Polls docs/source and the submodule documentation and rebuilds what changed.
+
+    Changed submodule files are resynced individually into docs/source, then
+    Sphinx rebuilds just the affected documents and open pages are reloaded.
+    Rebuilds use the conf.py overrides the site was built with (--zero-copy,
+    --only), so only the submodules of that build are watched, and in a
+    zero-copy build their files are not resynced but picked up in place.
+    """
+
+    def __init__(self, source_dir, html_dir, livereload, interval=1.0):
+        super().__init__(daemon=True)
+        self.source_dir = source_dir
+        self.html_dir = html_dir
+        self.livereload = livereload
+        self.interval = interval
+        self.overrides = load_overrides(html_dir / ".doctrees")
+        self.zero_copy = bool(self.overrides.get("hed_zero_copy"))
+        self.build_unified = load_build_unified()
+        submodules = self.build_unified.get_submodules(REPO_ROOT)
+        only = self.build_unified.parse_only(self.overrides.get("hed_only"))
+        self.submodules = self.build_unified.select_submodules(submodules, only)
+        self.index_templates_dir = REPO_ROOT / "docs" / "submodule-indexes"
+        # Copies under docs/source are outputs of the resync, not edits
+        self.dest_dirs = {config["dest"] for config in submodules.values()}
+
+    def snapshot(self, log=print):
+        """Return {path: (mtime_ns, size)} of watched files and {source path: (submodule, relative path)}.
+
+        Missing submodule files are reported through ``log``.
+        """
+        origins = {}
+        for name, config in self.submodules.items():
+            if config["source"].exists():
+                files = self.build_unified.collect_submodule_files(name, config, self.index_templates_dir, log=log)
+                origins.update({src_file: (name, rel_path) for rel_path, src_file in files.items()})
+
+        stats = {}
+        for path in list(origins) + self.source_files():
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            stats[path] = (stat.st_mtime_ns, stat.st_size)
+        return stats, origins
+
+    def source_files(self):
+        files = []
+        for path in self.source_dir.rglob("*"):
+            if path.is_file() and not any(dest in path.parents for dest in self.dest_dirs):
+                files.append(path)
+        return files
+
+    def run(self):
+        stats, origins = self.snapshot()
+        while True:
+            time.sleep(self.interval)
+            # Missing files were reported by the first snapshot; polls stay quiet
+            current_stats, current_origins = self.snapshot(log=lambda message: None)
+            paths = stats.keys() | current_stats.keys()
+            changed = {path for path in paths if stats.get(path) != current_stats.get(path)}
+            if changed:
+                try:
+                    self.rebuild(changed, {**origins, **current_origins})
+                except Exception as e:
+                    print(f"[ERROR] Rebuild failed: {e}", file=sys.stderr)
+            stats, origins = current_stats, current_origins
+
+    def rebuild(self, changed, origins):
+        """Resync changed submodule files, rebuild the affected documents and notify the browsers."""
+        per_submodule = {}
+        targets = []
+        for path in sorted(changed):
+            if path in origins:
+                name, rel_path = origins[path]
+                per_submodule.setdefault(name, {})[rel_path] = path
+            else:
+                targets.append(path)
+
+        for name, sources in per_submodule.items():
+            if self.zero_copy:
+                continue
+            touched = self.build_unified.sync_submodule_files(self.submodules[name], sources)
+            print(f"  Resynced {len(touched)} file(s) of {name}")
+            targets.extend(touched)
+
+        # Documents are rebuilt individually; anything else (conf.py, templates, static files,
+        # submodule files read in place) falls back to Sphinx's own incremental detection
+        documents = (
+            bool(targets)
+            and not (self.zero_copy and per_submodule)
+            and all(path.suffix in DOC_SUFFIXES and path.exists() for path in targets)
+        )
+        if documents:
+            label = ", ".join(str(path.relative_to(self.source_dir)) for path in targets)
+        else:
+            label = "changed documents"
+        print(f"Rebuilding {label}...")
+        start = time.perf_counter()
+        if self.build(targets if documents else []):
+            print(f"[OK] Rebuilt in {time.perf_counter() - start:.1f}s; reloading browsers")
+            self.livereload.notify()
+        else:
+            print("[ERROR] Sphinx rebuild failed", file=sys.stderr)
+
+    def build(self, files):
+        """Build the given source files (or everything out of date), preferring a running build daemon.
+
+        The daemon is only used if it runs with the overrides the site was built with.
+        """
+        docnames = [path.relative_to(self.source_dir).with_suffix("").as_posix() for path in files]
+        status = request_daemon("status")
+        response = None
+        if status is not None and status["overrides"] == self.overrides:
+            response = request_daemon("build", on_output=print_warnings, docnames=docnames)
+        if response is not None:
+            if not response["ok"] and "error" in response:
+                print(f"[ERROR] {response['error']}", file=sys.stderr)
+            return response["ok"]
+
+        cmd = ["sphinx-build", "-q", "-b", "html"]
+        for name, value in self.overrides.items():
+            cmd += ["-D", f"{name}={value}"]
+        cmd += [str(self.source_dir), str(self.html_dir)]
+        cmd += [str(path) for path in files]
+        return subprocess.run(cmd, cwd=REPO_ROOT).returncode == 0
+
+
+def print_warnings(stream, text):
+    """Show only the warnings of a daemon build, like sphinx-build -q."""
+    if stream == "warning":
+        sys.stderr.write(text)
+
+
+def parse_args(argv=None):
+    """Parse the command-line options of hed-serve-docs."""
+    parser = argparse.ArgumentParser(description="Serve the built HED documentation locally.")
+    parser.add_argument(
+        "--watch",
+        action="store_true",
+        help="rebuild changed documents and live-reload open pages",
+    )
+    parser.add_argument(
+        "--versions",
+        action="store_true",
+        help="serve the versions built by hed-build-versions, with a version switcher",
+    )
+    parser.add_argument(
+        "--archive",
+        type=Path,
+        metavar="FILE",
+        help="serve the site from an archive written by hed-build-docs --archive",
+    )
+    parser.add_argument("--port", type=int, default=PORT, help=f"port to listen on (default: {PORT})")
+    parser.add_argument(
+        "--bind",
+        default="",
+        metavar="ADDRESS",
+        help="address to bind to, e.g. 127.0.0.1 (default: all interfaces)",
+    )
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
     """Serve the built documentation on localhost."""
+    args = parse_args(argv)
+
     # Get the repository root (parent of scripts directory)
     repo_root = Path(__file__).resolve().parent.parent
     html_dir = repo_root / "docs" / "_build" / "html"
+    if args.versions:
+        if args.watch:
+            print("[ERROR] --watch cannot be combined with --versions", file=sys.stderr)
+            return 1
+        html_dir = repo_root / "docs" / "_build" / "versions"
+        if not (html_dir / VERSIONS_INDEX).is_file():
+            print("[ERROR] No documentation versions built yet!", file=sys.stderr)
+            print("Run 'hed-build-versions' or 'python scripts/build_versions.py' first.", file=sys.stderr)
+            return 1
+
+    archive = None
+    if args.archive is not None:
+        if args.watch or args.versions:
+            print("[ERROR] --archive cannot be combined with --watch or --versions", file=sys.stderr)
+            return 1
+        try:
+            archive = SiteArchive(args.archive)
+        except (OSError, ValueError, zipfile.BadZipFile) as e:
+            print(f"[ERROR] Cannot open archive {args.archive}: {e}", file=sys.stderr)
+            return 1
+        html_dir = archive.path.resolve()
 
     if not html_dir.exists():
         print("[ERROR] Documentation not built yet!", file=sys.stderr)
@@ -29,42 +572,44 @@ def main():
         )
         return 1
 
-    PORT = 8000
-
-    class CustomHTTPRequestHandler(http.server.SimpleHTTPRequestHandler):
-        def __init__(self, *args, **kwargs):
-            super().__init__(*args, directory=str(html_dir), **kwargs)
-
-        def log_message(self, format, *args):
-            # Custom logging format
-            print(f"[{self.log_date_time_string()}] {format % args}")
+    handler = functools.partial(DocsRequestHandler, directory=str(html_dir))
 
     print("=" * 60)
     print("HED Documentation Server")
     print("=" * 60)
     print(f"Serving documentation from: {html_dir}")
-    print(f"URL: http://localhost:{PORT}")
+    host = args.bind if args.bind not in ("", "0.0.0.0", "::") else "localhost"
+    url = f"http://{host}:{args.port}"
+    print(f"URL: {url}")
+    if args.watch:
+        print("Watching docs/source and submodule documentation for changes")
     print()
     print("Press Ctrl+C to stop the server")
     print("=" * 60)
     print()
 
-    # Open browser
-    try:
-        webbrowser.open(f"http://localhost:{PORT}")
-    except Exception as e:
-        print(f"Could not open browser automatically: {e}")
-
     # Start server
     try:
-        with socketserver.TCPServer(("", PORT), CustomHTTPRequestHandler) as httpd:
+        with http.server.ThreadingHTTPServer((args.bind, args.port), handler) as httpd:
+            httpd.versions = args.versions
+            httpd.archive = archive
+            if args.watch:
+                httpd.livereload = LiveReload()
+                DocsWatcher(repo_root / "docs" / "source", html_dir, httpd.livereload).start()
+
+            # Open browser
+            try:
+                webbrowser.open(url)
+            except Exception as e:
+                print(f"Could not open browser automatically: {e}")
+
             httpd.serve_forever()
     except KeyboardInterrupt:
         print("\n\n[OK] Server stopped")
         return 0
     except OSError as e:
         if "address already in use" in str(e).lower():
-            print(f"[ERROR] Port {PORT} is already in use", file=sys.stderr)
+            print(f"[ERROR] Port {args.port} is already in use", file=sys.stderr)
             print(
                 "Another server may be running. Try stopping it first.",
                 file=sys.stderr,
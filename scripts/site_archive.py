@@ -0,0 +1,106 @@
+"""Write the built site to a single zip archive and read its entries through a memory map.
+
+Entries are compressed once, when the archive is written: text files are
+deflated, formats that are already compressed (images, fonts) are stored, and
+the ``.br`` siblings hed_assets writes are stored under their own names. The
+``.gz`` siblings are left out, because a deflated entry already is the body of
+a gzip response: the archive records its CRC-32 and size, so only the gzip
+header and trailer have to be added.
+
+Opening an archive reads only its central directory, and the bytes of an entry
+are sliced out of a memory map of the file, so serving from an archive needs
+no extraction.
+"""
+
+import mmap
+import struct
+import time
+import zipfile
+import zlib
+from pathlib import Path
+
+if __package__:
+    from .common import BUILD_DIR
+else:
+    from common import BUILD_DIR
+
+ARCHIVE_FILE = BUILD_DIR / "site.zip"
+# Formats that deflate does not make smaller
+STORED_SUFFIXES = {".br", ".gif", ".gz", ".jpeg", ".jpg", ".png", ".webp", ".woff", ".woff2", ".zip"}
+# Local file header: signature, versions, flags, method, time, date, CRC, sizes, name and extra lengths
+LOCAL_HEADER = struct.Struct("<4s5H3L2H")
+# gzip member header: magic, deflate, no flags, no modification time, no extra flags, unknown OS
+GZIP_HEADER = b"\x1f\x8b\x08\x00\x00\x00\x00\x00\x00\xff"
+
+
+def archive_files(html_dir):
+    """Return the site-relative paths to archive: every file but hidden ones and .gz siblings."""
+    files = []
+    for path in sorted(html_dir.rglob("*")):
+        rel_path = path.relative_to(html_dir).as_posix()
+        if not path.is_file() or any(part.startswith(".") for part in rel_path.split("/")):
+            continue
+        if path.suffix == ".gz" and path.with_suffix("").is_file():
+            continue
+        files.append(rel_path)
+    return files
+
+
+def write_archive(html_dir, archive):
+    """Write the site in html_dir to a zip archive, replacing it in one step.
+
+    Returns:
+        int: The number of entries written.
+    """
+    files = archive_files(html_dir)
+    partial = archive.with_name(archive.name + ".partial")
+    partial.parent.mkdir(parents=True, exist_ok=True)
+    with zipfile.ZipFile(partial, "w", compresslevel=9) as zf:
+        for rel_path in files:
+            path = html_dir / rel_path
+            method = zipfile.ZIP_STORED if path.suffix.lower() in STORED_SUFFIXES else zipfile.ZIP_DEFLATED
+            zf.write(path, rel_path, compress_type=method)
+    partial.replace(archive)
+    return len(files)
+
+
+class SiteArchive:
+    """Read-only access to the entries of a site archive through a memory map."""
+
+    def __init__(self, path):
+        self.path = Path(path)
+        with open(self.path, "rb") as file:
+            # The map stays valid after the file is closed
+            self._map = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+            with zipfile.ZipFile(file) as zf:
+                infos = zf.infolist()
+        self._view = memoryview(self._map)
+        self.entries = {info.filename: info for info in infos if not info.is_dir()}
+        self.directories = {
+            "/".join(name.split("/")[:i]) for name in self.entries for i in range(1, name.count("/") + 1)
+        }
+        self._offsets = {}
+
+    def raw(self, info):
+        """Return the bytes of an entry as stored in the archive, without copying them."""
+        offset = self._offsets.get(info.filename)
+        if offset is None:
+            fields = LOCAL_HEADER.unpack_from(self._map, info.header_offset)
+            offset = info.header_offset + LOCAL_HEADER.size + fields[-2] + fields[-1]
+            self._offsets[info.filename] = offset
+        return self._view[offset : offset + info.compress_size]
+
+    def gzip_parts(self, info):
+        """Return the parts of a gzip stream of a deflated entry: header, deflate data and trailer."""
+        return GZIP_HEADER, self.raw(info), struct.pack("<2L", info.CRC, info.file_size & 0xFFFFFFFF)
+
+    def read(self, info):
+        """Return the uncompressed bytes of an entry."""
+        if info.compress_type == zipfile.ZIP_DEFLATED:
+            return zlib.decompress(self.raw(info), -zlib.MAX_WBITS)
+        return self.raw(info)
+
+    @staticmethod
+    def mtime(info):
+        """Return the modification time of an entry; zip archives record local times."""
+        return time.mktime((*info.date_time, 0, 0, -1))
@@ -0,0 +1 @@
+"""Tests for the HED documentation scripts and Sphinx extensions."""
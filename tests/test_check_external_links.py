@@ -0,0 +1,117 @@
+"""Tests for the external link checker, against a server on localhost."""
+
+import asyncio
+import contextlib
+import http.server
+import io
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+from pathlib import Path
+from unittest import mock
+
+from scripts import check_external_links
+from scripts.check_external_links import DEFAULT_CONFIG, LinkChecker, is_fresh
+
+
+class LinkHandler(http.server.BaseHTTPRequestHandler):
+    """Answers /ok, /redirect, /missing, /flaky (503 twice, then 200) and /down (always 500)."""
+
+    def do_GET(self):
+        counts = self.server.counts
+        counts[self.path] = counts.get(self.path, 0) + 1
+        if self.path == "/ok":
+            self.send_response(200)
+        elif self.path == "/redirect":
+            self.send_response(301)
+            self.send_header("Location", "/ok")
+        elif self.path == "/flaky":
+            self.send_response(503 if counts[self.path] <= 2 else 200)
+        elif self.path == "/down":
+            self.send_response(500)
+        else:
+            self.send_response(404)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def log_message(self, format, *args):
+        pass
+
+
+class TestLinkChecker(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), LinkHandler)
+        cls.server.daemon_threads = True
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+        cls.base = f"http://127.0.0.1:{cls.server.server_address[1]}"
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def setUp(self):
+        self.server.counts = {}
+        patcher = mock.patch.object(check_external_links, "RETRY_DELAY", 0)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def check(self, path, max_retries=2):
+        config = {**DEFAULT_CONFIG, "timeout": 5, "max_retries": max_retries}
+
+        async def run():
+            return await LinkChecker(config).check(self.base + path)
+
+        return asyncio.run(run())
+
+    def test_redirect_followed(self):
+        self.assertEqual(self.check("/redirect")["status"], 200)
+        self.assertEqual(self.server.counts, {"/redirect": 1, "/ok": 1})
+
+    def test_not_found_not_retried(self):
+        self.assertEqual(self.check("/missing")["status"], 404)
+        self.assertEqual(self.server.counts, {"/missing": 1})
+
+    def test_server_error_retried(self):
+        self.assertEqual(self.check("/flaky")["status"], 200)
+        self.assertEqual(self.server.counts, {"/flaky": 3})
+
+    def test_server_error_after_retries(self):
+        result = self.check("/down")
+        self.assertIsNone(result["status"])
+        self.assertEqual(result["error"], "HTTP 500")
+        self.assertEqual(self.server.counts, {"/down": 3})
+
+    def test_excluded_urls_not_checked(self):
+        root = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, root)
+        config_file, cache_file = root / "lychee.toml", root / "results.json"
+        config_file.write_text('exclude = ["/missing"]\nmax_retries = 0\n', encoding="utf-8")
+        argv = [f"{self.base}/ok", f"{self.base}/missing", "--config", str(config_file), "--cache", str(cache_file)]
+        with contextlib.redirect_stdout(io.StringIO()):
+            self.assertEqual(check_external_links.main(argv), 0)
+        self.assertEqual(self.server.counts, {"/ok": 1})
+        self.assertEqual(list(check_external_links.load_cache(cache_file)), [f"{self.base}/ok"])
+
+
+class TestIsFresh(unittest.TestCase):
+    def test_ttl(self):
+        now = time.time()
+        day = 86400
+        self.assertTrue(is_fresh({"status": 200, "checked": now - 6 * day}, {200}, now))
+        self.assertFalse(is_fresh({"status": 200, "checked": now - 8 * day}, {200}, now))
+        # Accepted statuses that say little about the link expire sooner
+        self.assertTrue(is_fresh({"status": 429, "checked": now - 0.2 * day}, {200, 429}, now))
+        self.assertFalse(is_fresh({"status": 429, "checked": now - 0.3 * day}, {200, 429}, now))
+
+    def test_failures_never_fresh(self):
+        now = time.time()
+        self.assertFalse(is_fresh({"status": 404, "checked": now}, {200}, now))
+        self.assertFalse(is_fresh({"status": None, "error": "HTTP 500", "checked": now}, {200}, now))
+
+
+if __name__ == "__main__":
+    unittest.main()
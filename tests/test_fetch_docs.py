@@ -0,0 +1,36 @@
+"""Tests for the commits file written by hed-fetch-docs."""
+
+import shutil
+import tempfile
+import unittest
+from pathlib import Path
+
+from scripts.fetch_docs import save_commits
+
+
+class TestSaveCommits(unittest.TestCase):
+    def setUp(self):
+        self.root = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, self.root)
+
+    def record(self, seconds):
+        return {
+            "url": "https://github.com/hed-standard/hed-python",
+            "ref": "0123456789abcdef",
+            "commit": "0123456789abcdef",
+            "patterns": ["/*", "!/*/"],
+            "files": 42,
+            "seconds": seconds,
+        }
+
+    def test_same_commits_write_same_file(self):
+        first, second = self.root / "first.json", self.root / "second.json"
+        save_commits(first, {"hed-python": self.record(1.25)})
+        save_commits(second, {"hed-python": self.record(3.5)})
+        self.assertEqual(first.read_bytes(), second.read_bytes())
+        self.assertNotIn(b"seconds", first.read_bytes())
+        self.assertIn(b"0123456789abcdef", first.read_bytes())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,50 @@
+"""Tests for the minifiers of the hed_assets Sphinx extension."""
+
+import importlib.util
+import sys
+import unittest
+
+from scripts.common import SOURCE_DIR
+
+if importlib.util.find_spec("sphinx") is not None:
+    sys.path.insert(0, str(SOURCE_DIR / "_ext"))
+    from hed_assets import minify_css, minify_js
+
+
+@unittest.skipUnless(importlib.util.find_spec("sphinx"), "Sphinx is not installed")
+class TestMinifyJs(unittest.TestCase):
+    def test_license_comment_kept(self):
+        text = "/*! Library v1.0 | MIT, see LICENSE */\nvar a = 1; /* dropped */\n"
+        self.assertEqual(minify_js(text), "/*! Library v1.0 | MIT, see LICENSE */\nvar a = 1;\n")
+
+    def test_regex_literals(self):
+        text = 'var r = /\\/\\*x/g;\nvar s = x.replace(/\'/g, "");\nvar c = /[/]/.test(y);\n'
+        self.assertEqual(minify_js(text), text)
+
+    def test_division(self):
+        self.assertEqual(minify_js("var d = a  /  b / c;\n"), "var d = a / b / c;\n")
+
+    def test_newlines_kept_for_semicolon_insertion(self):
+        self.assertEqual(minify_js("let a = 1\n    // comment\n\n    let b = a\n"), "let a = 1\nlet b = a\n")
+        self.assertEqual(
+            minify_js("function f() {\n    return\n        value\n}\n"), "function f() {\nreturn\nvalue\n}\n"
+        )
+
+    def test_comment_markers_in_strings(self):
+        text = "var u = \"http://example.org\", v = '/* kept */', w = `${\"//\"} // ${'/*'}`;\n"
+        self.assertEqual(minify_js(text), text)
+
+
+@unittest.skipUnless(importlib.util.find_spec("sphinx"), "Sphinx is not installed")
+class TestMinifyCss(unittest.TestCase):
+    def test_license_comment_kept(self):
+        text = "/*! Theme v2, MIT */\na {\n    color: red;\n}\n/* dropped */\n"
+        self.assertEqual(minify_css(text), "/*! Theme v2, MIT */ a{color:red}\n")
+
+    def test_comment_markers_in_strings(self):
+        text = 'b::after {\n    content: "/* x */ , y";\n}\n'
+        self.assertEqual(minify_css(text), 'b::after{content:"/* x */ , y"}\n')
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,48 @@
+"""Tests for the checks of the Sphinx internals the hed_sources extension relies on."""
+
+import importlib.util
+import shutil
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+from types import SimpleNamespace
+
+from scripts.common import SOURCE_DIR, load_build_unified
+
+if importlib.util.find_spec("sphinx") is not None:
+    load_build_unified()
+    sys.path.insert(0, str(SOURCE_DIR / "_ext"))
+    from hed_sources import check_internals
+    from sphinx.environment import BuildEnvironment
+    from sphinx.errors import ExtensionError
+    from sphinx.project import Project
+
+
+@unittest.skipUnless(importlib.util.find_spec("sphinx"), "Sphinx is not installed")
+class TestCheckInternals(unittest.TestCase):
+    def setUp(self):
+        srcdir = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, srcdir)
+        self.app = SimpleNamespace(
+            project=Project(srcdir, {".rst": "restructuredtext"}),
+            env=BuildEnvironment.__new__(BuildEnvironment),
+        )
+
+    def test_installed_sphinx(self):
+        check_internals(self.app)
+
+    def test_missing_project_table(self):
+        del self.app.project._path_to_docname
+        with self.assertRaisesRegex(ExtensionError, "Project._path_to_docname"):
+            check_internals(self.app)
+
+    def test_environment_subclass(self):
+        subclass = type("OtherEnvironment", (BuildEnvironment,), {})
+        self.app.env = subclass.__new__(subclass)
+        with self.assertRaises(ExtensionError):
+            check_internals(self.app)
+
+
+if __name__ == "__main__":
+    unittest.main()
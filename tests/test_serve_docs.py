@@ -0,0 +1,39 @@
+"""Tests for the rebuilds of the documentation watcher."""
+
+import json
+import shutil
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+from scripts.common import OVERRIDES_FILE
+from scripts.serve_docs import DocsWatcher, LiveReload
+
+
+@unittest.skipUnless(shutil.which("sphinx-build"), "sphinx-build is not installed")
+class TestWatcherBuild(unittest.TestCase):
+    def setUp(self):
+        self.root = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, self.root)
+        self.source_dir = self.root / "source"
+        self.html_dir = self.root / "html"
+        self.source_dir.mkdir()
+        (self.source_dir / "conf.py").write_text('project = "Test"\nhtml_title = "Default"\n', encoding="utf-8")
+        (self.source_dir / "index.rst").write_text("Test\n====\n\nText.\n", encoding="utf-8")
+        doctree_dir = self.html_dir / ".doctrees"
+        doctree_dir.mkdir(parents=True)
+        overrides = {"html_title": "Overridden"}
+        (doctree_dir / OVERRIDES_FILE).write_text(json.dumps(overrides), encoding="utf-8")
+
+    def test_rebuild_with_overrides(self):
+        watcher = DocsWatcher(self.source_dir, self.html_dir, LiveReload())
+        self.assertEqual(watcher.overrides, {"html_title": "Overridden"})
+        with mock.patch("scripts.serve_docs.request_daemon", return_value=None):
+            self.assertTrue(watcher.build([self.source_dir / "index.rst"]))
+            self.assertTrue(watcher.build([]))
+        self.assertIn("Overridden", (self.html_dir / "index.html").read_text(encoding="utf-8"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,55 @@
+"""Tests for the import hook resolving the packages of the submodules."""
+
+import importlib
+import shutil
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+
+from scripts.common import load_docs_module
+
+submodule_imports = load_docs_module("submodule_imports")
+
+
+class TestSubmoduleFinder(unittest.TestCase):
+    def setUp(self):
+        self.root = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, self.root)
+        (self.root / "hedtestpkg").mkdir()
+        (self.root / "hedtestpkg" / "__init__.py").write_text("KIND = 'package'\n", encoding="utf-8")
+        (self.root / "hedtestmod.py").write_text("KIND = 'module'\n", encoding="utf-8")
+        (self.root / "hedtestns").mkdir()
+        (self.root / "hedtestns" / "part.py").write_text("KIND = 'namespace'\n", encoding="utf-8")
+        (self.root / "setup.py").write_text("", encoding="utf-8")
+        (self.root / "tests").mkdir()
+        (self.root / "tests" / "__init__.py").write_text("", encoding="utf-8")
+        self.addCleanup(self.forget_modules)
+
+    def forget_modules(self):
+        submodule_imports.uninstall_finder()
+        for name in ("hedtestpkg", "hedtestmod", "hedtestns", "hedtestns.part"):
+            sys.modules.pop(name, None)
+        importlib.invalidate_caches()
+
+    def test_find_packages(self):
+        self.assertEqual(submodule_imports.find_packages(self.root), ["hedtestmod", "hedtestpkg"])
+
+    def test_imports(self):
+        packages = submodule_imports.install_finder([self.root])
+        self.assertEqual(packages, {"hedtestmod": self.root, "hedtestpkg": self.root})
+        self.assertEqual(importlib.import_module("hedtestpkg").KIND, "package")
+        self.assertEqual(importlib.import_module("hedtestmod").KIND, "module")
+        self.assertEqual(importlib.import_module("hedtestns.part").KIND, "namespace")
+
+    def test_uninstall_removes_fallback_roots(self):
+        submodule_imports.install_finder([self.root, self.root])
+        self.assertEqual(sys.path.count(str(self.root)), 1)
+        submodule_imports.install_finder([self.root])
+        self.assertEqual(sys.path.count(str(self.root)), 1)
+        submodule_imports.uninstall_finder()
+        self.assertNotIn(str(self.root), sys.path)
+
+
+if __name__ == "__main__":
+    unittest.main()